@@ -1,11 +1,23 @@
-from flask import Flask, render_template, send_from_directory, make_response, request, jsonify, Response
+from flask import Flask, render_template, send_from_directory, make_response, request, jsonify, Response, g, url_for
 from flask_cors import CORS
+import bar_api
 import btc_chart
+import live_feed
+import metrics
+import prefetch
 import logging
 import os
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
 import traceback
 
+from chart_artifacts import ArtifactStore, artifact_key
+from chart_jobs import DONE, FINISHED, JobQueue, QueueFull
+from render_cache import RenderCache
+
 # Configure logging with more detail
 logging.basicConfig(
     level=logging.INFO,
@@ -13,6 +25,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Seconds a rendered chart set is served before the data is checked again
+CHART_CACHE_TTL = float(os.getenv('CHART_CACHE_TTL', '60'))
+
+# Set by gunicorn.conf.py when the app is loaded in the master before forking;
+# background threads are then started per worker in post_fork
+DEFER_BACKGROUND_START = os.getenv('DEFER_BACKGROUND_START', '0') == '1'
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Open /stream connections per process; each holds a request thread for as long as it
+# is connected, so this must stay below the worker's threads (gunicorn.conf.py sets it)
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', '4'))
+
+# Seconds a dashboard is asked to wait before reconnecting when every stream slot is taken
+STREAM_RETRY_AFTER = 30
+
+# Longest a /jobs/<id> poll may block waiting for the job to finish
+CHART_JOB_MAX_WAIT_SECONDS = 5.0
+
+# Seconds a client is asked to wait before retrying when the job queue is full
+CHART_JOB_RETRY_AFTER = 5
+
+# Ticker symbols accepted by /api/bars; they name directories in the bar store,
+# so no path separators and no leading dot
+SYMBOL_PATTERN = re.compile(r'^[A-Za-z0-9^][A-Za-z0-9^=._-]{0,19}$')
+
 def create_app():
     # Get the directory where the script is located
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -24,14 +63,86 @@ def create_app():
     os.makedirs(template_folder, exist_ok=True)
     os.makedirs(os.path.join(static_folder, 'img'), exist_ok=True)
 
-    # Initialize Flask app
+    # Initialize Flask app. Static files are served by serve_static below, which
+    # registers itself as the 'static' endpoint so it can set cache headers.
     app = Flask(__name__, 
-               static_folder=static_folder,
+               static_folder=None,
                template_folder=template_folder)
+    app.static_folder = static_folder
 
     # Enable CORS for all routes
     CORS(app, resources={r"/*": {"origins": "*"}})
 
+    # Each rendered chart set lives in static/charts/<id>/, where the id hashes
+    # the range, the data version and the render settings. Sets are never
+    # rewritten, so concurrent requests cannot see each other's charts.
+    chart_cache = RenderCache(ttl=CHART_CACHE_TTL)
+    artifacts = ArtifactStore(os.path.join(static_folder, 'charts'))
+
+    def render_charts(interval, start_date="2008-01-01", end_date=None):
+        """Render the dashboard charts for a range, reusing an identical earlier render"""
+        key = (interval, start_date, end_date)
+
+        def build():
+            with metrics.span('render_charts.get_btc_data', interval=interval):
+                btc_data = btc_chart.get_btc_data(start=start_date, end=end_date, interval=interval)
+            version = btc_chart.data_version(btc_data)
+            artifact_id = artifact_key(key, version, btc_chart.CHART_RENDER_MODE,
+                                       btc_chart.CHART_MAX_POINTS, btc_chart.CHART_LINE_METHOD)
+            with metrics.span('render_charts.publish', interval=interval):
+                artifacts.publish(artifact_id, lambda path: btc_chart.create_interactive_charts(btc_data, path))
+            return {
+                'version': version,
+                'id': artifact_id,
+                'points': len(btc_data)
+            }
+
+        def on_disk(result):
+            # Eviction may have removed the set since it was cached
+            if not artifacts.exists(result['id']):
+                return False
+            artifacts.touch(result['id'])
+            return True
+
+        return chart_cache.get_or_build(key, build, is_valid=on_disk)
+
+    # Keep the common ranges warm in the background (one leader across workers)
+    app.prefetcher = prefetch.start_scheduler(render_charts, start=not DEFER_BACKGROUND_START)
+
+    # Builds requested in async mode run here instead of in the request thread
+    app.chart_jobs = JobQueue()
+
+    # Taken by each open /stream connection, released when it closes
+    app.stream_slots = threading.BoundedSemaphore(STREAM_MAX_CLIENTS)
+
+    def chart_payload(interval, start_date, end_date, result):
+        return {
+            "interval": interval,
+            "start_date": start_date,
+            "end_date": end_date,
+            "points": result['points'],
+            "version": result['id']
+        }
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # Label by route pattern, not path, to keep the number of series bounded
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                            route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Stage and route latency histograms, cache and upstream counters (Prometheus text format)"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
     # Error handler for all exceptions
     @app.errorhandler(Exception)
     def handle_exception(e):
@@ -65,10 +176,7 @@ def create_app():
                 'favicon.ico',
                 mimetype='image/x-icon'
             ))
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            response.headers['Last-Modified'] = datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')
+            response.headers['Cache-Control'] = 'public, max-age=86400'
             return response
         except Exception as e:
             logger.error(f"Error serving favicon: {e}")
@@ -78,9 +186,14 @@ def create_app():
     def dashboard():
         logger.info("Dashboard route accessed")
         try:
-            btc_chart.main()
-            logger.info("BTC chart generated successfully")
-            return render_template('dashboard.html')
+            result = render_charts(os.getenv('CHART_INTERVAL', '1d'))
+            return render_template(
+                'dashboard.html',
+                render_mode=btc_chart.CHART_RENDER_MODE,
+                plotly_js=btc_chart.plotly_js_asset(),
+                chart_version=result['id'],
+                view={'interval': os.getenv('CHART_INTERVAL', '1d'), 'start_date': "2008-01-01", 'end_date': None}
+            )
         except Exception as e:
             logger.error(f"Error in dashboard route: {e}")
             logger.error(traceback.format_exc())
@@ -93,21 +206,21 @@ def create_app():
         if request.method == 'OPTIONS':
             response = make_response()
             response.headers.add('Access-Control-Allow-Origin', '*')
-            response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+            response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Prefer')
             response.headers.add('Access-Control-Allow-Methods', 'POST')
             return response
 
         try:
             # Log the raw request data
-            logger.info(f"Request headers: {dict(request.headers)}")
-            logger.info(f"Request data: {request.get_data(as_text=True)}")
+            logger.debug(f"Request headers: {dict(request.headers)}")
+            logger.debug(f"Request data: {request.get_data(as_text=True)}")
 
             data = request.get_json(force=True)
             if not data:
                 logger.error("No JSON data received")
                 return jsonify({"status": "error", "message": "No data provided"}), 400
 
-            logger.info(f"Received data: {data}")
+            logger.debug(f"Received data: {data}")
 
             interval = data.get('interval', '1d')
             start_date = data.get('start_date')
@@ -119,40 +232,178 @@ def create_app():
             logger.info(f"Processing update with interval={interval}, start_date={start_date}, end_date={end_date}")
             
             # Convert end_date to datetime for validation
-            end_datetime = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
-            start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
+            try:
+                end_datetime = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now(timezone.utc).replace(tzinfo=None)
+                start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid date format: {e}")
+                return jsonify({"status": "error", "message": f"Invalid date format: {str(e)}"}), 400
             
             # Validate date range
             if start_datetime > end_datetime:
                 return jsonify({"status": "error", "message": "Start date cannot be after end date"}), 400
             
-            # Get BTC data with specified parameters
-            btc_data = btc_chart.get_btc_data(start=start_date, end=end_date, interval=interval)
-            
-            # Create and save the chart
-            btc_chart.create_interactive_chart(btc_data)
+            # In async mode the build is queued and the client polls /jobs/<id>,
+            # so a slow download does not hold this request thread
+            if data.get('async') or 'respond-async' in request.headers.get('Prefer', ''):
+                try:
+                    job = app.chart_jobs.submit((interval, start_date, end_date),
+                                                lambda: render_charts(interval, start_date, end_date))
+                except QueueFull as e:
+                    logger.warning(f"Rejecting chart update: {e}")
+                    response = jsonify({"status": "error", "message": "Too many chart updates in progress, retry shortly"})
+                    response.headers['Retry-After'] = str(CHART_JOB_RETRY_AFTER)
+                    return response, 503
+                status_url = url_for('chart_job', job_id=job.id)
+                response = jsonify({"status": job.state, "job": job.to_dict(), "status_url": status_url})
+                response.headers['Location'] = status_url
+                return response, 202
+
+            # Get BTC data and render the charts, unless an identical render is cached
+            result = render_charts(interval, start_date, end_date)
             
             response_data = {
                 "status": "success",
-                "data": {
-                    "interval": interval,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "points": len(btc_data)
-                }
+                "data": chart_payload(interval, start_date, end_date, result)
             }
-            logger.info(f"Chart updated successfully. Response: {response_data}")
+            logger.debug(f"Chart updated successfully. Response: {response_data}")
             return jsonify(response_data)
 
         except ValueError as ve:
-            logger.error(f"Invalid date format: {ve}")
+            # E.g. no data for the range; dates were validated above
+            logger.error(f"Cannot update chart: {ve}")
             logger.error(traceback.format_exc())
-            return jsonify({"status": "error", "message": f"Invalid date format: {str(ve)}"}), 400
+            return jsonify({"status": "error", "message": str(ve)}), 400
         except Exception as e:
             logger.error(f"Error updating chart: {e}")
             logger.error(traceback.format_exc())
             return jsonify({"status": "error", "message": str(e)}), 500
 
+    @app.route('/jobs/<job_id>')
+    def chart_job(job_id):
+        """State of an async chart update; ?wait=<seconds> blocks briefly until it finishes"""
+        try:
+            wait = min(float(request.args.get('wait', 0)), CHART_JOB_MAX_WAIT_SECONDS)
+        except ValueError:
+            return jsonify({"status": "error", "message": "wait must be a number of seconds"}), 400
+
+        job = app.chart_jobs.get(job_id, wait=wait)
+        if job is None:
+            return jsonify({"status": "error", "message": f"Unknown or expired job '{job_id}'"}), 404
+        if job.state == DONE:
+            return jsonify({"status": "success", "job": job.to_dict(), "data": chart_payload(*job.key, job.result)})
+        if job.state in FINISHED:
+            return jsonify({"status": "error", "job": job.to_dict(), "message": job.error})
+        return jsonify({"status": job.state, "job": job.to_dict()})
+
+    @app.route('/chart_range')
+    def chart_range():
+        """Figure JSON for a zoomed time range, at full resolution when it fits the point budget"""
+        interval = request.args.get('interval', '1d')
+        start_date = request.args.get('start_date', "2008-01-01")
+        end_date = request.args.get('end_date') or None
+        range_from = request.args.get('from')
+        range_to = request.args.get('to')
+
+        if not range_from or not range_to:
+            return jsonify({"status": "error", "message": "Both 'from' and 'to' are required"}), 400
+
+        try:
+            btc_data = btc_chart.get_btc_data(start=start_date, end=end_date, interval=interval)
+            figures = btc_chart.build_chart_figures(btc_data, x_range=(range_from, range_to))
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid chart range request: {e}")
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        return Response(btc_chart.figures_to_json(figures), mimetype='application/json')
+
+    @app.route('/api/bars')
+    def api_bars():
+        """
+        Bars of one symbol from the local store as Arrow IPC or JSON columns.
+
+        Query: symbol, interval, start, end, indicators (comma separated or
+        'all') and format (arrow or json; otherwise chosen from Accept).
+        The body is streamed and compressed with zstd or gzip when the
+        client accepts it.
+        """
+        symbol = request.args.get('symbol', 'BTC-USD')
+        interval = request.args.get('interval', '1d')
+        start = request.args.get('start', "2008-01-01")
+        end = request.args.get('end') or None
+        names = [name for name in request.args.get('indicators', '').split(',') if name]
+        if names == ['all']:
+            names = list(btc_chart.INDICATOR_COLUMNS)
+
+        if not SYMBOL_PATTERN.match(symbol):
+            return jsonify({"status": "error", "message": f"Invalid symbol '{symbol}'"}), 400
+        if interval not in btc_chart.INTERVAL_LIMITS:
+            return jsonify({"status": "error", "message": f"Unknown interval '{interval}'"}), 400
+        unknown = [name for name in names if name not in btc_chart.INDICATOR_COLUMNS]
+        if unknown:
+            return jsonify({"status": "error", "message": f"Unknown indicators: {', '.join(unknown)}"}), 400
+        try:
+            for value in (start, end):
+                if value:
+                    datetime.strptime(value, "%Y-%m-%d")
+            fmt = bar_api.negotiate_format(request.args.get('format'), request.headers.get('Accept'))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        try:
+            with metrics.span('api_bars.load', interval=interval):
+                series = btc_chart.get_bars(symbol, start=start, end=end, interval=interval, indicators=names)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 404
+
+        encoding = bar_api.negotiate_encoding(request.headers.get('Accept-Encoding'))
+        response = Response(bar_api.encode(series, fmt, encoding),
+                            mimetype=bar_api.ARROW_MIMETYPE if fmt == 'arrow' else bar_api.JSON_MIMETYPE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        # The interval can fall back to 1d when the provider has no intraday history
+        response.headers['X-Bar-Interval'] = series.interval
+        response.headers['X-Bar-Count'] = str(len(series))
+        return response
+
+    @app.route('/stream')
+    def stream():
+        """Server-Sent Events: newly closed bars with their indicators, and the latest price"""
+        interval = request.args.get('interval', '1d')
+        if interval not in btc_chart.INTERVAL_LIMITS:
+            return jsonify({"status": "error", "message": f"Unknown interval '{interval}'"}), 400
+        # Past the cap the connection is refused instead of taking a thread that
+        # /update_chart and /jobs polls need
+        if not app.stream_slots.acquire(blocking=False):
+            logger.warning(f"Rejecting stream client for {interval}: {STREAM_MAX_CLIENTS} streams already open")
+            response = jsonify({"status": "error", "message": "Too many live streams open, retry later"})
+            response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+            return response, 503
+        feed = live_feed.get_feed(interval)
+
+        def events():
+            q = feed.subscribe()
+            logger.info(f"Stream client connected for {interval} ({feed.subscribers()} connected)")
+            try:
+                while True:
+                    try:
+                        event, payload = q.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield live_feed.format_event(event, payload)
+            finally:
+                feed.unsubscribe(q)
+                logger.info(f"Stream client disconnected for {interval}")
+
+        response = Response(events(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        # Called by the server when the connection ends, even if the body never started
+        response.call_on_close(app.stream_slots.release)
+        return response
+
     @app.route('/<path:filename>.map')
     def handle_source_maps(filename):
         """Handle all other source map requests."""
@@ -171,20 +422,24 @@ def create_app():
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
-    @app.route('/static/<path:filename>')
+    @app.route('/static/<path:filename>', endpoint='static')
     def serve_static(filename):
         try:
-            response = make_response(send_from_directory(app.static_folder, filename))
+            # Chart sets are addressed by the hash of their inputs, so that hash
+            # plus the file name is a strong validator for the content
+            parts = filename.split('/')
+            chart_artifact = len(parts) == 3 and parts[0] == 'charts'
+            etag = f"{parts[1]}-{parts[2]}" if chart_artifact else True
+            response = make_response(send_from_directory(app.static_folder, filename, etag=etag))
             # Set proper MIME type for CSS files
             if filename.endswith('.css'):
                 response.headers['Content-Type'] = 'text/css; charset=utf-8'
-            response.headers.update({
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0',
-                'Last-Modified': datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT'),
-                'Vary': 'Accept-Encoding'
-            })
+            response.headers['Vary'] = 'Accept-Encoding'
+            # Fingerprinted assets never change under the same name
+            if chart_artifact or filename == btc_chart.plotly_js_asset():
+                response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
             return response
         except Exception as e:
             logger.error(f"Error serving static file {filename}: {e}")
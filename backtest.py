@@ -0,0 +1,292 @@
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from bar_store import INTERVAL_SECONDS
+from indicators import WIDE_MAX_ROWS, IndicatorContext
+
+logger = logging.getLogger(__name__)
+
+# Default trading costs as fractions of traded notional
+DEFAULT_FEE = 0.001
+DEFAULT_SLIPPAGE = 0.0005
+
+
+def periods_per_year(interval):
+    """Number of bars per year for an interval (crypto trades around the clock)"""
+    return 365 * 86400 / INTERVAL_SECONDS.get(interval, 86400)
+
+
+def hold(events):
+    """
+    Turn sparse entry/exit events into a held position
+    Args:
+        events (numpy.ndarray): Target position on bars where something happens, NaN elsewhere;
+            2-D arrays are filled down each column
+    Returns:
+        numpy.ndarray: Events forward-filled, flat (0) before the first event
+    """
+    rows = np.arange(len(events)).reshape((-1,) + (1,) * (events.ndim - 1))
+    last = np.where(np.isnan(events), 0, rows)
+    np.maximum.accumulate(last, axis=0, out=last)
+    held = np.take_along_axis(events, last, axis=0)
+    held[np.isnan(held)] = 0.0
+    return held
+
+
+# Signal functions map an IndicatorContext to a target position per bar:
+# 1 long, -1 short, 0 flat. The position is taken at the bar's close. They
+# work elementwise, so a 2-D context yields one target column per symbol.
+
+def ma_cross(context, fast=20, slow=50):
+    """Long while the fast moving average is above the slow one, short while below"""
+    fast_ma = context.get('sma', fast)
+    slow_ma = context.get('sma', slow)
+    return np.sign(np.nan_to_num(fast_ma - slow_ma))
+
+
+def rsi_threshold(context, period=14, lower=30, upper=70):
+    """Go long when RSI drops below `lower`, short when it rises above `upper`"""
+    rsi = context.get('rsi', period)
+    events = np.full(rsi.shape, np.nan)
+    events[rsi < lower] = 1.0
+    events[rsi > upper] = -1.0
+    return hold(events)
+
+
+def macd_cross(context, fast=12, slow=26, signal=9):
+    """Long while MACD is above its signal line, short while below"""
+    macd = context.get('macd', fast, slow)
+    signal_line = context.get('macd_signal', fast, slow, signal)
+    return np.sign(np.nan_to_num(macd - signal_line))
+
+
+def bollinger_touch(context, window=20, num_std=2.0):
+    """Go long on a touch of the lower band, short on a touch of the upper band"""
+    middle = context.get('sma', window)
+    width = num_std * context.get('std', window)
+    events = np.full(middle.shape, np.nan)
+    events[context.close <= middle - width] = 1.0
+    events[context.close >= middle + width] = -1.0
+    return hold(events)
+
+
+STRATEGIES = {
+    'ma_cross': ma_cross,
+    'rsi_threshold': rsi_threshold,
+    'macd_cross': macd_cross,
+    'bollinger_touch': bollinger_touch,
+}
+
+# Parameters of each strategy that change its indicator intermediates; the
+# remaining ones (thresholds) reuse the same intermediates
+INDICATOR_PARAMS = {
+    'ma_cross': ('fast', 'slow'),
+    'rsi_threshold': ('period',),
+    'macd_cross': ('fast', 'slow', 'signal'),
+    'bollinger_touch': ('window',),
+}
+
+
+def simulate(close, target, fee=DEFAULT_FEE, slippage=DEFAULT_SLIPPAGE, long_only=True):
+    """
+    Vectorized position and return accounting
+    Args:
+        close (numpy.ndarray): Close prices, (bars,) or (bars, symbols); NaN before a
+            symbol's first bar earns no return
+        target (numpy.ndarray): Target position decided at each bar's close
+        fee (float): Fee per unit of traded notional
+        slippage (float): Slippage per unit of traded notional
+        long_only (bool): Clip short targets to flat
+    Returns:
+        tuple: (positions, bar returns net of costs) as numpy arrays
+    """
+    if long_only:
+        target = np.clip(target, 0.0, None)
+    # A target decided at the close of bar t earns the return of bar t+1
+    positions = np.empty(close.shape)
+    positions[0] = 0.0
+    positions[1:] = target[:-1]
+
+    market = np.zeros(close.shape)
+    np.divide(close[1:], close[:-1], out=market[1:])
+    market[1:] -= 1.0
+    market[np.isnan(market)] = 0.0
+
+    # Costs are charged on the bar where the position changes
+    turnover = np.abs(np.diff(positions, axis=0, prepend=0.0))
+    returns = positions * market - turnover * (fee + slippage)
+    return positions, returns
+
+
+def summarize(returns, positions, interval='1d'):
+    """Headline statistics for a return series"""
+    equity = np.cumprod(1.0 + returns)
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    sharpe = returns.mean() / std * np.sqrt(periods_per_year(interval)) if std > 0 else np.nan
+    return {
+        'total_return': float(equity[-1] - 1.0) if len(equity) else 0.0,
+        'sharpe': float(sharpe),
+        'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+        'exposure': float(np.mean(positions != 0)) if len(positions) else 0.0,
+    }
+
+
+def extract_trades(index, close, positions, returns, fee=DEFAULT_FEE, slippage=DEFAULT_SLIPPAGE):
+    """
+    Build the trade list from a position series without a per-bar loop
+    Args:
+        index (pandas.Index): Bar timestamps
+        close (numpy.ndarray): Close prices
+        positions (numpy.ndarray): Position held during each bar
+        returns (numpy.ndarray): Net bar returns from simulate()
+    Returns:
+        pandas.DataFrame: One row per round trip
+    """
+    n = len(positions)
+    # Every run of a constant non-zero position is one trade
+    change = np.flatnonzero(np.diff(positions, prepend=0.0, append=0.0))
+    starts, ends = change[:-1], change[1:]
+    held = positions[starts] if len(starts) else np.empty(0)
+    mask = held != 0
+    starts, ends, held = starts[mask], ends[mask], held[mask]
+
+    log_equity = np.concatenate([[0.0], np.cumsum(np.log1p(returns))])
+    gross = np.exp(log_equity[ends] - log_equity[starts]) - 1.0
+    closed = ends < n
+    # simulate() charges the exit on the bar after the trade. Move that leg of the bar's
+    # cost into this trade; on a flip the bar opens the next trade, which keeps only its
+    # entry leg. The trades and flat bars then compound to the equity curve.
+    after = np.minimum(ends, n - 1)
+    exit_cost = np.where(closed, np.minimum(np.abs(held), np.abs(positions[after] - held)), 0.0) * (fee + slippage)
+    transfer = (1.0 + returns[after]) / (1.0 + returns[after] + exit_cost)
+    growth = (1.0 + gross) * transfer
+    flipped = np.flatnonzero(starts[1:] == ends[:-1]) + 1
+    growth[flipped] /= transfer[flipped - 1]
+    trade_returns = growth - 1.0
+
+    exit_bar = np.minimum(ends, n) - 1
+    return DataFrame({
+        'entry_time': index[starts - 1] if len(starts) else index[:0],
+        'exit_time': index[exit_bar],
+        'direction': np.where(held > 0, 'long', 'short'),
+        'entry_price': close[starts - 1],
+        'exit_price': close[exit_bar],
+        'bars': ends - starts,
+        'return': trade_returns,
+        'open': ~closed,
+    })
+
+
+def _stats_and_trades(index, close, positions, returns, fee, slippage, interval):
+    """Summary stats and trade list of one symbol, from its first bar on"""
+    first = int(np.argmax(~np.isnan(close)))
+    index, close, positions, returns = index[first:], close[first:], positions[first:], returns[first:]
+    stats = summarize(returns, positions, interval)
+    trades = extract_trades(index, close, positions, returns, fee, slippage)
+    stats['trades'] = len(trades)
+    stats['win_rate'] = float((trades['return'] > 0).mean()) if len(trades) else np.nan
+    return stats, trades
+
+
+@dataclass
+class BacktestResult:
+    """Outputs of run_backtest; DataFrames with one column per symbol for a multi-symbol frame"""
+    equity: pd.Series
+    returns: pd.Series
+    positions: pd.Series
+    drawdown: pd.Series
+    trades: DataFrame
+    stats: dict = field(default_factory=dict)
+
+
+def run_backtest(data: DataFrame, strategy, params=None, fee=DEFAULT_FEE, slippage=DEFAULT_SLIPPAGE,
+                 interval='1d', long_only=True, initial_capital=1.0, context=None) -> BacktestResult:
+    """
+    Backtest one strategy over a get_btc_data frame, or every symbol of a
+    get_market_data frame at once. Signals, positions and equity are computed in
+    one pass over the 2-D close array (one symbol at a time beyond WIDE_MAX_ROWS
+    bars, like IndicatorContext); stats and trades are taken per symbol from its
+    first bar on.
+    Args:
+        data (pandas.DataFrame): Bars with a 'Close' column (one column per symbol
+            in a multi-symbol frame)
+        strategy (str or callable): Name in STRATEGIES or a signal function
+        params (dict): Keyword arguments for the signal function
+        fee (float): Fee per unit of traded notional
+        slippage (float): Slippage per unit of traded notional
+        interval (str): Bar interval, used to annualize the Sharpe ratio
+        long_only (bool): Treat short signals as flat
+        initial_capital (float): Starting equity
+        context (indicators.IndicatorContext): Reuse indicator intermediates (optional)
+    Returns:
+        BacktestResult: Equity curve, drawdown, positions, trades and summary stats.
+            For a multi-symbol frame stats maps each symbol to its stats and trades
+            has a leading 'symbol' column.
+    """
+    signal = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+    close_data = data['Close']
+    wide = isinstance(close_data, DataFrame)
+    if wide and context is None and len(close_data) > WIDE_MAX_ROWS:
+        results = {symbol: run_backtest(DataFrame({'Close': close_data[symbol]}), signal, params, fee, slippage,
+                                        interval, long_only, initial_capital)
+                   for symbol in close_data.columns}
+
+        def stack(attribute):
+            return DataFrame({symbol: getattr(result, attribute) for symbol, result in results.items()})
+
+        return BacktestResult(
+            equity=stack('equity'),
+            returns=stack('returns'),
+            positions=stack('positions'),
+            drawdown=stack('drawdown'),
+            trades=_concat_trades({symbol: result.trades for symbol, result in results.items()}),
+            stats={symbol: result.stats for symbol, result in results.items()},
+        )
+
+    close = close_data.to_numpy(dtype='float64')
+    if context is None:
+        context = IndicatorContext(close)
+
+    target = signal(context, **(params or {}))
+    positions, returns = simulate(close, target, fee, slippage, long_only)
+
+    equity = initial_capital * np.cumprod(1.0 + returns, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1.0
+
+    if not wide:
+        stats, trades = _stats_and_trades(data.index, close, positions, returns, fee, slippage, interval)
+        return BacktestResult(
+            equity=pd.Series(equity, index=data.index, name='equity'),
+            returns=pd.Series(returns, index=data.index, name='returns'),
+            positions=pd.Series(positions, index=data.index, name='position'),
+            drawdown=pd.Series(drawdown, index=data.index, name='drawdown'),
+            trades=trades,
+            stats=stats,
+        )
+
+    def frame(values):
+        return DataFrame(values, index=data.index, columns=close_data.columns)
+
+    stats, trades = {}, {}
+    for column, symbol in enumerate(close_data.columns):
+        stats[symbol], trades[symbol] = _stats_and_trades(data.index, close[:, column], positions[:, column],
+                                                          returns[:, column], fee, slippage, interval)
+    return BacktestResult(
+        equity=frame(equity),
+        returns=frame(returns),
+        positions=frame(positions),
+        drawdown=frame(drawdown),
+        trades=_concat_trades(trades),
+        stats=stats,
+    )
+
+
+def _concat_trades(trades):
+    """One trade list from per-symbol lists, with a leading 'symbol' column"""
+    frames = [frame.assign(symbol=symbol)[['symbol', *frame.columns]] for symbol, frame in trades.items()]
+    return pd.concat(frames, ignore_index=True) if frames else DataFrame()
@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import time
+import zlib
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rows per Arrow record batch, and so per streamed chunk of a binary response
+API_BATCH_ROWS = int(os.getenv('API_BATCH_ROWS', '65536'))
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+JSON_MIMETYPE = 'application/json'
+
+# Content codings in order of preference when a client accepts several
+ENCODINGS = ('zstd', 'gzip')
+
+# Bar columns barely compress past level 1 with gzip, while higher levels cost several times the CPU
+API_GZIP_LEVEL = 1
+
+
+def _arrow():
+    """pyarrow, or None when it is not installed (binary output is then unavailable)"""
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _orjson():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def formats():
+    """Response formats this process can produce, preferred first"""
+    return ['arrow', 'json'] if _arrow() is not None else ['json']
+
+
+def encodings():
+    """Content codings this process can produce, preferred first"""
+    return [encoding for encoding in ENCODINGS if encoding != 'zstd' or _zstd() is not None]
+
+
+def negotiate_format(requested, accept):
+    """
+    Pick the response format
+    Args:
+        requested (str): Explicit ?format= value (optional)
+        accept (str): The request's Accept header
+    Returns:
+        str: 'arrow' or 'json'
+    Raises:
+        ValueError: An explicit format that is unknown or unavailable
+    """
+    if requested:
+        if requested not in ('arrow', 'json'):
+            raise ValueError(f"Unknown format '{requested}', expected arrow or json")
+        if requested not in formats():
+            raise ValueError("Arrow output needs pyarrow installed; use format=json")
+        return requested
+    if ARROW_MIMETYPE in (accept or '') and 'arrow' in formats():
+        return 'arrow'
+    return 'json'
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Content coding for an Accept-Encoding header
+    Returns:
+        str: 'zstd' or 'gzip', or None to send the body uncompressed
+    """
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class _Sink:
+    """Write target for the Arrow stream writer that hands back what was written since the last drain"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def encode_arrow(series, batch_rows=API_BATCH_ROWS):
+    """
+    Yield a BarSeries as an Arrow IPC stream, one record batch at a time
+    Args:
+        series (compact_bars.BarSeries): Bars and any indicators
+        batch_rows (int): Rows per record batch
+    Yields:
+        bytes: The schema with the first batch, then each further batch and the end marker
+    """
+    pa = _arrow()
+    columns = {**series.columns, **series.indicators}
+    ts_type = pa.timestamp('ns', tz='UTC')
+    schema = pa.schema(
+        [pa.field('ts', ts_type)]
+        + [pa.field(name, pa.from_numpy_dtype(values.dtype)) for name, values in columns.items()],
+        metadata={'symbol': series.symbol, 'interval': series.interval},
+    )
+    sink = _Sink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for lo in range(0, max(len(series), 1), batch_rows):
+        hi = lo + batch_rows
+        # NaN (indicator warm-up, gaps) becomes null, as Arrow readers expect
+        arrays = [pa.array(series.ts[lo:hi], type=ts_type)]
+        arrays += [pa.array(values[lo:hi], from_pandas=True) for values in columns.values()]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _json_values(values):
+    """One column as a JSON array, NaN as null"""
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.dumps(np.ascontiguousarray(values), option=orjson.OPT_SERIALIZE_NUMPY)
+    if values.dtype == np.float32:
+        # Go through the shortest float32 repr so 0.1 is not sent as 0.10000000149011612
+        values = values.astype('U24').astype('float64')
+    if values.dtype.kind == 'f':
+        return json.dumps([None if v != v else v for v in values.tolist()]).encode()
+    return json.dumps(values.tolist()).encode()
+
+
+def encode_json(series):
+    """
+    Yield a BarSeries as a JSON object of columns, one column at a time
+    Args:
+        series (compact_bars.BarSeries): Bars and any indicators
+    Yields:
+        bytes: Pieces of {"symbol", "interval", "rows", "columns": {"ts": [epoch ms], ...}}
+    """
+    head = {'symbol': series.symbol, 'interval': series.interval, 'rows': len(series)}
+    yield json.dumps(head)[:-1].encode() + b', "columns": {"ts": '
+    yield _json_values(series.ts // 1_000_000)
+    for name, values in {**series.columns, **series.indicators}.items():
+        yield b', ' + json.dumps(name).encode() + b': '
+        yield _json_values(values)
+    yield b'}}'
+
+
+def compress(chunks, encoding):
+    """
+    Compress a stream of chunks incrementally
+    Args:
+        chunks (iterable): bytes to compress in order
+        encoding (str): 'zstd', 'gzip' or None for no compression
+    Yields:
+        bytes: Compressed pieces
+    """
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(API_GZIP_LEVEL, zlib.DEFLATED, 31)
+    else:
+        compressor = _zstd().ZstdCompressor(level=3).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode(series, fmt, encoding=None):
+    """
+    Yield a response body for a BarSeries, recording the time spent encoding
+    Args:
+        series (compact_bars.BarSeries): Bars and any indicators
+        fmt (str): 'arrow' or 'json'
+        encoding (str): 'zstd', 'gzip' or None
+    Yields:
+        bytes: Body chunks
+    """
+    body = compress(encode_arrow(series) if fmt == 'arrow' else encode_json(series), encoding)
+    # Only the time spent producing chunks counts, not the time the client takes to read them
+    elapsed = 0.0
+    sent = 0
+    while True:
+        started = time.perf_counter()
+        chunk = next(body, None)
+        elapsed += time.perf_counter() - started
+        if chunk is None:
+            break
+        if chunk:
+            sent += len(chunk)
+            yield chunk
+    metrics.observe('stage_duration_seconds', elapsed, stage=f'api_bars.encode_{fmt}')
+    logger.debug(f"Encoded {len(series)} {series.symbol} {series.interval} bars as {fmt} "
+                 f"({encoding or 'identity'}): {sent / 1024:.0f} KB in {elapsed * 1000:.1f} ms")
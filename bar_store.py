@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Get the directory where the script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Default location of the on-disk bar store (override with BAR_STORE_DIR)
+DEFAULT_STORE_DIR = os.path.join(SCRIPT_DIR, 'data', 'bars')
+
+# One record per bar; timestamps are UTC epoch nanoseconds
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# Mapping between store fields and the DataFrame columns used by btc_chart
+FRAME_COLUMNS = {
+    'open': 'Open',
+    'high': 'High',
+    'low': 'Low',
+    'close': 'Close',
+    'volume': 'Volume',
+}
+
+# Bar duration in seconds for each supported interval
+INTERVAL_SECONDS = {
+    '1m': 60,
+    '2m': 120,
+    '5m': 300,
+    '15m': 900,
+    '30m': 1800,
+    '60m': 3600,
+    '1h': 3600,
+    '1d': 86400,
+    '5d': 5 * 86400,
+    '1wk': 7 * 86400,
+    '1mo': 31 * 86400,
+}
+
+
+def to_ns(value) -> int:
+    """Convert a datetime-like value to UTC epoch nanoseconds (naive values are taken as UTC)"""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value)
+
+
+def bars_from_frame(data: DataFrame) -> np.ndarray:
+    """
+    Convert a provider DataFrame into a structured bar array
+    Args:
+        data (pandas.DataFrame): OHLCV data indexed by timestamp
+    Returns:
+        numpy.ndarray: Bars sorted by timestamp with BAR_DTYPE records
+    """
+    bars = np.empty(len(data), dtype=BAR_DTYPE)
+    if len(data) == 0:
+        return bars
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    bars['ts'] = index.tz_convert('UTC').as_unit('ns').asi8
+    for field, column in FRAME_COLUMNS.items():
+        bars[field] = data[column].to_numpy(dtype='float64')
+    return bars[np.argsort(bars['ts'], kind='stable')]
+
+
+def bars_to_frame(bars: np.ndarray, interval: str = '1d') -> DataFrame:
+    """
+    Convert a structured bar array into the DataFrame layout returned by get_btc_data
+    Args:
+        bars (numpy.ndarray): Bars with BAR_DTYPE records
+        interval (str): Bar interval, used to name the index like yfinance does
+    Returns:
+        pandas.DataFrame: OHLCV data indexed by a UTC DatetimeIndex
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(bars['ts'], unit='ns', utc=True))
+    index.name = 'Date' if INTERVAL_SECONDS.get(interval, 86400) >= 86400 else 'Datetime'
+    return DataFrame(
+        {column: np.asarray(bars[field]) for field, column in FRAME_COLUMNS.items()},
+        index=index
+    )
+
+
+def merge_bars(existing: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Merge two bar arrays by timestamp, letting bars in `new` replace existing ones"""
+    if len(existing) == 0:
+        combined = new
+    elif len(new) == 0:
+        combined = existing
+    else:
+        combined = np.concatenate([existing, new])
+    order = np.argsort(combined['ts'], kind='stable')
+    combined = combined[order]
+    # After a stable sort duplicates keep their original order, so the last one is the newest
+    keep = np.ones(len(combined), dtype=bool)
+    keep[:-1] = combined['ts'][1:] != combined['ts'][:-1]
+    return combined[keep]
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching [start, end] pairs"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(start: int, end: int, covered):
+    """Return the parts of [start, end] not contained in the covered ranges"""
+    gaps = []
+    cursor = start
+    for cov_start, cov_end in merge_ranges(covered):
+        if cov_end <= cursor:
+            continue
+        if cov_start >= end:
+            break
+        if cov_start > cursor:
+            gaps.append((cursor, cov_start))
+        cursor = max(cursor, cov_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class BarStore:
+    """
+    Columnar on-disk store of OHLCV bars.
+
+    Bars live under <root>/<symbol>/<interval>/ as NumPy structured arrays,
+    one .npy file per calendar month for intraday intervals and per year for
+    daily and longer ones. Files are memory-mapped on read and replaced
+    atomically on write. A manifest.json next to the partitions records which
+    time ranges have been fetched from the provider and when.
+
+    Writers of a series hold a flock on its .lock file, so gunicorn workers
+    updating the same partition or manifest do not drop each other's changes.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv('BAR_STORE_DIR', DEFAULT_STORE_DIR)
+        self._lock = threading.RLock()
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    @contextmanager
+    def _series_lock(self, symbol, interval):
+        """Serialize read-modify-write of a series across threads and processes"""
+        with self._lock:
+            series_dir = self._series_dir(symbol, interval)
+            os.makedirs(series_dir, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(series_dir, '.lock'), 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _partition_keys(interval, ts):
+        unit = 'Y' if INTERVAL_SECONDS.get(interval, 86400) >= 86400 else 'M'
+        return np.datetime_as_string(ts.astype('datetime64[ns]').astype(f'datetime64[{unit}]'))
+
+    def _partition_path(self, symbol, interval, key):
+        return os.path.join(self._series_dir(symbol, interval), f'{key}.npy')
+
+    def _load_partition(self, path, mmap=True):
+        if not os.path.exists(path):
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.load(path, mmap_mode='r' if mmap else None)
+
+    @staticmethod
+    def _atomic_write(path, write):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def partitions(self, symbol, interval):
+        """List partition keys stored for a series, oldest first"""
+        series_dir = self._series_dir(symbol, interval)
+        if not os.path.isdir(series_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(series_dir) if name.endswith('.npy'))
+
+    def partitions_between(self, symbol, interval, start=None, end=None):
+        """List the stored partition keys that can hold bars in [start, end), oldest first"""
+        keys = self.partitions(symbol, interval)
+        if start is not None:
+            first = self._partition_keys(interval, np.array([start], dtype='<i8'))[0]
+            keys = [k for k in keys if k >= first]
+        if end is not None:
+            last = self._partition_keys(interval, np.array([end], dtype='<i8'))[0]
+            keys = [k for k in keys if k <= last]
+        return keys
+
+    def read(self, symbol, interval, start=None, end=None) -> np.ndarray:
+        """
+        Read stored bars for a series
+        Args:
+            symbol (str): Ticker symbol, e.g. BTC-USD
+            interval (str): Bar interval
+            start (int): Inclusive start in epoch nanoseconds (optional)
+            end (int): Exclusive end in epoch nanoseconds (optional)
+        Returns:
+            numpy.ndarray: Bars with BAR_DTYPE records, sorted by timestamp
+        """
+        pieces = []
+        for key in self.partitions_between(symbol, interval, start, end):
+            part = self._load_partition(self._partition_path(symbol, interval, key))
+            lo = 0 if start is None else np.searchsorted(part['ts'], start, side='left')
+            hi = len(part) if end is None else np.searchsorted(part['ts'], end, side='left')
+            if hi > lo:
+                pieces.append(part[lo:hi])
+        if not pieces:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.concatenate(pieces)
+
+    def last_bar_ts(self, symbol, interval):
+        """Timestamp of the newest stored bar, or None when the series is empty"""
+        keys = self.partitions(symbol, interval)
+        for key in reversed(keys):
+            part = self._load_partition(self._partition_path(symbol, interval, key))
+            if len(part):
+                return int(part['ts'][-1])
+        return None
+
+    def write(self, symbol, interval, bars: np.ndarray):
+        """Upsert bars into their partitions, replacing bars with the same timestamp"""
+        if len(bars) == 0:
+            return
+        bars = np.asarray(bars, dtype=BAR_DTYPE)
+        keys = self._partition_keys(interval, bars['ts'])
+        with self._series_lock(symbol, interval):
+            for key in np.unique(keys):
+                path = self._partition_path(symbol, interval, key)
+                merged = merge_bars(self._load_partition(path, mmap=False), bars[keys == key])
+                self._atomic_write(path, lambda tmp: _save_npy(tmp, merged))
+
+    def manifest(self, symbol, interval):
+        """Return the series manifest: fetched ranges and when the newest range was fetched"""
+        path = os.path.join(self._series_dir(symbol, interval), 'manifest.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'ranges': [], 'fetched_at': None}
+
+    def covered_ranges(self, symbol, interval, refresh_seconds, now=None):
+        """
+        Ranges whose bars are stored and still current
+        Args:
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            refresh_seconds (float): A head fetched this recently counts as current up to now
+            now (float): Current epoch seconds (optional)
+        Returns:
+            list: [start, end] pairs in epoch nanoseconds
+        """
+        manifest = self.manifest(symbol, interval)
+        ranges = [list(r) for r in manifest['ranges']]
+        fetched_at = manifest['fetched_at']
+        now = time.time() if now is None else now
+        bar_ns = INTERVAL_SECONDS[interval] * 10**9
+
+        # Only a head range that reached the present at fetch time can go stale
+        if ranges and fetched_at and ranges[-1][1] >= fetched_at * 10**9 - bar_ns:
+            if now - fetched_at < refresh_seconds:
+                # Topped up moments ago: treat the head of the series as current
+                ranges[-1][1] = max(ranges[-1][1], int(now * 10**9))
+            else:
+                # The newest stored bar is stale if it was still forming when it was fetched
+                last_ts = self.last_bar_ts(symbol, interval)
+                if last_ts is not None and last_ts + bar_ns > fetched_at * 10**9:
+                    ranges[-1][1] = min(ranges[-1][1], last_ts)
+        return ranges
+
+    def mark_fetched(self, symbol, interval, start, end):
+        """Record that [start, end) has been fetched from the provider"""
+        with self._series_lock(symbol, interval):
+            manifest = self.manifest(symbol, interval)
+            head = max((r[1] for r in manifest['ranges']), default=None)
+            manifest['ranges'] = merge_ranges(manifest['ranges'] + [[int(start), int(end)]])
+            # fetched_at tracks the head of the series, which is the part that goes stale
+            if head is None or end >= head:
+                manifest['fetched_at'] = time.time()
+            path = os.path.join(self._series_dir(symbol, interval), 'manifest.json')
+
+            def write(tmp_path):
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+
+            self._atomic_write(path, write)
+
+
+def _save_npy(path, array):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+_store = None
+
+
+def get_store() -> BarStore:
+    """Return the process-wide bar store"""
+    global _store
+    if _store is None:
+        _store = BarStore()
+    return _store
@@ -0,0 +1,26 @@
+"""
+Time each built-in strategy end to end (indicators, positions, equity,
+drawdown, stats and trade list) on synthetic one-minute bars.
+
+Run from the repository root:
+    python -m benchmarks.bench_backtest [bars]
+"""
+import sys
+import time
+
+from backtest import STRATEGIES, run_backtest
+from benchmarks.bench_indicators import synthetic_frame
+
+
+def run(n):
+    frame = synthetic_frame(n)
+    print(f"{'strategy':<16} {'ms':>8} {'trades':>8} {'sharpe':>8}")
+    for name in STRATEGIES:
+        started = time.perf_counter()
+        result = run_backtest(frame, name, interval='1m')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{name:<16} {elapsed_ms:>8.1f} {result.stats['trades']:>8} {result.stats['sharpe']:>8.2f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,89 @@
+"""
+Benchmark the registry/NumPy indicator path against the original pandas
+implementation of calculate_indicators.
+
+Run from the repository root:
+    python -m benchmarks.bench_indicators [sizes...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, compute_indicators
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def legacy_calculate_indicators(data):
+    """calculate_indicators as it was before the indicator registry"""
+    data['MA20'] = data['Close'].rolling(window=20).mean()
+    data['MA50'] = data['Close'].rolling(window=50).mean()
+    data['MA200'] = data['Close'].rolling(window=200).mean()
+
+    delta = data['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    data['RSI'] = 100 - (100 / (1 + rs))
+
+    exp1 = data['Close'].ewm(span=12, adjust=False).mean()
+    exp2 = data['Close'].ewm(span=26, adjust=False).mean()
+    data['MACD'] = exp1 - exp2
+    data['Signal_Line'] = data['MACD'].ewm(span=9, adjust=False).mean()
+
+    data['BB_middle'] = data['Close'].rolling(window=20).mean()
+    data['BB_upper'] = data['BB_middle'] + 2 * data['Close'].rolling(window=20).std()
+    data['BB_lower'] = data['BB_middle'] - 2 * data['Close'].rolling(window=20).std()
+    return data
+
+
+def synthetic_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    index = pd.date_range('2015-01-01', periods=n, freq='min', tz='UTC')
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1.0},
+                        index=index)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(sizes):
+    print(f"{'bars':>10} {'pandas ms':>10} {'registry ms':>12} {'speedup':>8} "
+          f"{'MA20+RSI ms':>12} {'max rel err':>12}")
+    for n in sizes:
+        frame = synthetic_frame(n)
+        repeat = 5 if n <= 100_000 else 2
+        legacy_s = best_of(lambda: legacy_calculate_indicators(frame.copy()), repeat)
+        copy_s = best_of(lambda: frame.copy(), repeat)
+        new_s = best_of(lambda: compute_indicators(frame['Close']), repeat)
+        subset_s = best_of(lambda: compute_indicators(frame['Close'], ['MA20', 'RSI']), repeat)
+
+        expected = legacy_calculate_indicators(frame.copy())
+        actual = compute_indicators(frame['Close'])
+        max_err = 0.0
+        for column in INDICATOR_COLUMNS:
+            a = expected[column].to_numpy()
+            b = actual[column]
+            mask = ~np.isnan(a)
+            if not np.array_equal(mask, ~np.isnan(b)):
+                raise AssertionError(f"NaN layout differs for {column}")
+            err = np.abs(a[mask] - b[mask]) / np.maximum(np.abs(a[mask]), 1.0)
+            max_err = max(max_err, float(err.max(initial=0.0)))
+
+        legacy_ms = (legacy_s - copy_s) * 1000
+        new_ms = new_s * 1000
+        print(f"{n:>10} {legacy_ms:>10.1f} {new_ms:>12.1f} {legacy_ms / new_ms:>7.1f}x "
+              f"{subset_s * 1000:>12.1f} {max_err:>12.1e}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
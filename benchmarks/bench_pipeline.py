@@ -0,0 +1,264 @@
+"""
+Time the fetch -> indicators -> render pipeline offline and record the results.
+
+Two sweeps run against the deterministic stub provider:
+  * per interval: get_btc_data on an empty store (including the chunked
+    intraday loop) and again warm, plus the Flask routes that serve it
+  * basket: get_market_data for several symbols in batched requests against
+    one request per symbol, then indicators and a backtest over the wide frame
+  * per size: store round-trip, calculate_indicators (on a float64 frame and
+    on a compact BarSeries), the /api/bars encodings (Arrow and JSON, each
+    plain, gzip and zstd, with their payload sizes), build_chart_figures and
+    create_interactive_charts on 1k to 5M synthetic one-minute bars. Figures
+    are also built through plotly's validating objects (CHART_VALIDATE) and,
+    up to FULL_RESOLUTION_MAX_BARS, without downsampling
+
+Each stage records wall time and, from a second traced run, peak traced
+memory. Results are written as JSON, and --compare prints the ratio against
+an earlier results file.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline [--sizes 1000 100000] [--output bench.json]
+    python -m benchmarks.bench_pipeline --compare old.json new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import backtest
+import bar_api
+import bar_store
+import btc_chart
+import compact_bars
+import prefetch
+from benchmarks.bench_indicators import synthetic_frame
+from benchmarks.stub_provider import offline
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+DEFAULT_OUTPUT = 'bench_results.json'
+# Largest size whose figures are also built and serialized at full resolution
+FULL_RESOLUTION_MAX_BARS = 1_000_000
+BASKET = ['BTC-USD', 'ETH-USD', 'SOL-USD', 'XRP-USD', 'ADA-USD', 'DOGE-USD', 'LTC-USD', 'DOT-USD']
+
+
+def measure(results, stage, func, reset=None, trace=True, **labels):
+    """
+    Time func and append a result row
+    Args:
+        results (list): Rows collected so far
+        stage (str): Stage name
+        func (callable): The work to time
+        reset (callable): Restores the starting state before the traced rerun (optional)
+        trace (bool): Rerun func under tracemalloc to record its peak memory. Tracing
+            slows Python-heavy code, so timings always come from the untraced run.
+        **labels: Extra columns, e.g. interval and bars
+    Returns:
+        The value returned by func
+    """
+    started = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - started
+
+    peak_mb = None
+    if trace:
+        if reset is not None:
+            reset()
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+
+    row = {'stage': stage, **labels, 'seconds': round(elapsed, 6),
+           'peak_mb': None if peak_mb is None else round(peak_mb, 3)}
+    results.append(row)
+    peak = '' if peak_mb is None else f"{peak_mb:>9.1f} MB"
+    print(f"{stage:<26} {labels.get('interval', ''):>5} {labels.get('bars', ''):>9} "
+          f"{elapsed * 1000:>10.1f} ms {peak}")
+    return value
+
+
+def interval_sweep(results, latency):
+    """get_btc_data cold and warm for every interval, then the Flask routes on a warm store"""
+    prefetch.PREFETCH_ENABLED = False
+    from app import create_app
+
+    with offline(latency=latency) as provider, tempfile.TemporaryDirectory(prefix='bench-bars-') as root:
+        stores = iter(range(1_000_000))
+
+        def empty_store():
+            bar_store._store = bar_store.BarStore(os.path.join(root, str(next(stores))))
+
+        for interval in btc_chart.INTERVAL_LIMITS:
+            calls = {}
+
+            def fetch():
+                before = provider.calls
+                data = btc_chart.get_btc_data(interval=interval)
+                calls['provider'] = provider.calls - before
+                return data
+
+            empty_store()
+            data = measure(results, 'fetch_cold', fetch, reset=empty_store, interval=interval)
+            results[-1].update(bars=len(data), provider_calls=calls['provider'])
+            measure(results, 'fetch_warm', fetch, interval=interval, bars=len(data))
+
+        # Routes share one store; the first request of each range renders and
+        # publishes chart artifacts, so it is not rerun for memory
+        empty_store()
+        client = create_app().test_client()
+        for interval in ('1d', '1h', '5m'):
+            body = {'interval': interval, 'start_date': '2015-01-01'}
+            measure(results, 'route_update_chart', lambda: client.post('/update_chart', json=body),
+                    trace=False, interval=interval)
+            measure(results, 'route_update_chart_hit', lambda: client.post('/update_chart', json=body),
+                    interval=interval)
+        measure(results, 'route_dashboard', lambda: client.get('/'), trace=False, interval='1d')
+        measure(results, 'route_chart_range',
+                lambda: client.get('/chart_range?interval=1d&from=2020-01-01&to=2020-06-30'), interval='1d')
+
+
+def basket_sweep(results, latency, symbols=BASKET):
+    """Batched against per-symbol fetches of a basket, then the wide indicator and backtest pass"""
+    for interval in ('1d', '1h'):
+        for stage, batches in (('fetch_basket_batched', [symbols]),
+                               ('fetch_basket_sequential', [[symbol] for symbol in symbols])):
+            with offline(latency=latency) as provider:
+                measure(results, stage, lambda: [btc_chart.get_market_data(batch, interval=interval)
+                                                 for batch in batches],
+                        trace=False, interval=interval)
+                results[-1].update(symbols=len(symbols), provider_calls=provider.calls)
+                wide = btc_chart.get_market_data(symbols, interval=interval)
+
+        labels = {'interval': interval, 'bars': len(wide), 'symbols': len(symbols)}
+        measure(results, 'basket_indicators', lambda: btc_chart.calculate_indicators(wide), **labels)
+        measure(results, 'basket_backtest', lambda: backtest.run_backtest(wide, 'macd_cross', interval=interval),
+                **labels)
+
+
+def size_sweep(results, sizes):
+    """Store, indicator and render stages on synthetic frames of each size"""
+    for n in sizes:
+        frame = synthetic_frame(n)
+        with tempfile.TemporaryDirectory(prefix='bench-bars-') as store_dir:
+            store = bar_store.BarStore(store_dir)
+            bars = bar_store.bars_from_frame(frame)
+
+            def empty_store():
+                for key in store.partitions('BTC-USD', '1m'):
+                    os.remove(store._partition_path('BTC-USD', '1m', key))
+
+            measure(results, 'store_write', lambda: store.write('BTC-USD', '1m', bars),
+                    reset=empty_store, bars=n)
+            measure(results, 'store_read',
+                    lambda: bar_store.bars_to_frame(store.read('BTC-USD', '1m'), '1m'), bars=n)
+
+        measure(results, 'calculate_indicators', lambda: btc_chart.calculate_indicators(frame.copy()), bars=n)
+        series = measure(results, 'compact_indicators',
+                         lambda: compact_bars.BarSeries.from_bars(bars, 'BTC-USD', '1m').add_indicators(), bars=n)
+        # Formats and codings that are not installed are left out of the report
+        for fmt in bar_api.formats():
+            for encoding in (None, *bar_api.encodings()):
+                body = measure(results, f"api_{fmt}_{encoding or 'identity'}",
+                               lambda: b''.join(bar_api.encode(series, fmt, encoding)), bars=n)
+                results[-1]['payload_bytes'] = len(body)
+        del series
+        figures = measure(results, 'build_chart_figures', lambda: btc_chart.build_chart_figures(frame), bars=n)
+        measure(results, 'serialize_figures', lambda: btc_chart.figures_to_json(figures), bars=n)
+        btc_chart.CHART_VALIDATE = True
+        try:
+            measure(results, 'build_figures_validated', lambda: btc_chart.build_chart_figures(frame), bars=n)
+        finally:
+            btc_chart.CHART_VALIDATE = False
+        if n <= FULL_RESOLUTION_MAX_BARS:
+            full = measure(results, 'build_figures_full', lambda: btc_chart.build_chart_figures(frame, max_points=0),
+                           trace=False, bars=n)
+            measure(results, 'serialize_figures_full', lambda: btc_chart.figures_to_json(full), trace=False, bars=n)
+            del full
+        with tempfile.TemporaryDirectory(prefix='bench-charts-') as chart_dir:
+            measure(results, 'create_interactive_charts',
+                    lambda: btc_chart.create_interactive_charts(frame, chart_dir), bars=n)
+        del frame, figures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """Print new/old time ratios for every stage present in both result files"""
+    def load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        return report, {(r['stage'], r.get('interval'), r.get('bars')): r for r in report['results']}
+
+    old_report, old = load(old_path)
+    new_report, new = load(new_path)
+    print(f"{old_report.get('commit')} -> {new_report.get('commit')}")
+    print(f"{'stage':<26} {'int':>5} {'bars':>9} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for key, row in new.items():
+        if key not in old:
+            continue
+        stage, interval, bars = key
+        before, after = old[key]['seconds'], row['seconds']
+        ratio = after / before if before else float('nan')
+        flag = '  slower' if ratio > 1.2 else ''
+        print(f"{stage:<26} {interval or '':>5} {bars or '':>9} {before * 1000:>10.1f} "
+              f"{after * 1000:>10.1f} {ratio:>6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per stub provider call')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--skip-intervals', action='store_true')
+    parser.add_argument('--skip-basket', action='store_true')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Keep the per-call INFO logging of the pipeline out of the report
+    logging.disable(logging.INFO)
+    results = []
+    print(f"{'stage':<26} {'int':>5} {'bars':>9} {'time':>13} {'peak':>12}")
+    if not args.skip_intervals:
+        interval_sweep(results, args.latency)
+    if not args.skip_basket:
+        basket_sweep(results, args.latency)
+    size_sweep(results, args.sizes)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'latency': args.latency,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare what the dashboard transfers per page load in the two chart render
+modes: four self-contained HTML pages (CHART_RENDER_MODE=html) versus four
+figure JSON files plus one cacheable plotly.js (CHART_RENDER_MODE=json).
+
+Run from the repository root:
+    python -m benchmarks.bench_render_payload [bars]
+"""
+import gzip
+import sys
+import time
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import btc_chart
+from benchmarks.bench_indicators import synthetic_frame
+
+
+def sizes(payload):
+    raw = payload.encode('utf-8')
+    return len(raw), len(gzip.compress(raw, compresslevel=6))
+
+
+def run(n):
+    frame = synthetic_frame(n)
+    figures = btc_chart.build_chart_figures(frame)
+
+    html_raw = html_gz = json_raw = json_gz = 0
+    html_s = json_s = 0.0
+    for fig, name, title in figures:
+        started = time.perf_counter()
+        html = pio.to_html(fig, full_html=False, include_plotlyjs=True, config=btc_chart.CHART_CONFIG,
+                           include_mathjax=False, validate=False)
+        html_s += time.perf_counter() - started
+        raw, gz = sizes(html)
+        html_raw, html_gz = html_raw + raw, html_gz + gz
+
+        started = time.perf_counter()
+        payload = btc_chart.to_json(btc_chart.figure_payload(fig))
+        json_s += time.perf_counter() - started
+        raw, gz = sizes(payload)
+        json_raw, json_gz = json_raw + raw, json_gz + gz
+
+    js_raw, js_gz = sizes(get_plotlyjs())
+    mb = 1024 * 1024
+    print(f"{n} bars, 4 charts")
+    print(f"{'mode':<34} {'raw MB':>8} {'gzip MB':>8} {'serialize ms':>13}")
+    print(f"{'html (4 iframes, plotly.js x4)':<34} {html_raw / mb:>8.2f} {html_gz / mb:>8.2f} {html_s * 1000:>13.1f}")
+    print(f"{'json, first visit (+plotly.js)':<34} {(json_raw + js_raw) / mb:>8.2f} "
+          f"{(json_gz + js_gz) / mb:>8.2f} {json_s * 1000:>13.1f}")
+    print(f"{'json, plotly.js cached':<34} {json_raw / mb:>8.2f} {json_gz / mb:>8.2f} {json_s * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3650)
@@ -0,0 +1,160 @@
+"""
+Deterministic offline stand-in for yfinance, for benchmarks.
+
+Every bar is a pure function of its timestamp, the symbol and the seed, so
+any window returns the same bars however the range is chunked or batched,
+and repeated runs are comparable between commits.
+
+    with offline(latency=0.05) as provider:
+        data = btc_chart.get_btc_data(interval='1h')
+        print(provider.calls)
+"""
+import shutil
+import tempfile
+import zlib
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import btc_chart
+import rollup
+
+YEAR_NS = 365 * 86400 * 10**9
+
+
+def _uniform(ts, seed, stream):
+    """Uniform [0, 1) values hashed from timestamps (splitmix64)"""
+    with np.errstate(over='ignore'):
+        z = ts.astype(np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 + stream * 0xBF58476D1CE4E5B9 & (2**64 - 1))
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(2**53)
+
+
+def price_at(ts, seed=0):
+    """Synthetic BTC price at epoch-nanosecond timestamps: cycles plus hashed noise"""
+    t = ts.astype(np.float64) / YEAR_NS
+    trend = 0.35 * t + 0.4 * np.sin(2 * np.pi * t) + 0.08 * np.sin(2 * np.pi * t * 12.0)
+    noise = 0.004 * (_uniform(ts, seed, 0) - 0.5)
+    return 10000.0 * np.exp(trend - 0.35 * 53 + noise)
+
+
+def bar_starts(start_ns, end_ns, interval):
+    """Bar timestamps in [start_ns, end_ns) on the provider's grid for an interval"""
+    if end_ns <= start_ns:
+        return np.empty(0, dtype='<i8')
+    if interval in ('1mo', '1wk'):
+        step = 28 * 86400 * 10**9 if interval == '1mo' else 7 * 86400 * 10**9
+        candidates = np.arange(start_ns - step, end_ns + step, 86400 * 10**9 if interval == '1mo' else step,
+                               dtype='<i8')
+        starts = np.unique(rollup.bucket_start(candidates, interval))
+    else:
+        step = bar_store.INTERVAL_SECONDS[interval] * 10**9
+        starts = np.arange(-(-start_ns // step) * step, end_ns, step, dtype='<i8')
+    return starts[(starts >= start_ns) & (starts < end_ns)]
+
+
+def symbol_seed(seed, symbol):
+    """Seed of one symbol's series; BTC-USD keeps the base seed"""
+    return seed if symbol == 'BTC-USD' else seed + zlib.crc32(symbol.encode())
+
+
+def stub_bars(start, end, interval, seed):
+    """
+    One synthetic series over [start, end) in the layout of Ticker.history()
+    Returns:
+        pandas.DataFrame: OHLCV, Dividends and Stock Splits indexed by UTC bar start
+    """
+    ts = bar_starts(bar_store.to_ns(start), bar_store.to_ns(end), interval)
+    step = rollup.bucket_end(ts, interval) - ts if len(ts) else ts
+    open_ = price_at(ts, seed)
+    close = price_at(ts + step - 1, seed)
+    high = np.maximum(open_, close) * (1 + 0.002 * _uniform(ts, seed, 1))
+    low = np.minimum(open_, close) * (1 - 0.002 * _uniform(ts, seed, 2))
+    index = pd.DatetimeIndex(pd.to_datetime(ts, unit='ns', utc=True),
+                             name='Date' if interval in ('1d', '5d', '1wk', '1mo') else 'Datetime')
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Volume': 1e6 * (0.5 + _uniform(ts, seed, 3)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+
+
+class StubTicker:
+    """Answers Ticker.history() like yfinance, from price_at()"""
+
+    def __init__(self, provider, symbol):
+        self.provider = provider
+        self.symbol = symbol
+
+    def history(self, start=None, end=None, interval='1d', **kwargs):
+        self.provider.record(interval, start, end)
+        if self.provider.latency:
+            time.sleep(self.provider.latency)
+        return stub_bars(start, end, interval, symbol_seed(self.provider.seed, self.symbol))
+
+
+class StubProvider:
+    """
+    Offline provider with an optional per-request latency
+    Args:
+        seed (int): Selects the synthetic series
+        latency (float): Seconds each history() call sleeps, to model network round-trips
+    """
+
+    def __init__(self, seed=0, latency=0.0):
+        self.seed = seed
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, interval, start, end):
+        with self._lock:
+            self.calls += 1
+
+    def ticker(self, symbol):
+        return StubTicker(self, symbol)
+
+    def download(self, symbols, start, end, interval):
+        """Answers a batched yf.download(group_by='ticker') with one provider call"""
+        self.record(interval, start, end)
+        if self.latency:
+            time.sleep(self.latency)
+        frames = {symbol: stub_bars(start, end, interval, symbol_seed(self.seed, symbol))
+                  .drop(columns=['Dividends', 'Stock Splits']) for symbol in symbols}
+        return pd.concat(frames, axis=1)
+
+
+@contextmanager
+def offline(seed=0, latency=0.0, store_dir=None):
+    """
+    Route btc_chart's provider, single and batched, to a StubProvider and give it
+    an empty bar store
+    Args:
+        seed (int): Selects the synthetic series
+        latency (float): Seconds per provider call
+        store_dir (str): Bar store directory (optional, defaults to a temporary one)
+    Yields:
+        StubProvider: Counts the provider calls made inside the block
+    """
+    provider = StubProvider(seed, latency)
+    temporary = store_dir is None
+    store_dir = store_dir or tempfile.mkdtemp(prefix='bench-bars-')
+    saved = btc_chart._get_ticker, btc_chart._download, bar_store._store
+    btc_chart._get_ticker, btc_chart._download = provider.ticker, provider.download
+    bar_store._store = bar_store.BarStore(store_dir)
+    try:
+        yield provider
+    finally:
+        btc_chart._get_ticker, btc_chart._download, bar_store._store = saved
+        if temporary:
+            shutil.rmtree(store_dir, ignore_errors=True)
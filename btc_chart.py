@@ -1,13 +1,20 @@
 import warnings
 import pandas as pd
 from pandas import DataFrame
-import yfinance as yf
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import hashlib
 import numpy as np
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import bar_store
+import compact_bars
+import metrics
+import rollup
+import downsample
+from indicators import INDICATOR_COLUMNS, INDICATOR_LOOKBACK_BARS, compute_indicators
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +23,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# plotly and yfinance are imported inside the functions that use them, so
+# importing this module (and the app) stays cheap; warm_up() loads them ahead
+# of time where that pays off
+
 # Filter out specific warnings
 warnings.filterwarnings('ignore', category=FutureWarning, module='yfinance.utils')
 warnings.filterwarnings('ignore', category=FutureWarning, module='pandas.core.frame')
@@ -23,151 +34,631 @@ warnings.filterwarnings('ignore', category=FutureWarning, module='pandas.core.fr
 # Get the directory where the script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def get_btc_data(start="2008-01-01", end=None, interval="1d") -> DataFrame:
+# Define interval limits and chunks
+INTERVAL_LIMITS = {
+    # Minute intervals
+    '1m':  {'days': 7, 'chunk_size': 7},
+    '2m':  {'days': 7, 'chunk_size': 7},
+    '5m':  {'days': 7, 'chunk_size': 7},
+    '15m': {'days': 7, 'chunk_size': 7},
+    '30m': {'days': 7, 'chunk_size': 7},
+    '60m': {'days': 7, 'chunk_size': 7},
+    # Hourly interval
+    '1h':  {'days': 730, 'chunk_size': 30},  # 2 years
+    # Daily and above
+    '1d':  {'days': 365*10, 'chunk_size': None},  # 10 years
+    '5d':  {'days': 365*5,  'chunk_size': None},  # 5 years
+    '1wk': {'days': 365*5,  'chunk_size': None},  # 5 years
+    '1mo': {'days': 365*10, 'chunk_size': None}   # 10 years
+}
+
+# Intraday chunk downloads: at most MAX_CHUNKS windows, FETCH_WORKERS at a time,
+# each tried FETCH_RETRIES times with exponential backoff
+MAX_CHUNKS = 100
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '4'))
+FETCH_RETRIES = 3
+FETCH_BACKOFF_SECONDS = 0.5
+
+# Times the lookback before a range is widened when sessions or gaps leave it short of bars
+LOOKBACK_WIDENINGS = 3
+
+# Skip provider top-ups when the store was refreshed less than this many seconds ago
+STORE_REFRESH_SECONDS = int(os.getenv('STORE_REFRESH_SECONDS', '60'))
+
+# Chart output: 'json' writes figure JSON for the single-page dashboard, which
+# loads plotly.js once; 'html' writes self-contained pages for iframes
+CHART_RENDER_MODE = os.getenv('CHART_RENDER_MODE', 'json')
+
+CHART_CONFIG = {
+    'displayModeBar': True,
+    'scrollZoom': False,
+    'showTips': True,
+    'responsive': True,
+    'displaylogo': False,
+    'modeBarButtonsToAdd': ['select2d', 'lasso2d'],
+    'modeBarButtonsToRemove': ['autoScale2d', 'zoomIn2d', 'zoomOut2d']
+}
+
+# Longest trace drawn as-is; longer histories are downsampled (0 disables)
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '2000'))
+
+# Line downsampling method: 'lttb' or 'minmax'
+CHART_LINE_METHOD = os.getenv('CHART_LINE_METHOD', 'lttb')
+
+# Figures are built as plain dicts; set to 1 to pass them through plotly's
+# validating graph objects, e.g. while changing the chart definitions
+CHART_VALIDATE = os.getenv('CHART_VALIDATE', '0') == '1'
+
+_plotly_js_asset = None
+_chart_template = None
+
+def _get_ticker(symbol):
+    """Return the provider ticker object for a symbol"""
+    import yfinance as yf
+    return yf.Ticker(symbol)
+
+def _download(symbols, start, end, interval) -> DataFrame:
+    """
+    Fetch several symbols from the provider in one batched request
+    Returns:
+        pandas.DataFrame: Columns keyed by (symbol, field), rows aligned across symbols.
+            Symbols yfinance reports as failed are left out.
+    """
+    import yfinance as yf
+    hist = yf.download(list(symbols), start=start, end=end, interval=interval, group_by='ticker',
+                       auto_adjust=True, threads=True, progress=False)
+    # yf.download only logs per-symbol failures and leaves their columns empty
+    errors = {symbol: yf.shared._ERRORS[symbol.upper()] for symbol in symbols
+              if symbol.upper() in yf.shared._ERRORS}
+    if errors:
+        logger.warning(f"Download failed for {', '.join(f'{s} ({e})' for s, e in errors.items())}")
+        if isinstance(hist.columns, pd.MultiIndex):
+            hist = hist.drop(columns=list(errors), level=0, errors='ignore')
+    return hist
+
+def _split_download(hist, symbols) -> dict:
+    """
+    Split a batched download into one frame per symbol, dropping rows a symbol has no bar for
+    Returns:
+        dict: symbol -> pandas.DataFrame, only for symbols with at least one bar. A symbol
+            whose columns are missing or all NaN failed inside the batch.
     """
-    Download BTC-USD data from Yahoo Finance
+    if not isinstance(hist.columns, pd.MultiIndex):
+        frames = {symbols[0]: hist.dropna(subset=['Close'])} if 'Close' in hist else {}
+    else:
+        present = set(hist.columns.get_level_values(0))
+        frames = {symbol: hist[symbol].dropna(subset=['Close']) for symbol in symbols if symbol in present}
+    return {symbol: frame for symbol, frame in frames.items() if len(frame) > 0}
+
+def _plan_chunks(start_date, end_date, chunk_size):
+    """Split [start_date, end_date) into chunk windows, newest first"""
+    plan = []
+    current_end = end_date
+    while current_end > start_date and len(plan) < MAX_CHUNKS:
+        current_start = max(current_end - pd.Timedelta(days=chunk_size), start_date)
+        plan.append((current_start, current_end))
+        current_end = current_start
+    return plan
+
+def _fetch_chunk(symbols, start_date, end_date, interval) -> dict:
+    """
+    Fetch one window for every symbol, retrying with exponential backoff. A single
+    symbol goes through Ticker.history, several share one batched download; a
+    retry asks only for the symbols that have failed so far.
+    Returns:
+        dict: symbol -> pandas.DataFrame of raw provider data, possibly empty. Symbols
+            still failing after the last attempt are left out.
+    Raises:
+        Exception: The last error, when no symbol could be fetched
+    """
+    hists = {}
+    pending = list(symbols)
+    for attempt in range(1, FETCH_RETRIES + 1):
+        try:
+            with metrics.span('provider.history', interval=interval, symbols=len(pending)):
+                if len(pending) == 1:
+                    # By default history() logs HTTP and parse errors and returns an empty frame
+                    hists[pending[0]] = _get_ticker(pending[0]).history(start=start_date, end=end_date,
+                                                                        interval=interval, raise_errors=True)
+                    pending = []
+                else:
+                    hists.update(_split_download(_download(pending, start_date, end_date, interval), pending))
+                    pending = [symbol for symbol in pending if symbol not in hists]
+            if pending:
+                raise RuntimeError(f"No data for {', '.join(pending)} in the batched download")
+            metrics.inc('upstream_requests_total', interval=interval, outcome='ok')
+            return hists
+        except Exception as e:
+            metrics.inc('upstream_requests_total', interval=interval, outcome='error')
+            if attempt == FETCH_RETRIES:
+                if not hists:
+                    raise
+                logger.error(f"Fetching {interval} data from {start_date} to {end_date} failed for "
+                             f"{', '.join(pending)}: {e}")
+                return hists
+            delay = FETCH_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Fetching {interval} data from {start_date} to {end_date} failed "
+                           f"(attempt {attempt}/{FETCH_RETRIES}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _fetch_history(symbols, start_date, end_date, interval):
+    """
+    Download bars from Yahoo Finance without touching the bar store
     Args:
-        start (str): Start date in YYYY-MM-DD format
-        end (str): End date in YYYY-MM-DD format (optional, defaults to current date)
-        interval (str): Data interval (1m, 2m, 5m, 15m, 30m, 60m, 1h, 1d, 5d, 1wk, 1mo)
+        symbols (list): Ticker symbols, fetched together in each window
+        start_date (datetime): Start of the range
+        end_date (datetime): End of the range (exclusive)
+        interval (str): Data interval
     Returns:
-        pandas.DataFrame: Historical BTC data
-    """
-    btc = yf.Ticker("BTC-USD")
-    
-    # Define interval limits and chunks
-    interval_limits = {
-        # Minute intervals
-        '1m':  {'days': 7, 'chunk_size': 7},
-        '2m':  {'days': 7, 'chunk_size': 7},
-        '5m':  {'days': 7, 'chunk_size': 7},
-        '15m': {'days': 7, 'chunk_size': 7},
-        '30m': {'days': 7, 'chunk_size': 7},
-        '60m': {'days': 7, 'chunk_size': 7},
-        # Hourly interval
-        '1h':  {'days': 730, 'chunk_size': 30},  # 2 years
-        # Daily and above
-        '1d':  {'days': 365*10, 'chunk_size': None},  # 10 years
-        '5d':  {'days': 365*5,  'chunk_size': None},  # 5 years
-        '1wk': {'days': 365*5,  'chunk_size': None},  # 5 years
-        '1mo': {'days': 365*10, 'chunk_size': None}   # 10 years
-    }
+        tuple: (dict of symbol -> pandas.DataFrame of raw provider data, possibly empty,
+                dict of symbol -> list of (start, end) windows that returned bars for it)
+    """
+    chunk_size = INTERVAL_LIMITS[interval]['chunk_size']
+    
+    if chunk_size is None:
+        # Fetch all data at once for daily and longer intervals
+        hists = _fetch_chunk(symbols, start_date, end_date, interval)
+        return hists, {symbol: [(start_date, end_date)] for symbol, hist in hists.items() if len(hist) > 0}
+    
+    # Fetch data in chunks for minute/hourly intervals, several at a time
+    plan = _plan_chunks(start_date, end_date, chunk_size)
+    chunks = [None] * len(plan)
+    failed = []
+    fetched = {}
     
-    if interval not in interval_limits:
+    with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(plan)))) as pool:
+        futures = {
+            pool.submit(_fetch_chunk, symbols, chunk_start, chunk_end, interval): i
+            for i, (chunk_start, chunk_end) in enumerate(plan)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            chunk_start, chunk_end = plan[i]
+            try:
+                chunk = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching {interval} chunk {chunk_start} to {chunk_end}: {e}")
+                failed.append((chunk_start, chunk_end))
+                continue
+            for symbol, frame in chunk.items():
+                if len(frame) > 0:
+                    fetched.setdefault(symbol, []).append((chunk_start, chunk_end))
+            if any(len(frame) > 0 for frame in chunk.values()):
+                chunks[i] = chunk
+            else:
+                logger.warning(f"No data available for period {chunk_start} to {chunk_end}")
+    
+    if failed:
+        logger.warning(f"{len(failed)} of {len(plan)} {interval} chunks failed: "
+                       + ", ".join(f"{s} to {e}" for s, e in sorted(failed)))
+    
+    chunks = [chunk for chunk in chunks if chunk is not None]
+    hists = {}
+    for symbol in symbols:
+        frames = [chunk[symbol] for chunk in reversed(chunks)  # Reverse to get chronological order
+                  if len(chunk.get(symbol, ())) > 0]
+        if not frames:
+            hists[symbol] = DataFrame()
+            continue
+        hist = pd.concat(frames)
+        hists[symbol] = hist[~hist.index.duplicated(keep='first')]  # Remove any duplicates
+    return hists, fetched
+
+def _top_up_store(store, symbols, start_date, end_date, interval) -> int:
+    """
+    Fetch from the provider only the parts of the range the bar store does not hold.
+    Symbols missing overlapping parts are fetched together in batched requests.
+    Args:
+        store (bar_store.BarStore): Bar store to fill
+        symbols (list): Ticker symbols
+        start_date (datetime): Start of the requested range
+        end_date (datetime): End of the requested range (exclusive)
+        interval (str): Data interval
+    Returns:
+        int: Number of bars received from the provider
+    """
+    gaps = {}
+    for symbol in symbols:
+        ranges = store.covered_ranges(symbol, interval, STORE_REFRESH_SECONDS)
+        missing = bar_store.missing_ranges(bar_store.to_ns(start_date), bar_store.to_ns(end_date), ranges)
+        # Build what finer stored bars already cover locally, fetch only the rest
+        missing = [part for gap_start, gap_end in missing
+                   for part in rollup.fill(store, symbol, interval, gap_start, gap_end, STORE_REFRESH_SECONDS)]
+        if missing:
+            gaps[symbol] = missing
+    
+    fetched = 0
+    # One request per merged window covers every symbol with a gap inside it
+    for window_start, window_end in bar_store.merge_ranges([list(g) for parts in gaps.values() for g in parts]):
+        batch = [symbol for symbol, parts in gaps.items()
+                 if any(s < window_end and e > window_start for s, e in parts)]
+        window_start_date = pd.Timestamp(window_start, tz='UTC').to_pydatetime()
+        window_end_date = pd.Timestamp(window_end, tz='UTC').to_pydatetime()
+        try:
+            hists, done = _fetch_history(batch, window_start_date, window_end_date, interval)
+        except Exception as e:
+            logger.error(f"Error fetching data from {window_start_date} to {window_end_date}: {e}")
+            continue
+        # Only windows that returned bars go into the manifest; a failed or empty
+        # window may be a provider outage, so the next call asks for it again
+        for symbol in batch:
+            bars = bar_store.bars_from_frame(hists.get(symbol, DataFrame()))
+            store.write(symbol, interval, bars)
+            windows = [[bar_store.to_ns(s), bar_store.to_ns(e)] for s, e in done.get(symbol, [])]
+            for done_start, done_end in bar_store.merge_ranges(windows):
+                store.mark_fetched(symbol, interval, done_start, done_end)
+                # Keep coarser series built from this one in step
+                rollup.propagate(store, symbol, interval, done_start, done_end, STORE_REFRESH_SECONDS)
+            fetched += len(bars)
+    return fetched
+
+def _stored_in_full(store, symbols):
+    """The stored predicate for _resolve_range: whether every symbol's bars of [start, end) have been fetched"""
+    def stored(interval, start, end):
+        # Fetched ranges as recorded: whether the head is still current does not
+        # matter for history the provider no longer serves anyway
+        return all(not bar_store.missing_ranges(start, end, store.manifest(symbol, interval)['ranges'])
+                   for symbol in symbols)
+    return stored
+
+def _resolve_range(start, end, interval, stored=None):
+    """
+    Validate the interval and clamp the range to what the provider serves for it.
+    stored (callable, optional) takes (interval, start_ns, end_ns) and tells
+    whether the store already holds that range in full, e.g. from ingest.py.
+    When it holds everything older than the provider's window, the range is
+    not clamped; the part inside the window is topped up as usual.
+    """
+    if interval not in INTERVAL_LIMITS:
         logger.warning(f"Invalid interval '{interval}'. Falling back to daily data.")
         interval = '1d'
     
-    end_date = datetime.strptime(end, "%Y-%m-%d") if end else datetime.now()
+    # Dates are naive UTC throughout, as bar_store.to_ns reads them; local time would
+    # move the head by the host's UTC offset
+    end_date = datetime.strptime(end, "%Y-%m-%d") if end else datetime.now(timezone.utc).replace(tzinfo=None)
     start_date = datetime.strptime(start, "%Y-%m-%d")
     
     # Check if requested date range exceeds the limit
-    max_days = interval_limits[interval]['days']
+    max_days = INTERVAL_LIMITS[interval]['days']
     date_range = (end_date - start_date).days
     
-    if date_range > max_days:
+    history_end = end_date - pd.Timedelta(days=max_days)
+    if date_range > max_days and stored is not None and stored(
+            interval, bar_store.to_ns(start_date), bar_store.to_ns(history_end)):
+        logger.info(f"Serving {date_range} days of {interval} bars from the bar store")
+    elif date_range > max_days:
         logger.warning(f"Requested date range ({date_range} days) exceeds maximum allowed ({max_days} days) for {interval} interval.")
         logger.info(f"Adjusting start date to {max_days} days before end date.")
-        start_date = end_date - pd.Timedelta(days=max_days)
+        start_date = history_end
+    return interval, start_date, end_date
+
+def _lookback_start(store, symbol, interval, start_date, end_date, bars):
+    """
+    Start of a range holding `bars` bars before start_date, or as many as the
+    history and the provider's window allow. The span starts at `bars` times the
+    interval and widens while sessions or gaps leave it short; the bars each
+    widening adds are fetched like any other missing range.
+    """
+    earliest = end_date - pd.Timedelta(days=INTERVAL_LIMITS[interval]['days'])
+    stored = _stored_in_full(store, [symbol])
+    span = pd.Timedelta(seconds=bars * bar_store.INTERVAL_SECONDS[interval])
+    lookback_start, found = start_date, 0
+    for _ in range(LOOKBACK_WIDENINGS + 1):
+        candidate = start_date - span
+        if candidate < earliest and not stored(interval, bar_store.to_ns(candidate), bar_store.to_ns(earliest)):
+            # The provider no longer serves these bars
+            candidate = earliest
+        if candidate >= lookback_start:
+            break
+        _top_up_store(store, [symbol], candidate, lookback_start, interval)
+        count = len(compact_bars.get_cache().get(symbol, interval, bar_store.to_ns(candidate),
+                                                 bar_store.to_ns(start_date)))
+        if count == found:
+            # Nothing older exists, e.g. before the symbol was listed
+            break
+        lookback_start, found = candidate, count
+        if found >= bars:
+            break
+        span *= 4
+    return lookback_start
+
+def get_bars(symbol, start="2008-01-01", end=None, interval="1d", indicators=None) -> compact_bars.BarSeries:
+    """
+    Load one symbol's bars as a compact BarSeries, serving them from the local
+    bar store and fetching only missing ranges from Yahoo Finance
+    Args:
+        symbol (str): Ticker symbol, e.g. 'BTC-USD'
+        start (str): Start date in YYYY-MM-DD format
+        end (str): End date in YYYY-MM-DD format (optional, defaults to current date)
+        interval (str): Data interval (1m, 2m, 5m, 15m, 30m, 60m, 1h, 1d, 5d, 1wk, 1mo)
+        indicators (list): Indicators to add (optional). They are computed from
+            INDICATOR_LOOKBACK_BARS bars before start as well, so they match a
+            longer history from the first bar on.
+    Returns:
+        compact_bars.BarSeries: Bars in the range; the interval may fall back to 1d
+    """
+    store = bar_store.get_store()
+    interval, start_date, end_date = _resolve_range(start, end, interval, stored=_stored_in_full(store, [symbol]))
     
-    chunk_size = interval_limits[interval]['chunk_size']
+    started = time.perf_counter()
+    with metrics.span('get_btc_data.top_up', interval=interval):
+        fetched = _top_up_store(store, [symbol], start_date, end_date, interval)
+        load_start = start_date
+        if indicators:
+            load_start = _lookback_start(store, symbol, interval, start_date, end_date, INDICATOR_LOOKBACK_BARS)
+    metrics.inc('cache_requests_total', cache='bar_store', result='miss' if fetched else 'hit')
+    with metrics.span('get_btc_data.read', interval=interval):
+        series = compact_bars.get_cache().get(symbol, interval, bar_store.to_ns(load_start),
+                                              bar_store.to_ns(end_date))
+    if indicators:
+        series = series.add_indicators(indicators).slice(bar_store.to_ns(start_date))
     
-    if chunk_size is None:
-        # Fetch all data at once for daily and longer intervals
-        try:
-            hist = btc.history(start=start_date, end=end_date, interval=interval)
-        except Exception as e:
-            logger.error(f"Error fetching data: {e}")
-            logger.warning("Falling back to daily data.")
-            hist = btc.history(start=start_date, end=end_date, interval="1d")
+    if len(series) == 0:
+        if interval == '1d':
+            raise ValueError(f"No data available from {start_date} to {end_date}")
+        logger.warning("No data available for the specified interval. Falling back to daily data.")
+        return get_bars(symbol, start=start, end=end, interval='1d', indicators=indicators)
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if fetched:
+        logger.info(f"Cold cache: fetched {fetched} {interval} bars from provider, served {len(series)} in {elapsed_ms:.1f} ms")
     else:
-        # Fetch data in chunks for minute/hourly intervals
-        chunks = []
-        current_end = end_date
-        current_start = current_end - pd.Timedelta(days=chunk_size)
-        final_start = start_date
-        
-        while current_start >= final_start and len(chunks) < 100:  # Limit to 100 chunks for safety
-            try:
-                logger.info(f"Fetching {interval} data from {current_start} to {current_end}")
-                chunk = btc.history(start=current_start, end=current_end, interval=interval)
-                if len(chunk) > 0:
-                    chunks.append(chunk)
-                else:
-                    logger.warning(f"No data available for period {current_start} to {current_end}")
-                
-                current_end = current_start
-                current_start = current_end - pd.Timedelta(days=chunk_size)
-            except Exception as e:
-                logger.error(f"Error fetching chunk: {e}")
-                break
-        
-        if not chunks:
-            logger.warning("No data available for the specified interval. Falling back to daily data.")
-            hist = btc.history(start=start_date, end=end_date, interval="1d")
-        else:
-            hist = pd.concat(chunks[::-1])  # Reverse to get chronological order
-            hist = hist[~hist.index.duplicated(keep='first')]  # Remove any duplicates
+        logger.info(f"Warm cache: served {len(series)} {interval} bars from store in {elapsed_ms:.1f} ms")
+    return series
+
+def get_btc_bars(start="2008-01-01", end=None, interval="1d") -> compact_bars.BarSeries:
+    """BTC-USD bars as a compact BarSeries (see get_bars)"""
+    return get_bars("BTC-USD", start=start, end=end, interval=interval)
+
+def get_btc_data(start="2008-01-01", end=None, interval="1d") -> DataFrame:
+    """
+    Load BTC-USD data, serving it from the local bar store and fetching only
+    missing ranges from Yahoo Finance
+    Args:
+        start (str): Start date in YYYY-MM-DD format
+        end (str): End date in YYYY-MM-DD format (optional, defaults to current date)
+        interval (str): Data interval (1m, 2m, 5m, 15m, 30m, 60m, 1h, 1d, 5d, 1wk, 1mo)
+    Returns:
+        pandas.DataFrame: Historical BTC data, with float32 prices where
+            COMPACT_PRICE_TICK allows (see compact_bars)
+    """
+    series = get_btc_bars(start=start, end=end, interval=interval)
+    
+    with metrics.span('get_btc_data.to_frame', interval=series.interval):
+        hist = series.to_frame()
     
     # Forward fill missing values first, then backward fill any remaining NaNs
-    hist = hist.ffill().bfill()
+    with metrics.span('get_btc_data.clean', interval=series.interval):
+        hist = hist.ffill().bfill()
     
-    logger.info(f"Successfully fetched {len(hist)} data points with {interval} interval")
     logger.info(f"Date range: from {hist.index[0]} to {hist.index[-1]}")
     
     return hist
 
-def calculate_indicators(data: DataFrame) -> DataFrame:
+def get_market_data(symbols, start="2008-01-01", end=None, interval="1d") -> DataFrame:
+    """
+    Load several symbols into one frame aligned on a shared timestamp index,
+    fetching missing ranges for all of them in batched provider requests
+    Args:
+        symbols (list): Ticker symbols, e.g. ['BTC-USD', 'ETH-USD']
+        start (str): Start date in YYYY-MM-DD format
+        end (str): End date in YYYY-MM-DD format (optional, defaults to current date)
+        interval (str): Data interval (1m, 2m, 5m, 15m, 30m, 60m, 1h, 1d, 5d, 1wk, 1mo)
+    Returns:
+        pandas.DataFrame: Columns keyed by (field, symbol), so data['Close'] has one
+            column per symbol. Gaps are forward filled with zero volume; rows before
+            a symbol's first bar stay NaN.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        raise ValueError("No symbols requested")
+    store = bar_store.get_store()
+    interval, start_date, end_date = _resolve_range(start, end, interval, stored=_stored_in_full(store, symbols))
+    
+    started = time.perf_counter()
+    with metrics.span('get_market_data.top_up', interval=interval, symbols=len(symbols)):
+        fetched = _top_up_store(store, symbols, start_date, end_date, interval)
+    metrics.inc('cache_requests_total', cache='bar_store', result='miss' if fetched else 'hit')
+    
+    frames = {}
+    with metrics.span('get_market_data.read', interval=interval, symbols=len(symbols)):
+        for symbol in symbols:
+            series = compact_bars.get_cache().get(symbol, interval, bar_store.to_ns(start_date),
+                                                  bar_store.to_ns(end_date))
+            if len(series) == 0:
+                logger.warning(f"No {interval} data available for {symbol}")
+                continue
+            frames[symbol] = series.to_frame()
+    if not frames:
+        raise ValueError(f"No data available for {', '.join(symbols)} from {start_date} to {end_date}")
+    
+    with metrics.span('get_market_data.align', interval=interval, symbols=len(symbols)):
+        fields = {}
+        for column in bar_store.FRAME_COLUMNS.values():
+            # Building from a dict of Series takes the union of the symbols' timestamps
+            fields[column] = DataFrame({symbol: frame[column] for symbol, frame in frames.items()})
+        listed = fields['Close'].notna().cummax()
+        for column in ('Open', 'High', 'Low', 'Close'):
+            fields[column] = fields[column].ffill()
+        fields['Volume'] = fields['Volume'].fillna(0.0).where(listed)
+        data = pd.concat(fields, axis=1)
+        data.columns.names = ['field', 'symbol']
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Served {len(data)} aligned {interval} bars for {len(frames)} symbols "
+                f"({fetched} fetched from provider) in {elapsed_ms:.1f} ms")
+    return data
+
+def data_version(data: DataFrame) -> str:
+    """
+    Identify the bars in a frame. Only the head of a series is ever revised,
+    so the span, bar count and last bar are enough to tell versions apart.
+    """
+    last = data.iloc[-1]
+    return f"{len(data)}:{data.index[0].value}:{data.index[-1].value}:{last['Close']!r}:{last['Volume']!r}"
+
+def calculate_indicators(data: DataFrame, engine=None) -> DataFrame:
     """
     Calculate technical indicators
     Args:
-        data (pandas.DataFrame): Historical BTC data
+        data (pandas.DataFrame): Historical BTC data, or a get_market_data frame, whose
+            symbols are computed together in one pass over the 2-D close array
+        engine (indicators.IndicatorEngine): Optional streaming engine created with
+            keep_history=True. Only bars after engine.last_index are computed, earlier
+            rows are taken from the engine's history
     Returns:
-        pandas.DataFrame: Data with technical indicators
-    """
-    # Calculate moving averages
-    data['MA20'] = data['Close'].rolling(window=20).mean()
-    data['MA50'] = data['Close'].rolling(window=50).mean()
-    data['MA200'] = data['Close'].rolling(window=200).mean()
-    
-    # Calculate RSI
-    delta = data['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    data['RSI'] = 100 - (100 / (1 + rs))
-    
-    # Calculate MACD
-    exp1 = data['Close'].ewm(span=12, adjust=False).mean()
-    exp2 = data['Close'].ewm(span=26, adjust=False).mean()
-    data['MACD'] = exp1 - exp2
-    data['Signal_Line'] = data['MACD'].ewm(span=9, adjust=False).mean()
-    
-    # Calculate Bollinger Bands
-    data['BB_middle'] = data['Close'].rolling(window=20).mean()
-    data['BB_upper'] = data['BB_middle'] + 2 * data['Close'].rolling(window=20).std()
-    data['BB_lower'] = data['BB_middle'] - 2 * data['Close'].rolling(window=20).std()
+        pandas.DataFrame: Data with technical indicators. A multi-symbol frame is
+            returned as a new frame with one (indicator, symbol) column per pair.
+    """
+    with metrics.span('calculate_indicators', bars=len(data)):
+        if isinstance(data.columns, pd.MultiIndex):
+            close = data['Close']
+            values = compute_indicators(close)
+            dtype = np.result_type(*close.dtypes)
+            indicators = pd.concat({column: DataFrame(values[column].astype(dtype, copy=False), index=data.index,
+                                                      columns=close.columns)
+                                    for column in INDICATOR_COLUMNS}, axis=1)
+            data = pd.concat([data, indicators], axis=1)
+            data.columns.names = ['field', 'symbol']
+            return data
+        
+        if engine is not None:
+            new_bars = data if engine.last_index is None else data[data.index > engine.last_index]
+            engine.extend(new_bars)
+            history = engine.to_frame()
+            for column in INDICATOR_COLUMNS:
+                data[column] = history[column].reindex(data.index).astype(data['Close'].dtype, copy=False)
+            return data
+        
+        # Shared intermediates (the 20-bar mean and std, the EMAs) are computed once;
+        # indicators are stored at the precision of the prices they come from
+        values = compute_indicators(data['Close'])
+        for column in INDICATOR_COLUMNS:
+            data[column] = values[column].astype(data['Close'].dtype, copy=False)
     
     return data
 
-def create_chart_html(fig, filename, title):
+def plotly_js_asset() -> str:
+    """
+    Write the bundled plotly.js to static/js under a content-hashed name
+    Returns:
+        str: Path of the asset relative to the static folder
+    """
+    global _plotly_js_asset
+    if _plotly_js_asset is None:
+        from plotly.offline import get_plotlyjs
+        js = get_plotlyjs().encode('utf-8')
+        asset = f"js/plotly-{hashlib.sha256(js).hexdigest()[:12]}.min.js"
+        asset_path = os.path.join(SCRIPT_DIR, 'static', asset)
+        if not os.path.exists(asset_path):
+            os.makedirs(os.path.dirname(asset_path), exist_ok=True)
+            tmp_path = f"{asset_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(js)
+            os.replace(tmp_path, asset_path)
+            logger.info(f"Wrote plotly.js asset {asset}")
+        _plotly_js_asset = asset
+    return _plotly_js_asset
+
+def warm_up(interval='1d'):
+    """
+    Load what each worker would otherwise load on its first request: plotly and
+    yfinance, the chart template and trace validators, the plotly.js asset name
+    and the default series from the bar store. Meant to run before gunicorn
+    forks its workers so they share all of it copy-on-write.
+    Args:
+        interval (str): Series whose store partitions are read into the page cache
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    from plotly.subplots import make_subplots
+    import yfinance  # noqa: F401
+
+    started = time.perf_counter()
+    fig = make_subplots(rows=1, cols=1)
+    fig.add_trace(go.Candlestick())
+    fig.add_trace(go.Scatter())
+    fig.add_trace(go.Bar())
+    fig.update_layout(template='plotly_dark')
+    pio.json.to_json_plotly(figure_payload(fig))
+    chart_template()
+    plotly_js_asset()
+    bars = bar_store.get_store().read("BTC-USD", interval)
+    logger.info(f"Warmed up plotly and {len(bars)} {interval} bars in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def chart_template() -> dict:
+    """The plotly_dark template as the dict plotly.js expects in layout.template"""
+    global _chart_template
+    if _chart_template is None:
+        import plotly.io as pio
+        _chart_template = pio.templates['plotly_dark'].to_plotly_json()
+    return _chart_template
+
+def _json_default(value):
+    """Types orjson does not serialize itself"""
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, (pd.Index, pd.Series)):
+        return value.to_numpy()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _utc_dates(value):
+    """Naive datetime64 arrays as UTC indexes, which plotly's encoder writes with a +00:00 suffix"""
+    if isinstance(value, dict):
+        return {key: _utc_dates(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_utc_dates(item) for item in value]
+    if isinstance(value, np.ndarray) and value.dtype.kind == 'M':
+        return pd.DatetimeIndex(value, tz='UTC')
+    return value
+
+def to_json(payload) -> str:
+    """
+    Serialize figure payloads: NumPy arrays are written by orjson when it is
+    installed, otherwise plotly's encoder is used
+    """
+    try:
+        import orjson
+    except ImportError:
+        import plotly.io as pio
+        return pio.json.to_json_plotly(_utc_dates(payload))
+    # Naive datetime64 values are UTC, written with the same +00:00 suffix plotly uses
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+    return orjson.dumps(payload, default=_json_default, option=option).decode('utf-8')
+
+def figure_payload(fig) -> dict:
+    """Figure data, layout and config as the dashboard passes them to Plotly.react"""
+    figure = dict(fig) if isinstance(fig, dict) else fig.to_plotly_json()
+    figure['config'] = CHART_CONFIG
+    return figure
+
+def figures_to_json(figures) -> str:
+    """Serialize build_chart_figures output as one JSON object keyed by chart name"""
+    return to_json({name: figure_payload(fig) for fig, name, title in figures})
+
+def create_chart_json(fig, filename, output_dir=None):
+    """Create figure JSON (data, layout and config) for a chart component"""
+    chart_path = os.path.join(output_dir or os.path.join(SCRIPT_DIR, 'static', 'charts'), filename)
+    os.makedirs(os.path.dirname(chart_path), exist_ok=True)
+    with metrics.span('create_chart_json.serialize', chart=filename):
+        payload = to_json(figure_payload(fig))
+    with metrics.span('create_chart_json.write', chart=filename):
+        with open(chart_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+
+def create_chart_html(fig, filename, title, output_dir=None):
     """Create HTML file for a chart component"""
-    config = {
-        'displayModeBar': True,
-        'scrollZoom': False,
-        'showTips': True,
-        'responsive': True,
-        'displaylogo': False,
-        'modeBarButtonsToAdd': ['select2d', 'lasso2d'],
-        'modeBarButtonsToRemove': ['autoScale2d', 'zoomIn2d', 'zoomOut2d']
-    }
-    
-    chart_html = fig.to_html(
-        full_html=False,
-        include_plotlyjs=True,
-        config=config,
-        include_mathjax=False,
-        validate=True
-    )
+    import plotly.io as pio
+    with metrics.span('create_chart_html.to_html', chart=filename):
+        # Figures were validated when they were built, if at all (CHART_VALIDATE)
+        chart_html = pio.to_html(
+            fig,
+            full_html=False,
+            include_plotlyjs=True,
+            config=CHART_CONFIG,
+            include_mathjax=False,
+            validate=False
+        )
     
     html_template = """<!DOCTYPE html>
 <html lang="en">
@@ -197,148 +688,162 @@ def create_chart_html(fig, filename, title):
 </html>"""
     
     # Write to file
-    chart_path = os.path.join(SCRIPT_DIR, 'static', filename)
-    with open(chart_path, 'w', encoding='utf-8') as f:
-        f.write(html_template.format(title=title, chart_div=chart_html))
+    chart_path = os.path.join(output_dir or os.path.join(SCRIPT_DIR, 'static'), filename)
+    with metrics.span('create_chart_html.write', chart=filename):
+        with open(chart_path, 'w', encoding='utf-8') as f:
+            f.write(html_template.format(title=title, chart_div=chart_html))
 
-def create_interactive_charts(data):
-    """Create separate interactive charts for each component"""
+def _dates(index):
+    """Index values as naive UTC datetime64, which serialize without a per-value Python call"""
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.to_numpy()
+
+def _chart_layout(height, start_date, end_date, showlegend, **extra):
+    """Layout of a single-panel chart, as make_subplots(rows=1, cols=1) plus update_layout would give"""
+    return {
+        'template': chart_template(),
+        'height': height,
+        'showlegend': showlegend,
+        'margin': {'t': 0, 'l': 0, 'r': 0, 'b': 0},
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'type': 'date',
+                  'range': [start_date, end_date], 'autorange': False},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], **extra.pop('yaxis', {})},
+        **extra,
+    }
+
+def _hline(y, color):
+    """The shape fig.add_hline(y, line_dash='dash', line_color=color) adds"""
+    return {'type': 'line', 'xref': 'x domain', 'x0': 0, 'x1': 1, 'yref': 'y', 'y0': y, 'y1': y,
+            'line': {'color': color, 'dash': 'dash'}}
+
+def build_chart_figures(data, max_points=None, x_range=None, line_method=None):
+    """
+    Build the price, volume, MACD and RSI figures
+    Args:
+        data (pandas.DataFrame): Historical BTC data
+        max_points (int): Points per trace before downsampling kicks in
+            (optional, defaults to CHART_MAX_POINTS; 0 disables downsampling)
+        x_range (tuple): Only plot bars between these timestamps (optional);
+            indicators are still computed over all of data
+        line_method (str): Line reduction from downsample.LINE_METHODS
+            (optional, defaults to CHART_LINE_METHOD)
+    Returns:
+        list: (figure, file name stem, title) for each chart. Figures are
+            {'data', 'layout'} dicts of NumPy arrays, or plotly Figures when
+            CHART_VALIDATE is set. Downsampled figures carry
+            layout.meta = {'decimated': True}
+    """
     # Calculate indicators
     data = calculate_indicators(data)
+    if x_range is not None:
+        data = data.loc[x_range[0]:x_range[1]]
+        if data.empty:
+            raise ValueError(f"No bars between {x_range[0]} and {x_range[1]}")
     
     # Get the date range from the data
     start_date = data.index[0]
     end_date = data.index[-1]
     
-    # Create price chart with Bollinger Bands
-    price_fig = make_subplots(rows=1, cols=1, shared_xaxes=True)
-    price_fig.add_trace(go.Candlestick(
-        x=data.index, open=data['Open'], high=data['High'],
-        low=data['Low'], close=data['Close'], name='BTC-USD'
-    ))
-    
-    # Add Bollinger Bands
-    price_fig.add_trace(go.Scatter(
-        x=data.index, y=data['BB_upper'],
-        line=dict(color='gray', width=1, dash='dash'),
-        name='BB Upper'
-    ))
-    price_fig.add_trace(go.Scatter(
-        x=data.index, y=data['BB_lower'],
-        line=dict(color='gray', width=1, dash='dash'),
-        name='BB Lower', fill='tonexty'
-    ))
-    
-    # Add moving averages
-    price_fig.add_trace(go.Scatter(
-        x=data.index, y=data['MA20'],
-        line=dict(color='yellow', width=1),
-        name='20 MA'
-    ))
-    price_fig.add_trace(go.Scatter(
-        x=data.index, y=data['MA50'],
-        line=dict(color='blue', width=1),
-        name='50 MA'
-    ))
-    price_fig.add_trace(go.Scatter(
-        x=data.index, y=data['MA200'],
-        line=dict(color='red', width=1),
-        name='200 MA'
-    ))
-    
-    # Update price chart layout
-    price_fig.update_layout(
-        height=500,
-        template='plotly_dark',
-        showlegend=True,
-        margin=dict(t=0, l=0, r=0, b=0),
-        xaxis=dict(
-            type="date",
-            range=[start_date, end_date],
-            autorange=False
-        )
-    )
-    
-    # Create volume chart
-    volume_fig = make_subplots(rows=1, cols=1)
-    colors = ['red' if row['Open'] - row['Close'] >= 0 
-              else 'green' for index, row in data.iterrows()]
-    volume_fig.add_trace(go.Bar(
-        x=data.index,
-        y=data['Volume'],
-        marker_color=colors,
-        name='Volume'
-    ))
-    volume_fig.update_layout(
-        height=200,
-        template='plotly_dark',
-        showlegend=False,
-        margin=dict(t=0, l=0, r=0, b=0),
-        xaxis=dict(
-            type="date",
-            range=[start_date, end_date],
-            autorange=False
-        )
-    )
-    
-    # Create MACD chart
-    macd_fig = make_subplots(rows=1, cols=1)
-    macd_fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['MACD'],
-        line=dict(color='blue', width=1),
-        name='MACD'
-    ))
-    macd_fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['Signal_Line'],
-        line=dict(color='orange', width=1),
-        name='Signal Line'
-    ))
-    macd_fig.update_layout(
-        height=200,
-        template='plotly_dark',
-        showlegend=True,
-        margin=dict(t=0, l=0, r=0, b=0),
-        xaxis=dict(
-            type="date",
-            range=[start_date, end_date],
-            autorange=False
-        )
-    )
-    
-    # Create RSI chart
-    rsi_fig = make_subplots(rows=1, cols=1)
-    rsi_fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['RSI'],
-        line=dict(color='purple', width=1),
-        name='RSI'
-    ))
-    rsi_fig.add_hline(y=70, line_dash="dash", line_color="red")
-    rsi_fig.add_hline(y=30, line_dash="dash", line_color="green")
-    rsi_fig.update_layout(
-        height=200,
-        template='plotly_dark',
-        showlegend=False,
-        margin=dict(t=0, l=0, r=0, b=0),
-        xaxis=dict(
-            type="date",
-            range=[start_date, end_date],
-            autorange=False
-        ),
-        yaxis=dict(
-            range=[0, 100]
-        )
-    )
+    # Candles and volume are aggregated into buckets, lines are thinned separately
+    if max_points is None:
+        max_points = CHART_MAX_POINTS
+    decimate = bool(max_points) and len(data) > max_points
+    # Frame columns are strided views of one block; orjson writes contiguous arrays only
+    columns = {c: np.ascontiguousarray(data[c].to_numpy()) for c in ['Open', 'High', 'Low', 'Close', 'Volume']}
+    x = _dates(data.index)
+    if decimate:
+        starts, *ohlcv = downsample.ohlcv_buckets(*columns.values(), max_points)
+        columns = dict(zip(columns, ohlcv))
+        bars_x = x[starts]
+        logger.info(f"Downsampled {len(data)} bars to {len(starts)} points per chart")
+    else:
+        bars_x = x
+    reduce_line = downsample.LINE_METHODS[line_method or CHART_LINE_METHOD]
+    x_ns = data.index.asi8
+    
+    def line(column, name, color, **extra):
+        """A line trace, thinned when the series is too long to draw"""
+        values = np.ascontiguousarray(data[column].to_numpy())
+        if decimate:
+            keep = reduce_line(x_ns, values, max_points)
+            trace_x, values = x[keep], values[keep]
+        else:
+            trace_x = x
+        return {'type': 'scatter', 'x': trace_x, 'y': values, 'name': name,
+                'line': {'color': color, 'width': 1, **extra.pop('line', {})}, **extra}
+    
+    # Price chart with Bollinger Bands and moving averages
+    price_fig = {
+        'data': [
+            {'type': 'candlestick', 'x': bars_x, 'open': columns['Open'], 'high': columns['High'],
+             'low': columns['Low'], 'close': columns['Close'], 'name': 'BTC-USD'},
+            line('BB_upper', 'BB Upper', 'gray', line={'dash': 'dash'}),
+            line('BB_lower', 'BB Lower', 'gray', line={'dash': 'dash'}, fill='tonexty'),
+            line('MA20', '20 MA', 'yellow'),
+            line('MA50', '50 MA', 'blue'),
+            line('MA200', '200 MA', 'red'),
+        ],
+        'layout': _chart_layout(500, start_date, end_date, showlegend=True),
+    }
+    
+    # Volume chart, red where the bar closed at or below its open
+    colors = np.where(columns['Open'] - columns['Close'] >= 0, 'red', 'green').tolist()
+    volume_fig = {
+        'data': [{'type': 'bar', 'x': bars_x, 'y': columns['Volume'], 'marker': {'color': colors},
+                  'name': 'Volume'}],
+        'layout': _chart_layout(200, start_date, end_date, showlegend=False),
+    }
     
+    # MACD chart
+    macd_fig = {
+        'data': [
+            line('MACD', 'MACD', 'blue'),
+            line('Signal_Line', 'Signal Line', 'orange'),
+        ],
+        'layout': _chart_layout(200, start_date, end_date, showlegend=True),
+    }
+    
+    # RSI chart with the overbought and oversold levels
+    rsi_fig = {
+        'data': [line('RSI', 'RSI', 'purple')],
+        'layout': _chart_layout(200, start_date, end_date, showlegend=False,
+                                yaxis={'range': [0, 100]}, shapes=[_hline(70, 'red'), _hline(30, 'green')]),
+    }
+    
+    figures = [
+        (price_fig, 'price_chart', 'BTC Price Chart'),
+        (volume_fig, 'volume_chart', 'BTC Volume Chart'),
+        (macd_fig, 'macd_chart', 'BTC MACD Chart'),
+        (rsi_fig, 'rsi_chart', 'BTC RSI Chart'),
+    ]
+    if decimate:
+        # The dashboard re-requests a bucketed view instead of appending raw streamed bars
+        for fig, _, _ in figures:
+            fig['layout']['meta'] = {'decimated': True}
+    if CHART_VALIDATE:
+        import plotly.graph_objects as go
+        figures = [(go.Figure(fig), name, title) for fig, name, title in figures]
+    return figures
+
+def create_interactive_charts(data, output_dir=None):
+    """
+    Create separate interactive charts for each component
+    Args:
+        data (pandas.DataFrame): Historical BTC data
+        output_dir (str): Directory for the chart files (optional, defaults to
+            static/ for HTML pages and static/charts/ for figure JSON)
+    """
     # Save all charts
-    create_chart_html(price_fig, 'price_chart.html', 'BTC Price Chart')
-    create_chart_html(volume_fig, 'volume_chart.html', 'BTC Volume Chart')
-    create_chart_html(macd_fig, 'macd_chart.html', 'BTC MACD Chart')
-    create_chart_html(rsi_fig, 'rsi_chart.html', 'BTC RSI Chart')
+    with metrics.span('build_chart_figures', bars=len(data)):
+        figures = build_chart_figures(data)
+    for fig, name, title in figures:
+        if CHART_RENDER_MODE == 'html':
+            create_chart_html(fig, f'{name}.html', title, output_dir)
+        else:
+            create_chart_json(fig, f'{name}.json', output_dir)
     
-    logger.info("All charts have been generated in the static directory")
+    logger.info(f"All charts have been generated in {output_dir or 'the static directory'}")
 
 def main():
     # Get BTC data - allow user to specify interval via environment variable
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Total size of rendered chart sets kept on disk before the least recently used are removed
+CHART_ARTIFACT_BYTES = int(os.getenv('CHART_ARTIFACT_BYTES', str(256 * 1024 * 1024)))
+
+
+def artifact_key(*inputs):
+    """Stable key for a chart set from everything that determines its content"""
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()[:16]
+
+
+class ArtifactStore:
+    """
+    Chart sets stored in one directory per key under root.
+
+    A set is written to a temporary directory and renamed into place, so a
+    reader sees either the complete set or nothing, and concurrent renders of
+    different ranges never share files. Each key's content is fixed once
+    published, which is what lets the files be cached as immutable.
+
+    Args:
+        root (str): Directory holding one sub-directory per chart set
+        max_bytes (int): Size budget; least recently used sets beyond it are removed
+    """
+
+    def __init__(self, root, max_bytes=CHART_ARTIFACT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.isdir(self.path(key))
+
+    def touch(self, key):
+        """Mark a set as recently used"""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def publish(self, key, write):
+        """
+        Return the directory for key, creating it with write() if it is missing
+        Args:
+            key (str): Artifact key, e.g. from artifact_key()
+            write (callable): Called with a directory to write the chart files into
+        Returns:
+            str: Directory of the published set
+        """
+        final = self.path(key)
+        if os.path.isdir(final):
+            self.touch(key)
+            metrics.inc('cache_requests_total', cache='chart_artifacts', result='hit')
+            logger.info(f"Reusing chart artifacts {key}")
+            return final
+        metrics.inc('cache_requests_total', cache='chart_artifacts', result='miss')
+
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            write(staging)
+            try:
+                os.rename(staging, final)
+            except OSError:
+                # Another render published the same key first; its files are identical
+                if not os.path.isdir(final):
+                    raise
+                logger.info(f"Chart artifacts {key} were published concurrently")
+        finally:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict(keep=key)
+        return final
+
+    def _sets(self):
+        """(mtime, size, key) for every published set"""
+        sets = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            sets.append((entry.stat().st_mtime, size, entry.name))
+        return sets
+
+    def evict(self, keep=None):
+        """Remove least recently used sets until the store fits in max_bytes"""
+        with self._lock:
+            sets = sorted(self._sets())
+            total = sum(size for _, size, _ in sets)
+            for _, size, key in sets:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                total -= size
+                metrics.inc('chart_artifacts_evicted_total')
+                logger.info(f"Evicted chart artifacts {key} ({size / 1024:.0f} KB)")
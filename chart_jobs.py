@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Job records shared by every worker process, so a poll can reach any of them
+CHART_JOB_DIR = os.getenv('CHART_JOB_DIR', os.path.join(SCRIPT_DIR, 'data', 'jobs'))
+
+# Threads per process that run queued chart builds
+CHART_JOB_WORKERS = int(os.getenv('CHART_JOB_WORKERS', '2'))
+
+# Jobs queued or running per process before new ones are turned away
+CHART_JOB_QUEUE_SIZE = int(os.getenv('CHART_JOB_QUEUE_SIZE', '16'))
+
+# Seconds from submission after which a job is reported as timed out
+CHART_JOB_TIMEOUT_SECONDS = float(os.getenv('CHART_JOB_TIMEOUT_SECONDS', '120'))
+
+# Seconds a finished job's result stays available to pollers
+CHART_JOB_RETENTION_SECONDS = 300
+
+# Seconds between reads of a job record owned by another process while a poll waits
+CHART_JOB_POLL_SECONDS = 0.1
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+
+QUEUED, RUNNING, DONE, FAILED, TIMEOUT = 'queued', 'running', 'done', 'failed', 'timeout'
+FINISHED = (DONE, FAILED, TIMEOUT)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """
+    One queued build and its outcome. Times are wall-clock epoch seconds,
+    because other worker processes compare them too.
+    Args:
+        key (tuple): Identifies identical work; used to dedupe in-flight jobs
+        deadline (float): time.time() value after which the job has timed out
+    """
+
+    def __init__(self, key, deadline):
+        self.id = secrets.token_hex(8)
+        self.key = key
+        self.deadline = deadline
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'seconds': round((self.finished or time.time()) - self.submitted, 3),
+        }
+
+    def to_record(self):
+        """Everything another process needs to report this job; the result must be JSON"""
+        return {'id': self.id, 'key': list(self.key), 'deadline': self.deadline, 'state': self.state,
+                'result': self.result, 'error': self.error, 'submitted': self.submitted,
+                'finished': self.finished}
+
+    @classmethod
+    def from_record(cls, record):
+        """A read-only copy of a job owned by another process"""
+        job = cls(tuple(record['key']), record['deadline'])
+        for field in ('id', 'state', 'result', 'error', 'submitted', 'finished'):
+            setattr(job, field, record[field])
+        if job.state not in FINISHED and time.time() > job.deadline:
+            # The owner is late to record the timeout, or has died
+            job.state, job.error = TIMEOUT, 'Timed out'
+        if job.state in FINISHED:
+            job.done.set()
+        return job
+
+
+class JobQueue:
+    """
+    Bounded executor for slow builds, so request threads return immediately.
+
+    Submitting a key that already has a queued or running job returns that
+    job instead of starting another. Once max_pending jobs are queued or
+    running, submit() raises QueueFull. A job still unfinished at its
+    deadline is reported as timed out and its key is released for a retry;
+    Python threads cannot be interrupted, so the build itself runs on and
+    keeps its slot until it returns, and its late result is discarded.
+
+    Every state change is also written to a JSON record in state_dir, so
+    under several worker processes get() answers for jobs submitted to any
+    of them. Deduplication and the max_pending limit stay per process.
+
+    Args:
+        workers (int): Builds run at the same time
+        max_pending (int): Queued plus running jobs accepted before rejecting
+        timeout (float): Seconds from submission to a job's deadline
+        state_dir (str): Directory shared by the worker processes for job
+            records (optional, None keeps jobs in this process only)
+    """
+
+    def __init__(self, workers=CHART_JOB_WORKERS, max_pending=CHART_JOB_QUEUE_SIZE,
+                 timeout=CHART_JOB_TIMEOUT_SECONDS, state_dir=CHART_JOB_DIR):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        # Threads are started on the first submit, so none exist before a fork
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-job')
+        self._jobs = {}
+        self._in_flight = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, key, func):
+        """
+        Queue func() under key, or return the job already in flight for key
+        Args:
+            key (tuple): Identifies identical work
+            func (callable): The build; its return value becomes the job result
+        Returns:
+            Job
+        Raises:
+            QueueFull: max_pending jobs are already queued or running
+        """
+        with self._lock:
+            self._expire_locked()
+            job_id = self._in_flight.get(key)
+            if job_id is not None:
+                metrics.inc('chart_jobs_total', outcome='deduplicated')
+                return self._jobs[job_id]
+            if self._pending >= self.max_pending:
+                metrics.inc('chart_jobs_total', outcome='rejected')
+                raise QueueFull(f"{self._pending} chart jobs are already queued or running")
+            job = Job(key, time.time() + self.timeout)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job.id
+            self._pending += 1
+            self._save_locked(job)
+        metrics.inc('chart_jobs_total', outcome='submitted')
+        logger.info(f"Queued chart job {job.id} for {key}")
+        self._remove_old_records()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        try:
+            with self._lock:
+                if job.state != QUEUED:
+                    return
+                if time.time() > job.deadline:
+                    self._finish_locked(job, TIMEOUT, error='Timed out waiting in the queue')
+                    return
+                job.state = RUNNING
+                self._save_locked(job)
+            metrics.observe('stage_duration_seconds', time.time() - job.submitted, stage='chart_job.queued')
+            try:
+                with metrics.span('chart_job.run', job=job.id):
+                    result = func()
+            except Exception as e:
+                logger.error(f"Chart job {job.id} failed: {e}")
+                with self._lock:
+                    if job.state == RUNNING:
+                        self._finish_locked(job, FAILED, error=str(e))
+                return
+            with self._lock:
+                if job.state == RUNNING and time.time() <= job.deadline:
+                    self._finish_locked(job, DONE, result=result)
+                    return
+                if job.state == RUNNING:
+                    self._finish_locked(job, TIMEOUT, error=f"Timed out after {self.timeout:.0f}s")
+            logger.warning(f"Chart job {job.id} finished after its deadline; result discarded")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _finish_locked(self, job, state, result=None, error=None):
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if self._in_flight.get(job.key) == job.id:
+            del self._in_flight[job.key]
+        self._save_locked(job)
+        metrics.inc('chart_jobs_total', outcome=state)
+        job.done.set()
+
+    def _record_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save_locked(self, job):
+        if not self.state_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.state_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(job.to_record(), f)
+            os.replace(tmp_path, self._record_path(job.id))
+        except OSError as e:
+            logger.error(f"Could not record chart job {job.id}: {e}")
+
+    def _load(self, job_id):
+        """A job submitted to another process, from its record"""
+        if not self.state_dir or not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._record_path(job_id), 'r', encoding='utf-8') as f:
+                return Job.from_record(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _remove_old_records(self):
+        """Delete records no process can still be reporting, e.g. those of a worker that exited"""
+        if not self.state_dir:
+            return
+        cutoff = time.time() - self.timeout - CHART_JOB_RETENTION_SECONDS
+        for entry in os.scandir(self.state_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _expire_locked(self):
+        """Time out overdue jobs and forget finished ones past their retention"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.state not in FINISHED and now > job.deadline:
+                logger.warning(f"Chart job {job_id} timed out after {self.timeout:.0f}s")
+                self._finish_locked(job, TIMEOUT, error=f"Timed out after {self.timeout:.0f}s")
+            elif job.state in FINISHED and now - job.finished > CHART_JOB_RETENTION_SECONDS:
+                del self._jobs[job_id]
+                if self.state_dir:
+                    try:
+                        os.remove(self._record_path(job_id))
+                    except OSError:
+                        pass
+
+    def get(self, job_id, wait=0.0):
+        """
+        Look up a job, optionally waiting a little for it to finish
+        Args:
+            job_id (str): Id returned by submit()
+            wait (float): Seconds to block while the job is unfinished (capped at its deadline)
+        Returns:
+            Job, or None when the id is unknown or has expired
+        """
+        with self._lock:
+            self._expire_locked()
+            job = self._jobs.get(job_id)
+        if job is None:
+            return self._wait_for_record(job_id, wait)
+        if job.state in FINISHED or wait <= 0:
+            return job
+        job.done.wait(max(0.0, min(wait, job.deadline - time.time())))
+        with self._lock:
+            self._expire_locked()
+        return job
+
+    def _wait_for_record(self, job_id, wait):
+        """Read another process's job, rereading its record while it is unfinished and wait lasts"""
+        until = time.time() + wait
+        job = self._load(job_id)
+        while job is not None and job.state not in FINISHED and time.time() < until:
+            time.sleep(CHART_JOB_POLL_SECONDS)
+            job = self._load(job_id) or job
+        return job
@@ -0,0 +1,247 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+import bar_store
+import metrics
+from bar_store import FRAME_COLUMNS, INTERVAL_SECONDS
+from indicators import INDICATOR_COLUMNS, IndicatorContext, compute_indicators
+
+logger = logging.getLogger(__name__)
+
+# Bytes of compact bars kept in memory; least recently used partitions beyond it are dropped
+BAR_MEMORY_BYTES = int(os.getenv('BAR_MEMORY_BYTES', str(256 * 1024 * 1024)))
+
+# Smallest price step that matters; prices are kept as float32 while it stays within half a step
+COMPACT_PRICE_TICK = float(os.getenv('COMPACT_PRICE_TICK', '0.01'))
+
+# Smallest volume step that matters, checked the same way; BTC-USD volumes in the 1e10
+# range need more digits than float32 has and stay float64
+COMPACT_VOLUME_TICK = float(os.getenv('COMPACT_VOLUME_TICK', '1'))
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+# float64 intermediates kept while computing indicators; evicted ones are recomputed
+INDICATOR_SCRATCH_SERIES = 4
+
+
+def price_dtype(prices, tick=COMPACT_PRICE_TICK):
+    """
+    float32 when every value survives the round trip within half a tick, else float64
+    Args:
+        prices (list): Price (or volume) arrays that must share a dtype
+        tick (float): Smallest meaningful step
+    Returns:
+        numpy.dtype
+    """
+    for values in prices:
+        values = np.asarray(values, dtype='float64')
+        with np.errstate(over='ignore', invalid='ignore'):
+            error = np.abs(values.astype('float32').astype('float64') - values)
+        if len(values) and not np.nanmax(error, initial=0.0) <= tick / 2:
+            return np.dtype('float64')
+    return np.dtype('float32')
+
+
+class BarSeries:
+    """
+    Bars of one series held as separate compact arrays.
+
+    Timestamps are int64 epoch nanoseconds, OHLC prices float32 unless that
+    would move a price by half a COMPACT_PRICE_TICK or more, and volume
+    float32 unless that would move a volume by half a COMPACT_VOLUME_TICK or
+    more. Indicators live in their own float32 arrays next to the bars
+    instead of as extra frame columns. slice() returns views, so narrowing
+    a series to a time range copies nothing.
+
+    Args:
+        symbol (str): Ticker symbol
+        interval (str): Bar interval
+        ts (numpy.ndarray): Bar start times, sorted
+        columns (dict): Field name ('open', 'high', 'low', 'close', 'volume') -> array
+        indicators (dict): Indicator name -> array (optional)
+    """
+
+    def __init__(self, symbol, interval, ts, columns, indicators=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.ts = ts
+        self.columns = columns
+        self.indicators = indicators or {}
+
+    @classmethod
+    def from_bars(cls, bars, symbol, interval, tick=COMPACT_PRICE_TICK, volume_tick=COMPACT_VOLUME_TICK):
+        """Copy BAR_DTYPE records into compact arrays"""
+        dtype = price_dtype([bars[field] for field in PRICE_FIELDS], tick)
+        columns = {field: np.array(bars[field], dtype=dtype) for field in PRICE_FIELDS}
+        columns['volume'] = np.array(bars['volume'], dtype=price_dtype([bars['volume']], volume_tick))
+        return cls(symbol, interval, np.array(bars['ts'], dtype='<i8'), columns)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join consecutive series into one (this copies)"""
+        first = parts[0]
+        if len(parts) == 1:
+            return first
+        names = set.intersection(*(set(part.indicators) for part in parts))
+        return cls(
+            first.symbol, first.interval,
+            np.concatenate([part.ts for part in parts]),
+            {field: np.concatenate([part.columns[field] for part in parts]) for field in first.columns},
+            {name: np.concatenate([part.indicators[name] for part in parts]) for name in names},
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ts, *self.columns.values(), *self.indicators.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def __getitem__(self, field):
+        return self.columns[field] if field in self.columns else self.indicators[field]
+
+    def slice(self, start=None, end=None):
+        """
+        Bars in [start, end) as views of this series' arrays
+        Args:
+            start (int): Inclusive start in epoch nanoseconds (optional)
+            end (int): Exclusive end in epoch nanoseconds (optional)
+        Returns:
+            BarSeries
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.ts, start, side='left'))
+        hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, end, side='left'))
+        return BarSeries(
+            self.symbol, self.interval, self.ts[lo:hi],
+            {field: values[lo:hi] for field, values in self.columns.items()},
+            {name: values[lo:hi] for name, values in self.indicators.items()},
+        )
+
+    def add_indicators(self, names=None):
+        """Compute indicators from the close prices into float32 arrays; returns self"""
+        close = self.columns['close']
+        # Hold a few float64 intermediates at a time instead of all of them, and
+        # narrow each indicator as soon as it is done
+        context = IndicatorContext(close, max_bytes=INDICATOR_SCRATCH_SERIES * len(close) * 8)
+        for name in names or INDICATOR_COLUMNS:
+            self.indicators[name] = compute_indicators(close, [name], context)[name].astype('float32')
+        return self
+
+    def to_frame(self, indicators=True) -> DataFrame:
+        """
+        The bars in the DataFrame layout returned by get_btc_data
+        Args:
+            indicators (bool): Append the indicator arrays as columns
+        Returns:
+            pandas.DataFrame: Columns keep the compact dtypes
+        """
+        index = pd.DatetimeIndex(pd.to_datetime(self.ts, unit='ns', utc=True))
+        index.name = 'Date' if INTERVAL_SECONDS.get(self.interval, 86400) >= 86400 else 'Datetime'
+        data = {column: self.columns[field] for field, column in FRAME_COLUMNS.items()}
+        if indicators:
+            data.update(self.indicators)
+        return DataFrame(data, index=index)
+
+
+class BarCache:
+    """
+    Compact copies of bar store partitions under a memory budget.
+
+    Every partition is already on disk in the bar store, so spilling a cold
+    partition only drops its compact copy; the next read maps it from the
+    store again. A cached copy is replaced when its partition file changes.
+
+    Args:
+        max_bytes (int): Memory budget for cached bars
+        store (bar_store.BarStore): Store to read from (optional, defaults to
+            the process-wide store at the time of each read)
+    """
+
+    def __init__(self, max_bytes=BAR_MEMORY_BYTES, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._segments = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def _segment(self, store, symbol, interval, key):
+        path = store._partition_path(symbol, interval, key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # Partitions are replaced by rename, so a rewrite changes the inode as well
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cache_key = (store.root, symbol, interval, key)
+        with self._lock:
+            cached = self._segments.get(cache_key)
+            if cached is not None and cached[0] == version:
+                self._segments.move_to_end(cache_key)
+                metrics.inc('cache_requests_total', cache='bar_memory', result='hit')
+                return cached[1]
+        metrics.inc('cache_requests_total', cache='bar_memory', result='miss')
+        segment = BarSeries.from_bars(store._load_partition(path), symbol, interval)
+        with self._lock:
+            previous = self._segments.pop(cache_key, None)
+            if previous is not None:
+                self._bytes -= previous[1].nbytes
+            self._segments[cache_key] = (version, segment)
+            self._bytes += segment.nbytes
+        return segment
+
+    def get(self, symbol, interval, start=None, end=None) -> BarSeries:
+        """
+        Bars of [start, end) as a BarSeries
+        Args:
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            start (int): Inclusive start in epoch nanoseconds (optional)
+            end (int): Exclusive end in epoch nanoseconds (optional)
+        Returns:
+            BarSeries: Views of the cached partition when the range lies in one, else a copy
+        """
+        store = self.store or bar_store.get_store()
+        parts = []
+        for key in store.partitions_between(symbol, interval, start, end):
+            segment = self._segment(store, symbol, interval, key)
+            if segment is not None:
+                part = segment.slice(start, end)
+                if len(part):
+                    parts.append(part)
+        self.spill()
+        if not parts:
+            empty = np.empty(0, dtype=bar_store.BAR_DTYPE)
+            return BarSeries.from_bars(empty, symbol, interval)
+        return BarSeries.concat(parts)
+
+    def spill(self):
+        """Drop least recently used partitions until the cache fits in max_bytes"""
+        with self._lock:
+            while self._bytes > self.max_bytes and self._segments:
+                cache_key, (_, segment) = self._segments.popitem(last=False)
+                self._bytes -= segment.nbytes
+                metrics.inc('bar_memory_spilled_total')
+                logger.debug(f"Spilled {cache_key[1]} {cache_key[2]} {cache_key[3]} "
+                             f"({segment.nbytes / 1024:.0f} KB) back to the bar store")
+
+
+_cache = None
+
+
+def get_cache() -> BarCache:
+    """Return the process-wide bar cache"""
+    global _cache
+    if _cache is None:
+        _cache = BarCache()
+    return _cache
@@ -0,0 +1,151 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Re-picking passes of the vectorized LTTB before it keeps the picks it has; price
+# series settle in about ten
+LTTB_MAX_PASSES = 64
+
+# Bucket width above which LTTB walks the buckets in order instead of re-picking
+LTTB_LOOP_WIDTH = 256
+
+
+def bucket_starts(n, buckets):
+    """Start offsets of `buckets` nearly equal, contiguous buckets over n points"""
+    buckets = max(1, min(buckets, n))
+    return np.linspace(0, n, buckets, endpoint=False).astype(np.int64)
+
+
+def ohlcv_buckets(open_, high, low, close, volume, max_points):
+    """
+    Aggregate bars into at most max_points buckets, preserving OHLCV semantics
+    Args:
+        open_, high, low, close, volume (numpy.ndarray): Bar columns
+        max_points (int): Maximum number of output bars
+    Returns:
+        tuple: (starts, open, high, low, close, volume) where starts are the
+            offsets of each bucket's first bar
+    """
+    starts = bucket_starts(len(close), max_points)
+    ends = np.append(starts[1:], len(close)) - 1
+    return (
+        starts,
+        open_[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[ends],
+        np.add.reduceat(volume, starts),
+    )
+
+
+def lttb(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets selection for a line series
+    Args:
+        x (numpy.ndarray): Numeric x values (e.g. epoch nanoseconds), increasing
+        y (numpy.ndarray): Values; leading/trailing NaNs (indicator warm-up) are kept out
+        max_points (int): Maximum number of points to keep
+    Returns:
+        numpy.ndarray: Sorted indices into x/y of the points to draw
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n <= max_points or max_points < 3:
+        return valid
+    xs = x[valid].astype('float64')
+    ys = y[valid]
+
+    # First and last points are always kept; the rest are split into equal buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    lo, hi = edges[:-1], edges[1:]
+    counts = hi - lo
+    mean_x = np.add.reduceat(xs[:n - 1], lo) / counts
+    mean_y = np.add.reduceat(ys[:n - 1], lo) / counts
+    # Third triangle vertex: the next bucket's average, or the last point for the last bucket
+    next_x = np.append(mean_x[1:], xs[-1])
+    next_y = np.append(mean_y[1:], ys[-1])
+
+    # Buckets as rows of a padded matrix; padding never wins the argmax
+    columns = np.arange(counts.max())
+    rows = lo[:, None] + columns
+    padding = columns >= counts[:, None]
+    rows[padding] = 0
+    rows_x, rows_y = xs[rows], ys[rows]
+
+    def pick(buckets, anchor_x, anchor_y):
+        """Index of the largest triangle in each of the given buckets"""
+        # Twice the triangle area, computed in place: |(a - c) x (b - a)| for anchor a,
+        # candidate b and next-bucket average c
+        areas = np.subtract(rows_y[buckets], anchor_y[:, None])
+        areas *= (anchor_x - next_x[buckets])[:, None]
+        dx = np.subtract(rows_x[buckets], anchor_x[:, None])
+        dx *= (next_y[buckets] - anchor_y)[:, None]
+        areas += dx
+        np.abs(areas, out=areas)
+        areas[padding[buckets]] = -1.0
+        return lo[buckets] + np.argmax(areas, axis=1)
+
+    # Each bucket is anchored on the point picked in the bucket before it
+    buckets = np.arange(len(lo))
+    if counts.max() > LTTB_LOOP_WIDTH:
+        # Wide buckets: the per-bucket work outweighs the loop, so walk them in order
+        chosen = np.empty(len(lo), dtype=np.int64)
+        anchor = np.zeros(1, dtype=np.int64)
+        for i in range(len(lo)):
+            anchor = pick(buckets[i:i + 1], xs[anchor], ys[anchor])
+            chosen[i] = anchor[0]
+    else:
+        # Pick every bucket at once against the previous bucket's average, then re-pick
+        # the buckets whose anchor moved until none does, which gives the sequential result
+        chosen = pick(buckets, np.append(xs[0], mean_x[:-1]), np.append(ys[0], mean_y[:-1]))
+        stale = buckets[1:]
+        for _ in range(LTTB_MAX_PASSES):
+            if not len(stale):
+                break
+            anchors = chosen[stale - 1]
+            picked = pick(stale, xs[anchors], ys[anchors])
+            moved = stale[picked != chosen[stale]]
+            chosen[stale] = picked
+            stale = moved[moved < len(lo) - 1] + 1
+    selected = np.concatenate([[0], chosen, [n - 1]])
+    return valid[selected]
+
+
+def minmax(x, y, max_points):
+    """
+    Keep each bucket's minimum and maximum, a cheap envelope-preserving reduction.
+    The first and last valid points are kept too, so the line spans the same range.
+    Args:
+        x (numpy.ndarray): Unused; present so minmax and lttb are interchangeable
+        y (numpy.ndarray): Values
+        max_points (int): Maximum number of points to keep
+    Returns:
+        numpy.ndarray: Sorted indices of the points to draw
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) == 0:
+        return valid
+    starts = bucket_starts(n, max(1, (max_points - 2) // 2))
+    filled = np.nan_to_num(y, nan=np.inf)
+    lows = np.minimum.reduceat(filled, starts)
+    filled = np.nan_to_num(y, nan=-np.inf)
+    highs = np.maximum.reduceat(filled, starts)
+    # Locate the first index in each bucket hitting its min/max
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    idx_min = np.flatnonzero(y == lows[bucket])
+    idx_max = np.flatnonzero(y == highs[bucket])
+    idx_min = idx_min[np.unique(bucket[idx_min], return_index=True)[1]]
+    idx_max = idx_max[np.unique(bucket[idx_max], return_index=True)[1]]
+    return np.union1d(np.union1d(idx_min, idx_max), valid[[0, -1]])
+
+
+# Line reductions selectable for chart rendering
+LINE_METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
@@ -0,0 +1,45 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and warmed up there, so
+plotly, pandas, yfinance and the bar store pages are loaded a single time and
+shared copy-on-write by every worker instead of being loaded per worker.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count()))))
+# /stream holds a connection per dashboard, so each worker serves requests from threads
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Each open /stream keeps one of those threads; cap them at half so chart updates and
+# job polls always have threads left (past the cap /stream answers 503)
+os.environ.setdefault('STREAM_MAX_CLIENTS', str(max(1, threads // 2)))
+timeout = 120
+preload_app = True
+
+# Background threads started in the master would not survive fork
+os.environ['DEFER_BACKGROUND_START'] = '1'
+
+# Each worker writes its metrics here and /metrics sums them, so any worker can answer a
+# scrape; samples left by an earlier run are dropped so its counters do not carry over
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'metrics'))
+shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def when_ready(server):
+    import btc_chart
+    btc_chart.warm_up(os.getenv('CHART_INTERVAL', '1d'))
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.fold_exited(worker.pid)
+
+
+def post_fork(server, worker):
+    import wsgi
+    if wsgi.app.prefetcher is not None:
+        wsgi.app.prefetcher.start()
@@ -0,0 +1,548 @@
+import logging
+import math
+import numbers
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from pandas import DataFrame
+
+logger = logging.getLogger(__name__)
+
+# Columns produced by calculate_indicators, in the order they are added
+INDICATOR_COLUMNS = [
+    'MA20', 'MA50', 'MA200',
+    'RSI',
+    'MACD', 'Signal_Line',
+    'BB_middle', 'BB_upper', 'BB_lower',
+]
+
+# Bars before a range that its indicators need to match those of a longer history.
+# The longest window is 200 (MA200); EMAs never fully forget their start, but
+# after 300 bars its weight in MACD and the signal line is below 1e-10
+INDICATOR_LOOKBACK_BARS = 300
+
+
+class RollingMean:
+    """
+    Fixed-window mean updated in O(1) per value.
+
+    Mirrors pandas' rolling mean: a Kahan-compensated running sum with
+    separate compensation for added and removed values, exact results for
+    runs of identical values and sign clamping.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._values = deque()
+        self._sum = 0.0
+        self._add_comp = 0.0
+        self._remove_comp = 0.0
+        self._neg_count = 0
+        self._same_count = 0
+        self._prev = math.nan
+
+    def push(self, value):
+        if len(self._values) == self.window:
+            old = self._values.popleft()
+            y = -old - self._remove_comp
+            t = self._sum + y
+            self._remove_comp = t - self._sum - y
+            self._sum = t
+            if math.copysign(1.0, old) < 0:
+                self._neg_count -= 1
+        self._values.append(value)
+        y = value - self._add_comp
+        t = self._sum + y
+        self._add_comp = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, value) < 0:
+            self._neg_count += 1
+        self._same_count = self._same_count + 1 if value == self._prev else 1
+        self._prev = value
+        return self.value
+
+    @property
+    def value(self):
+        count = len(self._values)
+        if count < self.window:
+            return math.nan
+        if self._same_count >= count:
+            return self._prev
+        result = self._sum / count
+        if self._neg_count == 0 and result < 0:
+            return 0.0
+        if self._neg_count == count and result > 0:
+            return 0.0
+        return result
+
+
+class RollingStd:
+    """
+    Fixed-window sample standard deviation (ddof=1) updated in O(1) per value.
+
+    Uses the same compensated Welford add/remove steps as pandas' rolling var.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._values = deque()
+        self._mean = 0.0
+        self._ssqdm = 0.0
+        self._add_comp = 0.0
+        self._remove_comp = 0.0
+        self._same_count = 0
+        self._prev = math.nan
+
+    def push(self, value):
+        if len(self._values) == self.window:
+            old = self._values.popleft()
+            count = len(self._values)
+            if count:
+                prev_mean = self._mean - self._remove_comp
+                y = old - self._remove_comp
+                t = y - self._mean
+                self._remove_comp = t + self._mean - y
+                self._mean = self._mean - t / count
+                self._ssqdm = self._ssqdm - (old - prev_mean) * (old - self._mean)
+            else:
+                self._mean = 0.0
+                self._ssqdm = 0.0
+        self._values.append(value)
+        count = len(self._values)
+        self._same_count = self._same_count + 1 if value == self._prev else 1
+        self._prev = value
+        prev_mean = self._mean - self._add_comp
+        y = value - self._add_comp
+        t = y - self._mean
+        self._add_comp = t + self._mean - y
+        self._mean = self._mean + t / count
+        self._ssqdm = self._ssqdm + (value - prev_mean) * (value - self._mean)
+        return self.value
+
+    @property
+    def value(self):
+        count = len(self._values)
+        if count < self.window or count < 2:
+            return math.nan
+        if self._same_count >= count:
+            return 0.0
+        var = self._ssqdm / (count - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class EMA:
+    """Exponential moving average matching pandas' ewm(span=..., adjust=False).mean()"""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self._old_weight = 1.0 - self.alpha
+        self.value = math.nan
+
+    def push(self, value):
+        if math.isnan(self.value):
+            self.value = value
+        elif self.value != value:
+            self.value = ((self._old_weight * self.value + self.alpha * value)
+                          / (self._old_weight + self.alpha))
+        return self.value
+
+
+def _rsi(avg_gain, avg_loss):
+    """RSI from average gain/loss, following numpy division semantics for zero losses"""
+    if avg_loss == 0:
+        return math.nan if avg_gain == 0 or math.isnan(avg_gain) else 100.0
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class IndicatorEngine:
+    """
+    Streaming version of calculate_indicators.
+
+    Keeps rolling-window and EMA state so each new bar costs O(1) per
+    indicator instead of a pass over the whole history. Results match the
+    pandas formulas in calculate_indicators up to floating point round-off.
+
+    Args:
+        keep_history (bool): Keep every computed row so to_frame() can
+            return the full indicator history
+    """
+
+    def __init__(self, keep_history=False):
+        self.keep_history = keep_history
+        self.count = 0
+        self.last_index = None
+        self.last = dict.fromkeys(INDICATOR_COLUMNS, math.nan)
+        self._prev_close = math.nan
+        self._ma = {20: RollingMean(20), 50: RollingMean(50), 200: RollingMean(200)}
+        self._gain = RollingMean(14)
+        self._loss = RollingMean(14)
+        self._ema_fast = EMA(12)
+        self._ema_slow = EMA(26)
+        self._signal = EMA(9)
+        self._bb_std = RollingStd(20)
+        self._history_index = []
+        self._history = []
+
+    def update(self, bar, index=None):
+        """
+        Feed one bar
+        Args:
+            bar: Closing price, or a mapping/Series with a 'Close' entry
+            index: Optional label of the bar (e.g. its timestamp)
+        Returns:
+            dict: Indicator values for this bar
+        """
+        close = float(bar if isinstance(bar, numbers.Real) else bar['Close'])
+
+        ma20 = self._ma[20].push(close)
+        ma50 = self._ma[50].push(close)
+        ma200 = self._ma[200].push(close)
+
+        # A NaN delta (first bar) counts as neither gain nor loss, like delta.where(...)
+        delta = close - self._prev_close
+        gain = self._gain.push(delta if delta > 0 else 0.0)
+        loss = self._loss.push(-(delta if delta < 0 else 0.0))
+        self._prev_close = close
+
+        macd = self._ema_fast.push(close) - self._ema_slow.push(close)
+        signal = self._signal.push(macd)
+
+        bb_std = self._bb_std.push(close)
+
+        values = {
+            'MA20': ma20,
+            'MA50': ma50,
+            'MA200': ma200,
+            'RSI': _rsi(gain, loss),
+            'MACD': macd,
+            'Signal_Line': signal,
+            'BB_middle': ma20,
+            'BB_upper': ma20 + 2 * bb_std,
+            'BB_lower': ma20 - 2 * bb_std,
+        }
+        self.count += 1
+        self.last = values
+        if index is not None:
+            self.last_index = index
+        if self.keep_history:
+            self._history_index.append(index if index is not None else self.count - 1)
+            self._history.append([values[c] for c in INDICATOR_COLUMNS])
+        return values
+
+    def extend(self, bars) -> DataFrame:
+        """
+        Feed several bars in order
+        Args:
+            bars: DataFrame with a 'Close' column, or an iterable of closing prices
+        Returns:
+            pandas.DataFrame: Indicator values for the new bars only
+        """
+        if isinstance(bars, DataFrame):
+            closes = bars['Close'].to_numpy(dtype='float64')
+            index = bars.index
+        else:
+            closes = np.asarray(list(bars), dtype='float64')
+            index = pd.RangeIndex(self.count, self.count + len(closes))
+
+        rows = np.empty((len(closes), len(INDICATOR_COLUMNS)))
+        for i, close in enumerate(closes.tolist()):
+            values = self.update(close, index[i])
+            rows[i] = [values[c] for c in INDICATOR_COLUMNS]
+        return DataFrame(rows, index=index, columns=INDICATOR_COLUMNS)
+
+    def to_frame(self) -> DataFrame:
+        """Return every row computed so far (requires keep_history=True)"""
+        if not self.keep_history:
+            raise ValueError("IndicatorEngine was created without keep_history")
+        return DataFrame(self._history, index=self._history_index, columns=INDICATOR_COLUMNS)
+
+
+# Rows per block when materialising sliding windows; small blocks stay in cache
+WINDOW_BLOCK_ROWS = 2048
+
+# Longest series computed as one (bars, symbols) array; NumPy accumulates
+# along the first axis row by row, which loses to per-column passes beyond this
+WIDE_MAX_ROWS = 8192
+
+
+def rolling_mean(values, window):
+    """
+    Vectorized rolling mean over a fixed window along the first axis
+    (NaN until the window holds `window` valid values)
+    Args:
+        values (numpy.ndarray): Input series, or a 2-D array with one column per series
+        window (int): Window length
+    Returns:
+        numpy.ndarray: Rolling mean, same shape as values
+    """
+    values = np.asarray(values, dtype='float64')
+    out = np.empty(values.shape)
+    out[:window - 1] = np.nan
+    if len(values) < window:
+        return out
+    missing = np.isnan(values)
+    has_missing = missing.any()
+    # Offsetting by each series' first valid value keeps the cumulative sum small and precise
+    offset = values[0]
+    if has_missing:
+        offset = np.take_along_axis(values, np.expand_dims(missing.argmin(axis=0), 0), axis=0)[0]
+    # Work in place: on wide arrays the temporaries, not the arithmetic, dominate
+    cumsum = np.subtract(values, offset)
+    if has_missing:
+        # Rows before a series starts hold NaN; count them per window instead of summing them
+        cumsum[missing] = 0.0
+    np.cumsum(cumsum, axis=0, out=cumsum)
+    sums = out[window - 1:]
+    sums[0] = cumsum[window - 1]
+    np.subtract(cumsum[window:], cumsum[:-window], out=sums[1:])
+    sums /= window
+    sums += offset
+    if has_missing:
+        counts = np.cumsum(missing, axis=0)
+        gaps = counts[window - 1:].copy()
+        gaps[1:] -= counts[:-window]
+        sums[gaps > 0] = np.nan
+    return out
+
+
+def rolling_std(values, window, mean=None):
+    """
+    Vectorized rolling sample standard deviation (ddof=1) along the first axis
+    Args:
+        values (numpy.ndarray): Input series, or a 2-D array with one column per series
+        window (int): Window length
+        mean (numpy.ndarray): Precomputed rolling_mean(values, window) (optional)
+    Returns:
+        numpy.ndarray: Rolling standard deviation, same shape as values
+    """
+    values = np.asarray(values, dtype='float64')
+    out = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return out
+    if mean is None:
+        mean = rolling_mean(values, window)
+    if values.ndim == 2:
+        # Sliding windows are only cache friendly over a contiguous series
+        for column in range(values.shape[1]):
+            out[:, column] = rolling_std(np.ascontiguousarray(values[:, column]), window,
+                                         mean=np.ascontiguousarray(mean[:, column]))
+        return out
+    # Deviations are taken from each window's own mean, avoiding sum-of-squares cancellation
+    windows = sliding_window_view(values, window)
+    for start in range(0, len(windows), WINDOW_BLOCK_ROWS):
+        block = windows[start:start + WINDOW_BLOCK_ROWS]
+        rows = slice(window - 1 + start, window - 1 + start + len(block))
+        deviations = block - mean[rows, None]
+        out[rows] = np.sqrt(np.einsum('ij,ij->i', deviations, deviations) / (window - 1))
+    return out
+
+
+def ema(values, span):
+    """
+    Exponential moving average equal to pandas' ewm(span=span, adjust=False).mean(),
+    along the first axis
+
+    The recurrence cannot be expressed as a NumPy array operation, so this
+    runs pandas' compiled ewm kernel over the array without copying it.
+    Leading NaNs stay NaN and each series starts at its first valid value.
+    """
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 1:
+        frame = pd.Series(values, copy=False)
+    else:
+        frame = DataFrame(values, copy=False)
+    return frame.ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    """RSI from rolling average gain and loss arrays"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class IndicatorContext:
+    """
+    Memoizes intermediate series computed from one close-price array.
+
+    Intermediates are looked up by name and parameters, e.g.
+    context.get('sma', 20), so indicators sharing an input (MA20 and
+    BB_middle, or BB_upper and BB_lower) compute it once.
+
+    close may be 2-D with one column per symbol, and every intermediate is
+    then 2-D too. Up to WIDE_MAX_ROWS bars the kernels run once over the
+    whole (bars, symbols) array; longer series are computed per symbol on
+    contiguous columns and stacked. Leading NaNs (a symbol listed later than
+    the others) give NaN until its windows fill.
+
+    Args:
+        close: Close prices, (bars,) or (bars, symbols)
+        max_bytes (int): Evict least recently used intermediates beyond this
+            many bytes (optional, unbounded by default)
+    """
+
+    def __init__(self, close, max_bytes=None):
+        close = np.asarray(close, dtype='float64')
+        self.max_bytes = max_bytes
+        self._cache = {}
+        self._bytes = 0
+        self._columns = None
+        if close.ndim == 2 and len(close) > WIDE_MAX_ROWS:
+            # Column order makes each symbol's series a contiguous view
+            self.close = np.asfortranarray(close)
+            column_bytes = None if max_bytes is None else max_bytes // max(1, close.shape[1])
+            self._columns = [IndicatorContext(self.close[:, column], column_bytes)
+                             for column in range(close.shape[1])]
+        else:
+            # Row order keeps the wide kernels' elementwise steps over whole rows
+            self.close = np.ascontiguousarray(close)
+
+    def get(self, name, *params):
+        key = (name,) + params
+        if key in self._cache:
+            # Re-insert to mark as most recently used
+            value = self._cache.pop(key)
+            self._cache[key] = value
+            return value
+        if self._columns is None:
+            value = INTERMEDIATES[name](self, *params)
+        else:
+            value = np.empty(self.close.shape, order='F')
+            for column, context in enumerate(self._columns):
+                value[:, column] = context.get(name, *params)
+                # Keep a view of the stacked array rather than a second copy
+                context._cache[key] = value[:, column]
+        self._cache[key] = value
+        self._bytes += value.nbytes
+        if self.max_bytes is not None:
+            while self._bytes > self.max_bytes and len(self._cache) > 1:
+                oldest = next(iter(self._cache))
+                self._bytes -= self._cache.pop(oldest).nbytes
+        return value
+
+
+# name -> function(context, *params) returning an array
+INTERMEDIATES = {}
+
+# name -> (inputs, combine); inputs are (intermediate, *params) tuples
+INDICATORS = {}
+
+
+def intermediate(name):
+    """Decorator registering an intermediate series computed from an IndicatorContext"""
+    def register(func):
+        INTERMEDIATES[name] = func
+        return func
+    return register
+
+
+def register_indicator(name, inputs, combine=None):
+    """
+    Declare an indicator in the registry
+    Args:
+        name (str): Output name, e.g. 'MA20'
+        inputs (list): Intermediates it needs, as (name, *params) tuples
+        combine (callable): Builds the indicator from the input arrays; defaults
+            to returning the single input unchanged
+    """
+    INDICATORS[name] = (tuple(tuple(i) for i in inputs), combine)
+
+
+@intermediate('sma')
+def _sma(context, window):
+    return rolling_mean(context.close, window)
+
+
+@intermediate('std')
+def _std(context, window):
+    return rolling_std(context.close, window, mean=context.get('sma', window))
+
+
+@intermediate('ema')
+def _ema(context, span):
+    return ema(context.close, span)
+
+
+@intermediate('delta')
+def _delta(context):
+    delta = np.empty_like(context.close)
+    delta[0] = np.nan
+    np.subtract(context.close[1:], context.close[:-1], out=delta[1:])
+    return delta
+
+
+@intermediate('gain')
+def _gain(context):
+    delta = context.get('delta')
+    # fmax treats the leading NaN delta as no gain, like delta.where(delta > 0, 0);
+    # rows before a series starts stay NaN so their windows are not counted
+    gain = np.fmax(delta, 0.0)
+    gain[np.isnan(context.close)] = np.nan
+    return gain
+
+
+@intermediate('loss')
+def _loss(context):
+    delta = context.get('delta')
+    loss = np.fmax(-delta, 0.0)
+    loss[np.isnan(context.close)] = np.nan
+    return loss
+
+
+@intermediate('avg_gain')
+def _avg_gain(context, period):
+    return rolling_mean(context.get('gain'), period)
+
+
+@intermediate('avg_loss')
+def _avg_loss(context, period):
+    return rolling_mean(context.get('loss'), period)
+
+
+@intermediate('rsi')
+def _rsi_series(context, period):
+    return rsi_from_averages(context.get('avg_gain', period), context.get('avg_loss', period))
+
+
+@intermediate('macd')
+def _macd(context, fast, slow):
+    return context.get('ema', fast) - context.get('ema', slow)
+
+
+@intermediate('macd_signal')
+def _macd_signal(context, fast, slow, signal):
+    return ema(context.get('macd', fast, slow), signal)
+
+
+register_indicator('MA20', [('sma', 20)])
+register_indicator('MA50', [('sma', 50)])
+register_indicator('MA200', [('sma', 200)])
+register_indicator('RSI', [('rsi', 14)])
+register_indicator('MACD', [('macd', 12, 26)])
+register_indicator('Signal_Line', [('macd_signal', 12, 26, 9)])
+register_indicator('BB_middle', [('sma', 20)])
+register_indicator('BB_upper', [('sma', 20), ('std', 20)], lambda mid, std: mid + 2 * std)
+register_indicator('BB_lower', [('sma', 20), ('std', 20)], lambda mid, std: mid - 2 * std)
+
+
+def compute_indicators(close, names=None, context=None):
+    """
+    Compute registered indicators with the NumPy kernels
+    Args:
+        close: Close prices (array or Series, or 2-D with one column per symbol); it is not modified
+        names (list): Indicators to compute (optional, defaults to INDICATOR_COLUMNS)
+        context (IndicatorContext): Reuse intermediates from an earlier call (optional)
+    Returns:
+        dict: Indicator name -> numpy.ndarray
+    """
+    if context is None:
+        context = IndicatorContext(close)
+    results = {}
+    for name in names or INDICATOR_COLUMNS:
+        if name not in INDICATORS:
+            raise KeyError(f"Unknown indicator '{name}'")
+        inputs, combine = INDICATORS[name]
+        arrays = [context.get(*spec) for spec in inputs]
+        results[name] = combine(*arrays) if combine else arrays[0]
+    return results
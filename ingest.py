@@ -0,0 +1,291 @@
+"""
+Build bars from exchange trade dumps and write them into the bar store.
+
+Trade CSVs (optionally .gz, .bz2, .zip, .xz or .zst) are read in chunks of
+INGEST_CHUNK_ROWS rows, so memory stays bounded however large the dump is.
+Each chunk is aggregated into OHLCV bars for every requested interval. The
+last bar of a chunk may continue in the next chunk, or the next file, so it
+is held back and merged with the continuation instead of being written
+twice. Completed bars go to the same partitions and manifest the provider
+fetches use, so the charts, backtests and /api/bars serve them directly.
+
+    python ingest.py trades-2024-*.csv.gz --symbol BTC-USD --interval 1m 1h 1d \\
+        --time-column time --price-column price --size-column qty
+
+Files are read in the order given and must hold one symbol's trades sorted by
+time (order within a chunk does not matter). Trades older than a bar already
+completed are counted as late and skipped.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import btc_chart
+import rollup
+from bar_store import BAR_DTYPE, INTERVAL_SECONDS
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Trades read per chunk; roughly 100 bytes of memory each while a chunk is processed
+INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', '1000000'))
+
+# Completed bars held per interval before they are written to the store
+INGEST_FLUSH_BARS = 100_000
+
+# Epoch numbers below each bound are read in that unit when --time-unit is auto
+TIME_UNIT_BOUNDS = ((1e11, 's'), (1e14, 'ms'), (1e17, 'us'))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def detect_time_unit(value):
+    """Epoch unit of a numeric timestamp from its magnitude: 's', 'ms', 'us' or 'ns'"""
+    for bound, unit in TIME_UNIT_BOUNDS:
+        if abs(value) < bound:
+            return unit
+    return 'ns'
+
+
+def to_epoch_ns(values, unit):
+    """
+    Trade times as int64 epoch nanoseconds
+    Args:
+        values (pandas.Series): Numeric epoch times, or date strings when unit is 'iso'
+        unit (str): 's', 'ms', 'us', 'ns' or 'iso'
+    Returns:
+        numpy.ndarray
+    """
+    if unit == 'iso':
+        return pd.to_datetime(values, utc=True).to_numpy(dtype='datetime64[ns]').view('<i8')
+    scale = {'s': 10**9, 'ms': 10**6, 'us': 10**3, 'ns': 1}[unit]
+    if values.dtype.kind == 'f':
+        return np.round(values.to_numpy() * scale).astype('<i8')
+    return values.to_numpy(dtype='<i8') * scale
+
+
+class BarBuilder:
+    """
+    Aggregates trades of one interval across chunks.
+
+    The newest bar of each chunk is kept open, because trades in the next
+    chunk may still fall into it. Trades older than the open bar are late.
+
+    Args:
+        interval (str): Bar interval
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.late = 0
+        self._open = None
+
+    def add(self, ts, price, size):
+        """
+        Aggregate one chunk of trades
+        Args:
+            ts (numpy.ndarray): Trade times in epoch nanoseconds, sorted
+            price (numpy.ndarray): Trade prices
+            size (numpy.ndarray): Trade sizes
+        Returns:
+            numpy.ndarray: BAR_DTYPE bars completed by this chunk
+        """
+        if self._open is not None:
+            keep = ts >= self._open['ts'][0]
+            if not keep.all():
+                self.late += int(len(keep) - keep.sum())
+                ts, price, size = ts[keep], price[keep], size[keep]
+        bars = rollup.aggregate_columns(ts, price, price, price, price, size, self.interval)
+        if len(bars) == 0:
+            return bars
+        if self._open is not None:
+            if bars['ts'][0] == self._open['ts'][0]:
+                # The open bar continues in this chunk
+                carried = self._open[0]
+                bars['open'][0] = carried['open']
+                bars['high'][0] = max(bars['high'][0], carried['high'])
+                bars['low'][0] = min(bars['low'][0], carried['low'])
+                bars['volume'][0] += carried['volume']
+            else:
+                bars = np.concatenate([self._open, bars])
+        self._open = bars[-1:].copy()
+        return bars[:-1]
+
+    def finish(self):
+        """The bar still open after the last chunk"""
+        bars = self._open if self._open is not None else np.empty(0, dtype=BAR_DTYPE)
+        self._open = None
+        return bars
+
+
+class StoreWriter:
+    """
+    Buffers completed bars of one interval and writes them to the bar store
+    with a manifest range from the first trade's bar to the newest written bar
+    Args:
+        store (bar_store.BarStore): Destination store
+        symbol (str): Ticker symbol
+        interval (str): Bar interval
+    """
+
+    def __init__(self, store, symbol, interval):
+        self.store = store
+        self.symbol = symbol
+        self.interval = interval
+        self.written = 0
+        self._pending = []
+        self._pending_bars = 0
+        self._covered_from = None
+
+    def add(self, bars):
+        if len(bars) == 0:
+            return
+        if self._covered_from is None:
+            self._covered_from = int(bars['ts'][0])
+        self._pending.append(bars)
+        self._pending_bars += len(bars)
+        if self._pending_bars >= INGEST_FLUSH_BARS:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        bars = np.concatenate(self._pending)
+        self._pending, self._pending_bars = [], 0
+        end = int(rollup.bucket_end(bars['ts'][-1:], self.interval)[0])
+        self.store.write(self.symbol, self.interval, bars)
+        # Minutes without trades have no bar, so the whole span is marked, not each bar
+        self.store.mark_fetched(self.symbol, self.interval, self._covered_from, end)
+        rollup.propagate(self.store, self.symbol, self.interval, int(bars['ts'][0]), end,
+                         btc_chart.STORE_REFRESH_SECONDS)
+        self.written += len(bars)
+
+
+def read_trades(paths, time_column, price_column, size_column, time_unit='auto', sep=',', header=True,
+                chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Yield trade chunks from CSV files
+    Args:
+        paths (list): CSV files, read in order
+        time_column, price_column, size_column (str or int): Column names, or
+            positions when header is False
+        time_unit (str): 's', 'ms', 'us', 'ns', 'iso' or 'auto' (numeric unit from magnitude)
+        sep (str): Field separator
+        header (bool): Whether the files start with a header row
+        chunk_rows (int): Trades per chunk
+    Yields:
+        tuple: (ts, price, size) arrays sorted by time, ts in epoch nanoseconds
+    """
+    columns = [time_column, price_column, size_column]
+    if not header:
+        columns = [int(column) for column in columns]
+    for path in paths:
+        logger.info(f"Reading trades from {path}")
+        reader = pd.read_csv(path, sep=sep, header=0 if header else None, usecols=columns,
+                             dtype={columns[1]: 'float64', columns[2]: 'float64'},
+                             chunksize=chunk_rows)
+        with reader:
+            for chunk in reader:
+                if time_unit == 'auto' and len(chunk):
+                    first = chunk[columns[0]].iloc[0]
+                    time_unit = 'iso' if isinstance(first, str) else detect_time_unit(float(first))
+                    logger.info(f"Reading trade times as {time_unit}")
+                ts = to_epoch_ns(chunk[columns[0]], time_unit)
+                price = chunk[columns[1]].to_numpy()
+                size = chunk[columns[2]].to_numpy()
+                if len(ts) > 1 and (np.diff(ts) < 0).any():
+                    order = np.argsort(ts, kind='stable')
+                    ts, price, size = ts[order], price[order], size[order]
+                yield ts, price, size
+
+
+def ingest(paths, symbol, intervals, store=None, **read_options):
+    """
+    Aggregate trade dumps into bars of each interval and write them to the bar store
+    Args:
+        paths (list): CSV files of one symbol's trades, in time order
+        symbol (str): Symbol the bars are stored under
+        intervals (list): Bar intervals to build, e.g. ['1m', '1h']
+        store (bar_store.BarStore): Destination (optional, defaults to the process-wide store)
+        **read_options: Passed to read_trades
+    Returns:
+        dict: trades, late trades, bars written per interval, seconds, trades/sec and peak RSS in MB
+    """
+    unknown = [interval for interval in intervals if interval not in INTERVAL_SECONDS or interval == '5d']
+    if unknown:
+        raise ValueError(f"Cannot build bars for {', '.join(unknown)}")
+    store = store or bar_store.get_store()
+    builders = [BarBuilder(interval) for interval in intervals]
+    writers = [StoreWriter(store, symbol, interval) for interval in intervals]
+
+    started = time.perf_counter()
+    trades = 0
+    for chunk_index, (ts, price, size) in enumerate(read_trades(paths, **read_options), 1):
+        trades += len(ts)
+        for builder, writer in zip(builders, writers):
+            writer.add(builder.add(ts, price, size))
+        elapsed = time.perf_counter() - started
+        logger.info(f"Chunk {chunk_index}: {trades:,} trades, {trades / elapsed:,.0f} trades/s, "
+                    f"peak RSS {peak_rss_mb() or 0:.0f} MB")
+    for builder, writer in zip(builders, writers):
+        writer.add(builder.finish())
+        writer.flush()
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'trades': trades,
+        'late_trades': {builder.interval: builder.late for builder in builders},
+        'bars': {writer.interval: writer.written for writer in writers},
+        'seconds': round(elapsed, 3),
+        'trades_per_second': round(trades / elapsed) if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    late = sum(report['late_trades'].values())
+    if late:
+        logger.warning(f"Skipped late trades per interval: {report['late_trades']}")
+    logger.info(f"Ingested {trades:,} {symbol} trades into {report['bars']} in {elapsed:.1f} s "
+                f"({report['trades_per_second'] or 0:,} trades/s, peak RSS {report['peak_rss_mb'] or 0:.0f} MB)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='trade CSV files in time order')
+    parser.add_argument('--symbol', default='BTC-USD')
+    parser.add_argument('--interval', nargs='+', default=['1m'], dest='intervals')
+    parser.add_argument('--time-column', default='time')
+    parser.add_argument('--price-column', default='price')
+    parser.add_argument('--size-column', default='size')
+    parser.add_argument('--time-unit', default='auto', choices=['auto', 's', 'ms', 'us', 'ns', 'iso'])
+    parser.add_argument('--sep', default=',')
+    parser.add_argument('--no-header', action='store_true',
+                        help='files have no header row; columns are given as 0-based positions')
+    parser.add_argument('--chunk-rows', type=int, default=INGEST_CHUNK_ROWS)
+    parser.add_argument('--store', help='bar store directory (defaults to BAR_STORE_DIR)')
+    args = parser.parse_args()
+
+    store = bar_store.BarStore(args.store) if args.store else None
+    ingest(args.paths, args.symbol, args.intervals, store=store,
+           time_column=args.time_column, price_column=args.price_column, size_column=args.size_column,
+           time_unit=args.time_unit, sep=args.sep, header=not args.no_header, chunk_rows=args.chunk_rows)
+
+
+if __name__ == '__main__':
+    main()
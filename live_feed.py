@@ -0,0 +1,178 @@
+import json
+import logging
+import math
+import os
+import queue
+import threading
+
+import pandas as pd
+
+import btc_chart
+from bar_store import INTERVAL_SECONDS
+from indicators import INDICATOR_COLUMNS, IndicatorEngine
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of the bar store; the store itself only goes to the
+# provider every STORE_REFRESH_SECONDS
+LIVE_POLL_SECONDS = float(os.getenv('LIVE_POLL_SECONDS', '15'))
+
+# Events buffered per subscriber before it is told to resynchronise
+SUBSCRIBER_QUEUE_SIZE = 256
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Longest bar the 24h change is read from; coarser feeds read it from hourly bars
+CHANGE_BAR_SECONDS = 3600
+
+
+def format_event(event, payload):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _clean(value):
+    """JSON has no NaN; indicators that are still warming up are sent as null"""
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class LiveFeed:
+    """
+    One poller per interval, shared by every connected dashboard.
+
+    A background thread reads the bar store, feeds each newly closed bar
+    through an IndicatorEngine and broadcasts the bar with its indicator
+    values. Subscribers get their own bounded queue; one that falls behind
+    has its backlog replaced by a 'reset' event instead of slowing the others.
+
+    Args:
+        interval (str): Bar interval
+        poll_seconds (float): Seconds between polls
+    """
+
+    def __init__(self, interval, poll_seconds=LIVE_POLL_SECONDS):
+        self.interval = interval
+        self.poll_seconds = poll_seconds
+        self.price = None
+        self._engine = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        """Register a subscriber, starting the poller if needed. Returns its queue."""
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+            if self.price is not None:
+                q.put_nowait(('price', self.price))
+            self._stop.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'live-feed-{self.interval}', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        """Drop a subscriber; the poller stops with the last one"""
+        with self._lock:
+            self._subscribers.discard(q)
+            if not self._subscribers:
+                self._stop.set()
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def broadcast(self, event, payload):
+        """Queue an event for every subscriber without blocking on slow ones"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event, payload))
+            except queue.Full:
+                # Drop the backlog; the client reloads its charts on 'reset'
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait(('reset', {'interval': self.interval}))
+
+    def _run(self):
+        logger.info(f"Live feed for {self.interval} started")
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Live feed poll for {self.interval} failed: {e}")
+            self._stop.wait(self.poll_seconds)
+        logger.info(f"Live feed for {self.interval} stopped")
+
+    def poll(self, now=None):
+        """
+        Read the latest bars and broadcast what changed since the last poll
+        Args:
+            now (pandas.Timestamp): Current time (optional, for tests)
+        Returns:
+            int: Number of newly closed bars broadcast
+        """
+        data = btc_chart.get_btc_data(interval=self.interval)
+        now = now or pd.Timestamp.now(tz='UTC')
+        # The last bar is still forming until its interval has elapsed
+        bar_length = pd.Timedelta(seconds=INTERVAL_SECONDS.get(self.interval, 86400))
+        closed = data[data.index + bar_length <= now]
+
+        if self._engine is None:
+            # Seed with the same history the dashboard charts are built from,
+            # so streamed indicator values continue their lines exactly
+            self._engine = IndicatorEngine()
+            self._engine.extend(closed)
+            new_bars = closed.iloc[:0]
+        elif self._engine.last_index is None:
+            new_bars = closed
+        else:
+            new_bars = closed[closed.index > self._engine.last_index]
+
+        rows = []
+        for index, bar in new_bars.iterrows():
+            values = self._engine.update(bar, index)
+            row = {'time': index.isoformat()}
+            row.update({c: float(bar[c]) for c in BAR_COLUMNS})
+            row.update({c: _clean(values[c]) for c in INDICATOR_COLUMNS})
+            rows.append(row)
+        if rows:
+            self.broadcast('bars', {'interval': self.interval, 'bars': rows})
+
+        last = data.iloc[-1]
+        price = {'price': float(last['Close']), 'change_24h': float(self._change_24h(data, now)),
+                 'time': data.index[-1].isoformat()}
+        if price != self.price:
+            self.price = price
+            self.broadcast('price', price)
+        return len(rows)
+
+    def _change_24h(self, data, now):
+        """Percent change over the last 24 hours"""
+        if INTERVAL_SECONDS.get(self.interval, 86400) > CHANGE_BAR_SECONDS:
+            # A day ago on daily or weekly bars is the previous bar's close, not 24 hours back
+            start = (now - pd.Timedelta(days=2)).strftime('%Y-%m-%d')
+            data = btc_chart.get_btc_data(start=start, interval='1h')
+        day_ago = data['Close'].asof(data.index[-1] - pd.Timedelta(days=1))
+        if not day_ago or math.isnan(day_ago):
+            return 0.0
+        return (data['Close'].iloc[-1] / day_ago - 1.0) * 100
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(interval):
+    """Shared LiveFeed for an interval"""
+    with _feeds_lock:
+        feed = _feeds.get(interval)
+        if feed is None:
+            feed = _feeds[interval] = LiveFeed(interval)
+        return feed
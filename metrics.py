@@ -0,0 +1,291 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a cold multi-chunk fetch
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Directory where every process writes its samples, so /metrics sums them across
+# gunicorn workers (set by gunicorn.conf.py); unset, a process reports only its own
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+
+# Seconds between writes of a process's samples to METRICS_DIR
+METRICS_FLUSH_SECONDS = 5.0
+
+# File in METRICS_DIR holding the summed samples of workers that have exited
+EXITED_SAMPLES = 'exited.json'
+
+_lock = threading.Lock()
+# name -> (type, help); samples are keyed by (name, sorted label items)
+_metadata = {}
+_counters = {}
+_histograms = {}
+
+# Process whose flush thread is running, and the file it writes
+_flusher_pid = None
+_samples_path = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, kind, help_text):
+    """Register the TYPE and HELP lines for a metric family"""
+    with _lock:
+        _metadata[name] = (kind, help_text)
+
+
+def inc(name, amount=1, **labels):
+    """Add to a counter"""
+    _start_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram"""
+    _start_flusher()
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(LATENCY_BUCKETS), 0, 0.0]
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        if index < len(LATENCY_BUCKETS):
+            hist[0][index] += 1
+        hist[1] += 1
+        hist[2] += value
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Time a pipeline stage into the stage_duration_seconds histogram
+    Args:
+        stage (str): Stage name, e.g. get_btc_data.fetch
+        **fields: Extra context for the debug log line (not used as labels)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('stage_duration_seconds', elapsed, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            context = ' '.join(f'{k}={v}' for k, v in fields.items())
+            logger.debug(f"span stage={stage} ms={elapsed * 1000:.1f} {context}".rstrip())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(items, extra=()):
+    items = list(items) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(b), c, s) for key, (b, c, s) in _histograms.items()}
+    return counters, histograms
+
+
+def _start_flusher():
+    """Start the thread writing this process's samples, once per process"""
+    global _flusher_pid
+    if METRICS_DIR is None or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush()
+
+
+def _to_samples(counters, histograms):
+    """Counter and histogram dicts as JSON-friendly lists"""
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, *hist] for (name, labels), hist in histograms.items()],
+    }
+
+
+def _write_samples(path, samples):
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=METRICS_DIR)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(samples, f)
+    os.replace(tmp_path, path)
+
+
+def _read_samples(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add_samples(counters, histograms, samples):
+    """Sum the samples of one file into counter and histogram dicts"""
+    for name, labels, value in samples['counters']:
+        key = (name, tuple(tuple(item) for item in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, count, total in samples['histograms']:
+        key = (name, tuple(tuple(item) for item in labels))
+        if key in histograms:
+            merged = histograms[key]
+            buckets = [a + b for a, b in zip(merged[0], buckets)]
+            count, total = merged[1] + count, merged[2] + total
+        histograms[key] = (buckets, count, total)
+
+
+def flush():
+    """Write this process's samples to METRICS_DIR (a no-op without it)"""
+    global _samples_path
+    if METRICS_DIR is None:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        if _samples_path is None:
+            # Not the bare pid: a restarted worker may get a dead one's pid and its samples must add up
+            _samples_path = os.path.join(METRICS_DIR, f"{os.getpid()}-{secrets.token_hex(4)}.json")
+        _write_samples(_samples_path, _to_samples(*_snapshot()))
+    except OSError as e:
+        logger.error(f"Could not write metrics to {METRICS_DIR}: {e}")
+
+
+def fold_exited(pid):
+    """
+    Add the samples of an exited worker to EXITED_SAMPLES and delete its file, so
+    recycled workers do not leave a file each. Called from gunicorn's child_exit
+    in the master, which makes it the only writer of EXITED_SAMPLES.
+    Args:
+        pid (int): Process id of the exited worker
+    """
+    if METRICS_DIR is None:
+        return
+    path = os.path.join(METRICS_DIR, EXITED_SAMPLES)
+    exited = _read_samples(path) or {'counters': [], 'histograms': [], 'folded': []}
+    names = [entry.name for entry in os.scandir(METRICS_DIR)
+             if entry.name.startswith(f'{pid}-') and entry.name.endswith('.json')]
+    if not names:
+        return
+    counters, histograms = {}, {}
+    _add_samples(counters, histograms, exited)
+    for name in names:
+        samples = _read_samples(os.path.join(METRICS_DIR, name))
+        if samples is not None:
+            _add_samples(counters, histograms, samples)
+    # Readers skip files listed as folded, so the samples count once while both exist;
+    # names of files already deleted are dropped from the list
+    folded = [name for name in exited['folded'] if os.path.exists(os.path.join(METRICS_DIR, name))]
+    try:
+        _write_samples(path, {**_to_samples(counters, histograms), 'folded': folded + names})
+        for name in names:
+            os.remove(os.path.join(METRICS_DIR, name))
+    except OSError as e:
+        logger.error(f"Could not fold metrics of worker {pid}: {e}")
+
+
+def _collect():
+    """Samples of every process that wrote to METRICS_DIR, summed; exited workers still count"""
+    flush()
+    counters, histograms = {}, {}
+    found = {}
+    for entry in os.scandir(METRICS_DIR):
+        if entry.name.startswith('.') or not entry.name.endswith('.json') or entry.name == EXITED_SAMPLES:
+            continue
+        samples = _read_samples(entry.path)
+        if samples is not None:
+            found[entry.name] = samples
+    # Read after the worker files: a file deleted by fold_exited is then in here
+    exited = _read_samples(os.path.join(METRICS_DIR, EXITED_SAMPLES))
+    if exited is not None:
+        _add_samples(counters, histograms, exited)
+        for name in exited['folded']:
+            found.pop(name, None)
+    for samples in found.values():
+        _add_samples(counters, histograms, samples)
+    return counters, histograms
+
+
+def render():
+    """Every metric in the Prometheus text exposition format, summed across processes with METRICS_DIR"""
+    counters, histograms = _snapshot() if METRICS_DIR is None else _collect()
+    with _lock:
+        metadata = dict(_metadata)
+
+    lines = []
+    families = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    for name in families:
+        kind, help_text = metadata.get(name, ('untyped', ''))
+        if help_text:
+            lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (family, labels), value in sorted(counters.items()):
+            if family == name:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+        for (family, labels), (buckets, count, total) in sorted(histograms.items()):
+            if family != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", repr(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Drop every sample (metadata is kept)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _after_fork():
+    """A forked worker starts from zero, since the parent wrote its samples to its own file"""
+    global _lock, _flusher_pid, _samples_path
+    if METRICS_DIR is None:
+        return
+    # The parent's lock may have been held by a thread that does not exist here
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _flusher_pid = _samples_path = None
+
+
+os.register_at_fork(before=flush, after_in_child=_after_fork)
+atexit.register(flush)
+
+
+describe('stage_duration_seconds', 'histogram', 'Time spent in each stage of the chart pipeline')
+describe('http_request_duration_seconds', 'histogram', 'Flask request latency by route')
+describe('upstream_requests_total', 'counter', 'Provider history requests by interval and outcome')
+describe('cache_requests_total', 'counter', 'Cache lookups by cache and result')
+describe('chart_artifacts_evicted_total', 'counter', 'Chart sets removed to stay within the size budget')
+describe('bar_memory_spilled_total', 'counter', 'Compact bar partitions dropped to stay within the memory budget')
+describe('chart_jobs_total', 'counter', 'Async chart jobs by outcome (submitted, deduplicated, rejected, done, failed, timeout)')
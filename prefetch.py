@@ -0,0 +1,180 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import bar_store
+from bar_store import INTERVAL_SECONDS
+from btc_chart import INTERVAL_LIMITS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process refreshes on its own
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to serve every request lazily, e.g. in tests or one-off scripts
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1') == '1'
+
+# Intervals kept warm (comma separated, defaults to every supported interval)
+PREFETCH_INTERVALS = [i for i in os.getenv('PREFETCH_INTERVALS', ','.join(INTERVAL_LIMITS)).split(',') if i]
+
+# Each interval is refreshed once per bar, but never more often than the store
+# refresh window nor less often than hourly, so forming daily bars stay current
+PREFETCH_MIN_SECONDS = 60
+PREFETCH_MAX_SECONDS = 3600
+
+# Seconds a follower process waits before trying to become the leader again
+LEADER_RETRY_SECONDS = 30
+
+
+def refresh_seconds(interval):
+    """Refresh cadence for an interval, matched to its bar size"""
+    bar = INTERVAL_SECONDS.get(interval, 86400)
+    return min(max(bar, PREFETCH_MIN_SECONDS), PREFETCH_MAX_SECONDS)
+
+
+def common_ranges(interval, today=None):
+    """
+    Ranges the dashboard asks for most: its default view, and the window the
+    interval picker selects (7 days for minute bars, 60 days hourly, a year above)
+    Returns:
+        list: (start_date, end_date) pairs as passed to render_charts
+    """
+    today = today or datetime.now(timezone.utc).date()
+    # Same test as the dashboard's interval handler, which also matches '1mo'
+    if 'm' in interval:
+        days = 7
+    elif interval == '1h':
+        days = 60
+    else:
+        days = 365
+    picker_start = (today - timedelta(days=days)).isoformat()
+    return [("2008-01-01", None), (picker_start, today.isoformat())]
+
+
+class FileLeader:
+    """
+    Leader election between processes on one host through an exclusive flock.
+    The lock is released by the OS when the leader exits, so a follower takes
+    over on its next attempt.
+
+    Args:
+        path (str): Lock file shared by all workers
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Try to become the leader without blocking. Returns True while leading."""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class PrefetchScheduler:
+    """
+    Background thread that keeps common chart ranges warm.
+
+    Only the process holding the leader lock does the work. It refreshes the
+    bar store and writes the chart artifacts, both of which live on disk, so
+    requests in the other workers only read warm bars and reuse the published
+    artifacts.
+
+    Args:
+        render (callable): render(interval, start_date, end_date), e.g. app's render_charts
+        intervals (list): Intervals to keep warm
+        lock_path (str): Lock file used for leader election
+    """
+
+    def __init__(self, render, intervals=None, lock_path=None):
+        self.render = render
+        self.intervals = [i for i in (intervals or PREFETCH_INTERVALS) if i in INTERVAL_LIMITS]
+        self.leader = FileLeader(lock_path or os.path.join(bar_store.get_store().root, '.prefetch.lock'))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.leader.release()
+
+    def refresh(self, interval):
+        """Render every common range of one interval"""
+        started = time.perf_counter()
+        for start_date, end_date in common_ranges(interval):
+            try:
+                self.render(interval, start_date, end_date)
+            except Exception as e:
+                logger.error(f"Prefetch of {interval} {start_date}..{end_date} failed: {e}")
+        logger.info(f"Prefetched {interval} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def _run(self):
+        if not self.intervals:
+            return
+        # Due times per interval, all due immediately
+        due = [(time.monotonic(), interval) for interval in self.intervals]
+        heapq.heapify(due)
+        while not self._stop.is_set():
+            if not self.leader.acquire():
+                self._stop.wait(LEADER_RETRY_SECONDS)
+                continue
+            when, interval = due[0]
+            delay = when - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            heapq.heapreplace(due, (time.monotonic() + refresh_seconds(interval), interval))
+            self.refresh(interval)
+
+
+def start_scheduler(render, start=True):
+    """
+    Create the prefetch scheduler unless PREFETCH_ENABLED is off
+    Args:
+        render (callable): Passed to PrefetchScheduler
+        start (bool): Start its thread now. Threads do not survive fork, so a
+            preloading server starts it in each worker instead (see gunicorn.conf.py)
+    Returns:
+        PrefetchScheduler or None
+    """
+    if not PREFETCH_ENABLED or not PREFETCH_INTERVALS:
+        return None
+    scheduler = PrefetchScheduler(render)
+    if start:
+        logger.info(f"Starting prefetch scheduler for {', '.join(PREFETCH_INTERVALS)}")
+        scheduler.start()
+    return scheduler
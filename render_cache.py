@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A build in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RenderCache:
+    """
+    TTL cache for rendered chart sets with request coalescing.
+
+    When several threads ask for the same missing or expired key, one of
+    them runs the build and the others wait for its result instead of
+    starting their own.
+
+    Args:
+        ttl (float): Seconds an entry is served before it is rebuilt
+        name (str): Cache label in the cache_requests_total metric
+    """
+
+    def __init__(self, ttl=60.0, name='render'):
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build, is_valid=None):
+        """
+        Return the cached value for key, building it at most once at a time
+        Args:
+            key (tuple): Cache key
+            build (callable): Produces the value on a miss
+            is_valid (callable): Extra check on a cached value (optional); a
+                value it rejects is rebuilt even before its TTL runs out
+        Returns:
+            The cached or freshly built value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic() and (is_valid is None or is_valid(value)):
+                    self.hits += 1
+                    metrics.inc('cache_requests_total', cache=self.name, result='hit')
+                    return value
+            self.misses += 1
+            metrics.inc('cache_requests_total', cache=self.name, result='miss')
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            logger.info(f"Waiting for in-flight render of {key}")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = build()
+            with self._lock:
+                self._entries[key] = (flight.value, time.monotonic() + self.ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
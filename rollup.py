@@ -0,0 +1,168 @@
+import logging
+import time
+
+import numpy as np
+
+from bar_store import BAR_DTYPE, INTERVAL_SECONDS, merge_ranges, missing_ranges
+
+logger = logging.getLogger(__name__)
+
+# Finer intervals each interval can be built from, coarsest first so the
+# fewest bars are aggregated. 5d bars have no fixed calendar anchor and are
+# always fetched.
+ROLLUP_SOURCES = {
+    '2m': ('1m',),
+    '5m': ('1m',),
+    '15m': ('5m', '1m'),
+    '30m': ('15m', '5m', '1m'),
+    '60m': ('30m', '15m', '5m', '1m'),
+    '1h': ('30m', '15m', '5m', '1m'),
+    '1d': ('1h', '60m'),
+    '1wk': ('1d',),
+    '1mo': ('1d',),
+}
+
+# Intervals that can be built from each interval, the reverse of ROLLUP_SOURCES
+ROLLUP_TARGETS = {}
+for _target, _sources in ROLLUP_SOURCES.items():
+    for _source in _sources:
+        ROLLUP_TARGETS.setdefault(_source, []).append(_target)
+
+DAY_NS = 86400 * 10**9
+# Weekly bars start on Monday; the epoch was a Thursday
+WEEK_OFFSET_NS = 4 * DAY_NS
+
+
+def bucket_start(ts, interval):
+    """
+    Start of the bar each timestamp falls into
+    Args:
+        ts (numpy.ndarray): Epoch nanoseconds
+        interval (str): Target interval
+    Returns:
+        numpy.ndarray: Bucket start per timestamp, in epoch nanoseconds
+    """
+    ts = np.asarray(ts, dtype='<i8')
+    if interval == '1mo':
+        return ts.astype('datetime64[ns]').astype('datetime64[M]').astype('datetime64[ns]').astype('<i8')
+    if interval == '1wk':
+        week = 7 * DAY_NS
+        return (ts - WEEK_OFFSET_NS) // week * week + WEEK_OFFSET_NS
+    size = INTERVAL_SECONDS[interval] * 10**9
+    return ts // size * size
+
+
+def bucket_end(ts, interval):
+    """End (exclusive) of the bar each timestamp falls into"""
+    start = bucket_start(ts, interval)
+    if interval == '1mo':
+        return (start.astype('datetime64[ns]').astype('datetime64[M]') + 1).astype('datetime64[ns]').astype('<i8')
+    if interval == '1wk':
+        return start + 7 * DAY_NS
+    return start + INTERVAL_SECONDS[interval] * 10**9
+
+
+def aggregate(bars, interval):
+    """
+    Aggregate bars into coarser ones: first open, max high, min low, last close, summed volume
+    Args:
+        bars (numpy.ndarray): Source bars with BAR_DTYPE records, sorted by timestamp
+        interval (str): Target interval
+    Returns:
+        numpy.ndarray: One BAR_DTYPE record per bucket that has source bars
+    """
+    return aggregate_columns(bars['ts'], bars['open'], bars['high'], bars['low'], bars['close'],
+                             bars['volume'], interval)
+
+
+def aggregate_columns(ts, open_, high, low, close, volume, interval):
+    """
+    aggregate() over separate arrays, e.g. trades passed with their price as all four prices
+    Args:
+        ts (numpy.ndarray): Epoch nanoseconds, sorted
+        open_, high, low, close, volume (numpy.ndarray): Values aligned with ts
+        interval (str): Target interval
+    Returns:
+        numpy.ndarray: One BAR_DTYPE record per bucket that has source rows
+    """
+    if len(ts) == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+    labels = bucket_start(ts, interval)
+    starts = np.flatnonzero(np.diff(labels, prepend=labels[0] - 1))
+    ends = np.append(starts[1:], len(ts)) - 1
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out['ts'] = labels[starts]
+    out['open'] = open_[starts]
+    out['high'] = np.maximum.reduceat(high, starts)
+    out['low'] = np.minimum.reduceat(low, starts)
+    out['close'] = close[ends]
+    out['volume'] = np.add.reduceat(volume, starts)
+    return out
+
+
+def fill(store, symbol, interval, start, end, refresh_seconds, now=None):
+    """
+    Build the bars of [start, end) from finer stored bars where they cover it
+    Args:
+        store (bar_store.BarStore): Bar store holding the finer series
+        symbol (str): Ticker symbol
+        interval (str): Interval to build
+        start (int): Range start in epoch nanoseconds
+        end (int): Range end (exclusive) in epoch nanoseconds
+        refresh_seconds (float): Freshness window passed to BarStore.covered_ranges
+        now (float): Current epoch seconds (optional)
+    Returns:
+        list: (start, end) parts of the range that no finer series covers
+    """
+    now = time.time() if now is None else now
+    remaining = [(start, end)]
+    for source in ROLLUP_SOURCES.get(interval, ()):
+        if not remaining:
+            break
+        covered = store.covered_ranges(symbol, source, refresh_seconds, now=now)
+        if not covered:
+            continue
+        filled = []
+        for gap_start, gap_end in remaining:
+            for cov_start, cov_end in covered:
+                lo, hi = max(gap_start, cov_start), min(gap_end, cov_end)
+                if hi <= lo:
+                    continue
+                # A bucket needs all of its source bars, except the forming one at a live head
+                live = cov_end >= int(now * 10**9)
+                mark_end = hi if live else min(hi, int(bucket_start([cov_end], interval)[0]))
+                if mark_end <= lo:
+                    continue
+                read_end = min(cov_end, int(bucket_end([mark_end - 1], interval)[0]))
+                bars = aggregate(store.read(symbol, source, lo, read_end), interval)
+                bars = bars[(bars['ts'] >= lo) & (bars['ts'] < mark_end)]
+                store.write(symbol, interval, bars)
+                store.mark_fetched(symbol, interval, lo, mark_end)
+                filled.append([lo, mark_end])
+                logger.info(f"Rolled up {len(bars)} {interval} bars from {source}")
+        if filled:
+            remaining = [gap for gap_start, gap_end in remaining
+                         for gap in missing_ranges(gap_start, gap_end, merge_ranges(filled))]
+            for lo, hi in merge_ranges(filled):
+                propagate(store, symbol, interval, lo, hi, refresh_seconds, now=now)
+    return remaining
+
+
+def propagate(store, symbol, interval, start, end, refresh_seconds, now=None):
+    """
+    Update materialized coarser series after the bars of [start, end) changed
+    Args:
+        store (bar_store.BarStore): Bar store
+        symbol (str): Ticker symbol
+        interval (str): Interval whose bars were written
+        start (int): Start of the written range in epoch nanoseconds
+        end (int): End of the written range in epoch nanoseconds
+        refresh_seconds (float): Freshness window passed to BarStore.covered_ranges
+        now (float): Current epoch seconds (optional)
+    """
+    for target in ROLLUP_TARGETS.get(interval, ()):
+        # Only keep series that are already in use up to date
+        if not store.manifest(symbol, target)['ranges']:
+            continue
+        # Rebuild every target bar the written range touches
+        fill(store, symbol, target, int(bucket_start([start], target)[0]), end, refresh_seconds, now=now)
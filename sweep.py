@@ -0,0 +1,212 @@
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import DEFAULT_FEE, DEFAULT_SLIPPAGE, INDICATOR_PARAMS, STRATEGIES, simulate, summarize
+from indicators import IndicatorContext
+
+logger = logging.getLogger(__name__)
+
+# Parameter sets sent to a worker per task
+SWEEP_BATCH_SIZE = 64
+
+# Memory each worker may spend on memoized indicator intermediates
+SWEEP_CACHE_BYTES = int(os.getenv('SWEEP_CACHE_BYTES', str(256 * 1024 * 1024)))
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def param_grid(strategy, **axes):
+    """
+    Lazily enumerate parameter combinations
+    Args:
+        strategy (str): Strategy name, used to order the axes
+        **axes: Parameter name -> list of values
+    Returns:
+        generator: One dict per combination. Indicator parameters vary slowest, so
+            consecutive combinations share indicator intermediates
+    """
+    indicator_keys = [k for k in INDICATOR_PARAMS.get(strategy, ()) if k in axes]
+    names = indicator_keys + [k for k in axes if k not in indicator_keys]
+    for values in itertools.product(*(axes[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def walk_forward_splits(n, folds, train_size=None, test_size=None, anchored=False):
+    """
+    Split n bars into consecutive train/test windows
+    Args:
+        n (int): Number of bars
+        folds (int): Number of test windows
+        train_size (int): Bars per training window (defaults to one test window)
+        test_size (int): Bars per test window (defaults to filling the series)
+        anchored (bool): Grow every training window from the first bar
+    Returns:
+        list: (train_slice, test_slice) pairs
+    """
+    if test_size is None:
+        test_size = n // (folds + 1)
+    if train_size is None:
+        train_size = test_size
+    first_test = n - folds * test_size
+    if first_test < train_size or test_size <= 0:
+        raise ValueError(f"{n} bars are too few for {folds} folds of {test_size} test bars "
+                         f"after {train_size} training bars")
+    splits = []
+    for fold in range(folds):
+        test_start = first_test + fold * test_size
+        train_start = 0 if anchored else test_start - train_size
+        splits.append((slice(train_start, test_start), slice(test_start, test_start + test_size)))
+    return splits
+
+
+def _init_worker(shm_name, length, cache_bytes):
+    """Attach to the shared price array once per worker process"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    close = np.ndarray((length,), dtype='float64', buffer=shm.buf)
+    _worker['shm'] = shm
+    _worker['context'] = IndicatorContext(close, max_bytes=cache_bytes)
+
+
+def _run_batch(strategy, param_sets, splits, options):
+    """Evaluate a batch of parameter sets against the worker's shared prices"""
+    context = _worker['context']
+    signal = STRATEGIES[strategy]
+    rows = []
+    for params in param_sets:
+        target = signal(context, **params)
+        positions, returns = simulate(context.close, target, options['fee'], options['slippage'],
+                                      options['long_only'])
+        for fold, (train, test) in enumerate(splits):
+            row = {
+                'strategy': strategy,
+                'params': params,
+                'fold': fold,
+                'in_sample': summarize(returns[train], positions[train], options['interval']),
+            }
+            if test is not None:
+                row['out_of_sample'] = summarize(returns[test], positions[test], options['interval'])
+            rows.append(row)
+    return rows
+
+
+def _batches(grid, size):
+    """
+    Group consecutive combinations into tasks of up to size. param_grid varies
+    indicator parameters slowest, so combinations in one task share most of
+    their intermediates (for ma_cross, the same fast and slow averages recur
+    across (fast, slow) pairs), and each worker keeps its memoized
+    intermediates from task to task.
+    """
+    grid = iter(grid)
+    while True:
+        batch = list(itertools.islice(grid, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _jsonable(value):
+    """A result row with NumPy scalars as Python ones and NaN or infinity as None, for strict JSON"""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _score(stats, metric):
+    value = stats.get(metric)
+    return -math.inf if value is None or math.isnan(value) else value
+
+
+def run_sweep(close, strategy, grid, output_path, walk_forward=None, metric='sharpe',
+              fee=DEFAULT_FEE, slippage=DEFAULT_SLIPPAGE, interval='1d', long_only=True,
+              workers=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Evaluate a strategy over many parameter sets on a process pool
+    Args:
+        close: Close prices (array or Series)
+        strategy (str): Name in backtest.STRATEGIES
+        grid (iterable): Parameter dicts, e.g. from param_grid()
+        output_path (str): JSON Lines file; one row per parameter set and fold is
+            appended as results arrive, with undefined statistics as null
+        walk_forward (dict): Keyword arguments for walk_forward_splits (optional);
+            without it every parameter set is scored on the whole series
+        metric (str): Statistic used to pick the best parameters per fold
+        fee (float): Fee per unit of traded notional
+        slippage (float): Slippage per unit of traded notional
+        interval (str): Bar interval, used to annualize the Sharpe ratio
+        long_only (bool): Treat short signals as flat
+        workers (int): Worker processes (defaults to the CPU count)
+        batch_size (int): Parameter sets per task
+    Returns:
+        dict: Rows written, elapsed time and the best parameters per fold
+    """
+    close = np.ascontiguousarray(close, dtype='float64')
+    n = len(close)
+    if walk_forward:
+        splits = walk_forward_splits(n, **walk_forward)
+    else:
+        splits = [(slice(0, n), None)]
+    options = {'fee': fee, 'slippage': slippage, 'interval': interval, 'long_only': long_only}
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+
+    # Best row per fold, chosen on in-sample performance
+    best = [None] * len(splits)
+    rows_written = 0
+    started = time.perf_counter()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype='float64', buffer=shm.buf)[:] = close
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, n, SWEEP_CACHE_BYTES)) as pool, \
+                open(output_path, 'a', encoding='utf-8') as out:
+            batches = _batches(grid, batch_size)
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                # Keep a bounded number of tasks in flight so the grid is never materialised
+                while not exhausted and len(pending) < max_pending:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                    else:
+                        pending.add(pool.submit(_run_batch, strategy, batch, splits, options))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for row in future.result():
+                        out.write(json.dumps(_jsonable(row), allow_nan=False) + '\n')
+                        rows_written += 1
+                        fold = row['fold']
+                        if best[fold] is None or _score(row['in_sample'], metric) > _score(best[fold]['in_sample'], metric):
+                            best[fold] = row
+                out.flush()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Sweep of {strategy} wrote {rows_written} rows to {output_path} in {elapsed:.1f}s")
+    return {
+        'rows': rows_written,
+        'elapsed_seconds': elapsed,
+        'output_path': output_path,
+        'best': best,
+    }
@@ -0,0 +1,21 @@
+import pytest
+
+import btc_chart
+import compact_bars
+import prefetch
+from benchmarks.stub_provider import offline
+
+
+@pytest.fixture(autouse=True)
+def no_background_work(monkeypatch):
+    """Keep the prefetch scheduler and retry sleeps out of the tests"""
+    monkeypatch.setattr(prefetch, 'PREFETCH_ENABLED', False)
+    monkeypatch.setattr(btc_chart, 'FETCH_BACKOFF_SECONDS', 0.0)
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    """The offline stub provider with an empty bar store and bar cache"""
+    monkeypatch.setattr(compact_bars, '_cache', None)
+    with offline(store_dir=str(tmp_path / 'bars')) as provider:
+        yield provider
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import extract_trades, run_backtest, simulate
+
+FEE, SLIPPAGE = 0.001, 0.0005
+COST = FEE + SLIPPAGE
+
+# Long for two bars, flipped short for two, then flat
+TARGET = np.array([1.0, 1.0, -1.0, -1.0, 0.0, 0.0, 0.0])
+
+
+def run(close):
+    close = np.asarray(close, dtype='float64')
+    index = pd.date_range('2024-01-01', periods=len(close), freq='D', tz='UTC')
+    positions, returns = simulate(close, TARGET, FEE, SLIPPAGE, long_only=False)
+    return positions, returns, extract_trades(index, close, positions, returns, FEE, SLIPPAGE)
+
+
+def test_simulate_holds_the_previous_target_and_charges_turnover():
+    close = [100.0, 110.0, 99.0, 105.0, 100.0, 102.0, 103.0]
+    positions, returns, _ = run(close)
+
+    assert positions.tolist() == [0.0, 1.0, 1.0, -1.0, -1.0, 0.0, 0.0]
+    market = np.diff(close) / close[:-1]
+    expected = positions[1:] * market - np.abs(np.diff(positions)) * COST
+    np.testing.assert_allclose(returns, np.concatenate([[0.0], expected]))
+
+
+def test_a_flip_charges_each_trade_its_own_entry_and_exit():
+    _, _, trades = run([100.0] * 7)
+
+    assert trades['direction'].tolist() == ['long', 'short']
+    assert trades['bars'].tolist() == [2, 2]
+    assert not trades['open'].any()
+    # Flat prices: each round trip costs one entry and one exit
+    np.testing.assert_allclose(trades['return'], [-2 * COST, -2 * COST], rtol=1e-3)
+
+
+def test_trades_compound_to_the_equity_curve():
+    _, returns, trades = run([100.0, 110.0, 99.0, 105.0, 100.0, 102.0, 103.0])
+
+    assert trades['entry_price'].tolist() == [100.0, 99.0]
+    assert trades['exit_price'].tolist() == [99.0, 100.0]
+    # Every cost is inside a trade, so the trades alone give the final equity
+    assert np.prod(1.0 + trades['return']) == pytest.approx(np.prod(1.0 + returns), rel=1e-12)
+
+
+def test_a_basket_backtests_like_each_symbol_alone():
+    index = pd.date_range('2020-01-01', periods=1500, freq='D', tz='UTC')
+    rng = np.random.default_rng(0)
+    close = pd.DataFrame({symbol: 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+                          for symbol in ('BTC-USD', 'ETH-USD')}, index=index)
+    basket = pd.concat({'Close': close}, axis=1)
+
+    result = run_backtest(basket, 'ma_cross', {'fast': 10, 'slow': 30}, long_only=False)
+    for symbol in close.columns:
+        alone = run_backtest(pd.DataFrame({'Close': close[symbol]}), 'ma_cross', {'fast': 10, 'slow': 30},
+                             long_only=False)
+        np.testing.assert_allclose(result.equity[symbol], alone.equity)
+        assert result.stats[symbol] == pytest.approx(alone.stats, nan_ok=True)
+        trades = result.trades[result.trades['symbol'] == symbol].drop(columns='symbol').reset_index(drop=True)
+        pd.testing.assert_frame_equal(trades, alone.trades)
+        assert np.prod(1.0 + alone.trades['return']) == pytest.approx(alone.equity.iloc[-1], rel=1e-9)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_store
+import btc_chart
+from indicators import INDICATOR_COLUMNS
+
+
+@pytest.fixture
+def client(provider):
+    from app import create_app
+    return create_app().test_client()
+
+
+def api_columns(client, **params):
+    response = client.get('/api/bars', query_string={'format': 'json', **params})
+    assert response.status_code == 200
+    return response.get_json()['columns']
+
+
+@pytest.mark.parametrize('interval, start, longer_start', [
+    ('1d', '2020-01-01', '2018-01-01'),
+    ('1h', None, None),
+])
+def test_indicators_match_a_longer_history(client, interval, start, longer_start):
+    if start is None:
+        # Hourly bars are served for the last 730 days only
+        start = (pd.Timestamp.now() - pd.Timedelta(days=60)).strftime('%Y-%m-%d')
+        longer_start = (pd.Timestamp.now() - pd.Timedelta(days=120)).strftime('%Y-%m-%d')
+    columns = api_columns(client, symbol='BTC-USD', interval=interval, start=start, indicators='all')
+
+    longer = btc_chart.get_bars('BTC-USD', start=longer_start, interval=interval).add_indicators()
+    expected = longer.slice(bar_store.to_ns(start))
+    assert columns['ts'][0] == bar_store.to_ns(start) // 10**6
+    n = len(columns['ts'])
+    for name in INDICATOR_COLUMNS:
+        values = np.array(columns[name], dtype='float64')
+        assert not np.isnan(values).any(), name
+        np.testing.assert_allclose(values, expected[name][:n], rtol=1e-6, err_msg=name)
+
+
+def test_lookback_stops_where_the_history_does(client):
+    first = btc_chart.get_bars('BTC-USD', start='2008-01-01', end='2030-01-01')
+    start = pd.Timestamp(first.ts[10], unit='ns').strftime('%Y-%m-%d')
+
+    columns = api_columns(client, symbol='BTC-USD', start=start, end='2030-01-01', indicators='MA20')
+
+    assert columns['ts'][0] == first.ts[10] // 10**6
+    ma20 = np.array(columns['MA20'], dtype='float64')
+    assert np.isnan(ma20[:9]).all() and not np.isnan(ma20[9:]).any()
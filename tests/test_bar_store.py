@@ -0,0 +1,54 @@
+import multiprocessing
+import time
+
+import numpy as np
+
+import bar_store
+from bar_store import BAR_DTYPE, BarStore
+
+DAY_NS = 86400 * 10**9
+START_NS = bar_store.to_ns('2024-01-01')
+
+
+def slow_loads(monkeypatch):
+    """Widen the gap between reading a partition or manifest and replacing it"""
+    load_partition, manifest = BarStore._load_partition, BarStore.manifest
+
+    def slow_load_partition(self, path, mmap=True):
+        part = load_partition(self, path, mmap)
+        time.sleep(0.005)
+        return part
+
+    def slow_manifest(self, symbol, interval):
+        found = manifest(self, symbol, interval)
+        time.sleep(0.005)
+        return found
+
+    monkeypatch.setattr(BarStore, '_load_partition', slow_load_partition)
+    monkeypatch.setattr(BarStore, 'manifest', slow_manifest)
+
+
+def _writer(root, offset):
+    store = BarStore(root)
+    for day in range(offset, 40, 2):
+        bar = np.zeros(1, dtype=BAR_DTYPE)
+        bar['ts'] = START_NS + day * DAY_NS
+        bar['close'] = day
+        store.write('BTC-USD', '1d', bar)
+        store.mark_fetched('BTC-USD', '1d', bar['ts'][0], bar['ts'][0] + DAY_NS // 2)
+
+
+def test_concurrent_writers_keep_each_others_bars(tmp_path, monkeypatch):
+    slow_loads(monkeypatch)
+    root = str(tmp_path / 'bars')
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target=_writer, args=(root, offset)) for offset in (0, 1)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=30)
+        assert writer.exitcode == 0
+
+    store = BarStore(root)
+    assert store.read('BTC-USD', '1d')['close'].tolist() == list(range(40))
+    assert len(store.manifest('BTC-USD', '1d')['ranges']) == 40
@@ -0,0 +1,120 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import btc_chart
+import downsample
+
+
+def go_figures(data, max_points):
+    """The figures as first built with make_subplots and graph objects"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    data = btc_chart.calculate_indicators(data)
+    start_date, end_date = data.index[0], data.index[-1]
+    decimate = bool(max_points) and len(data) > max_points
+    if decimate:
+        starts, *ohlcv = downsample.ohlcv_buckets(
+            *(data[c].to_numpy() for c in ['Open', 'High', 'Low', 'Close', 'Volume']), max_points)
+        bars = pd.DataFrame(dict(zip(['Open', 'High', 'Low', 'Close', 'Volume'], ohlcv)), index=data.index[starts])
+    else:
+        bars = data
+
+    def line_xy(column):
+        if not decimate:
+            return dict(x=data.index, y=data[column])
+        values = data[column].to_numpy()
+        keep = downsample.LINE_METHODS[btc_chart.CHART_LINE_METHOD](data.index.asi8, values, max_points)
+        return dict(x=data.index[keep], y=values[keep])
+
+    def layout(fig, height, showlegend, **extra):
+        fig.update_layout(height=height, template='plotly_dark', showlegend=showlegend,
+                          margin=dict(t=0, l=0, r=0, b=0),
+                          xaxis=dict(type="date", range=[start_date, end_date], autorange=False), **extra)
+
+    price_fig = make_subplots(rows=1, cols=1, shared_xaxes=True)
+    price_fig.add_trace(go.Candlestick(x=bars.index, open=bars['Open'], high=bars['High'],
+                                       low=bars['Low'], close=bars['Close'], name='BTC-USD'))
+    price_fig.add_trace(go.Scatter(**line_xy('BB_upper'), line=dict(color='gray', width=1, dash='dash'),
+                                   name='BB Upper'))
+    price_fig.add_trace(go.Scatter(**line_xy('BB_lower'), line=dict(color='gray', width=1, dash='dash'),
+                                   name='BB Lower', fill='tonexty'))
+    price_fig.add_trace(go.Scatter(**line_xy('MA20'), line=dict(color='yellow', width=1), name='20 MA'))
+    price_fig.add_trace(go.Scatter(**line_xy('MA50'), line=dict(color='blue', width=1), name='50 MA'))
+    price_fig.add_trace(go.Scatter(**line_xy('MA200'), line=dict(color='red', width=1), name='200 MA'))
+    layout(price_fig, 500, True)
+
+    volume_fig = make_subplots(rows=1, cols=1)
+    colors = ['red' if row['Open'] - row['Close'] >= 0 else 'green' for index, row in bars.iterrows()]
+    volume_fig.add_trace(go.Bar(x=bars.index, y=bars['Volume'], marker_color=colors, name='Volume'))
+    layout(volume_fig, 200, False)
+
+    macd_fig = make_subplots(rows=1, cols=1)
+    macd_fig.add_trace(go.Scatter(**line_xy('MACD'), line=dict(color='blue', width=1), name='MACD'))
+    macd_fig.add_trace(go.Scatter(**line_xy('Signal_Line'), line=dict(color='orange', width=1),
+                                  name='Signal Line'))
+    layout(macd_fig, 200, True)
+
+    rsi_fig = make_subplots(rows=1, cols=1)
+    rsi_fig.add_trace(go.Scatter(**line_xy('RSI'), line=dict(color='purple', width=1), name='RSI'))
+    rsi_fig.add_hline(y=70, line_dash="dash", line_color="red")
+    rsi_fig.add_hline(y=30, line_dash="dash", line_color="green")
+    layout(rsi_fig, 200, False, yaxis=dict(range=[0, 100]))
+
+    return [(price_fig, 'price_chart', 'BTC Price Chart'), (volume_fig, 'volume_chart', 'BTC Volume Chart'),
+            (macd_fig, 'macd_chart', 'BTC MACD Chart'), (rsi_fig, 'rsi_chart', 'BTC RSI Chart')]
+
+
+def ohlcv(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    open_[100:110] = close[100:110]  # bars that closed at their open are red
+    return pd.DataFrame({
+        'Open': open_, 'High': np.maximum(open_, close) * 1.01, 'Low': np.minimum(open_, close) * 0.99,
+        'Close': close, 'Volume': rng.uniform(0, 1e4, n),
+    }, index=pd.date_range('2020-01-01', periods=n, freq='D', tz='UTC', name='Date'))
+
+
+def old_json(figures):
+    """The figures as plotly's encoder wrote them, parsed (key order differs from orjson's)"""
+    import plotly.io as pio
+    return json.loads(pio.json.to_json_plotly({name: btc_chart.figure_payload(fig) for fig, name, title in figures}))
+
+
+def new_json(figures):
+    """figures_to_json output, parsed, without the downsampling marker"""
+    payload = json.loads(btc_chart.figures_to_json(figures))
+    for figure in payload.values():
+        figure['layout'].pop('meta', None)
+    return payload
+
+
+@pytest.mark.parametrize('orjson', [True, False])
+def test_full_resolution_json_is_unchanged(monkeypatch, orjson):
+    if not orjson:
+        monkeypatch.setitem(sys.modules, 'orjson', None)
+    data = ohlcv()
+    new = new_json(btc_chart.build_chart_figures(data.copy(), max_points=0))
+    assert new == old_json(go_figures(data.copy(), max_points=0))
+
+
+def test_downsampled_json_is_unchanged():
+    data = ohlcv()
+    new = new_json(btc_chart.build_chart_figures(data.copy(), max_points=500))
+    assert new == old_json(go_figures(data.copy(), max_points=500))
+
+
+def test_validated_figures_serialize_the_same(monkeypatch):
+    data = ohlcv()
+    plain = new_json(btc_chart.build_chart_figures(data.copy(), max_points=0))
+    monkeypatch.setattr(btc_chart, 'CHART_VALIDATE', True)
+    validated = btc_chart.build_chart_figures(data.copy(), max_points=0)
+
+    assert all(type(fig).__name__ == 'Figure' for fig, _, _ in validated)
+    assert new_json(validated) == plain
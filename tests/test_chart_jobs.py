@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+import chart_jobs
+from chart_jobs import DONE, RUNNING, TIMEOUT, JobQueue
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two job queues sharing a record directory, as two gunicorn workers do"""
+    queues = [JobQueue(workers=1, max_pending=4, timeout=5, state_dir=str(tmp_path / 'jobs')) for _ in range(2)]
+    yield queues
+    for queue in queues:
+        queue._executor.shutdown(wait=True)
+
+
+def test_job_is_reported_by_another_worker(workers):
+    first, second = workers
+    job = first.submit(('1d', '2020-01-01', None), lambda: {'id': 'abc', 'points': 10})
+
+    seen = second.get(job.id, wait=2)
+
+    assert seen.state == DONE
+    assert seen.result == {'id': 'abc', 'points': 10}
+    assert seen.key == ('1d', '2020-01-01', None)
+
+
+def test_poll_on_another_worker_waits_for_the_job(workers):
+    first, second = workers
+    job = first.submit('slow', lambda: time.sleep(0.3) or 1)
+
+    assert second.get(job.id).state in (chart_jobs.QUEUED, RUNNING)
+    assert second.get(job.id, wait=2).state == DONE
+
+
+def test_unfinished_job_past_its_deadline_reads_as_timed_out(tmp_path):
+    owner = JobQueue(workers=1, timeout=0.1, state_dir=str(tmp_path / 'jobs'))
+    job = owner.submit('stuck', lambda: time.sleep(0.5))
+    time.sleep(0.2)
+
+    assert JobQueue(state_dir=str(tmp_path / 'jobs')).get(job.id).state == TIMEOUT
+    owner._executor.shutdown(wait=True)
+
+
+def test_unknown_or_malformed_job_ids(workers):
+    assert workers[1].get('0123456789abcdef') is None
+    assert workers[1].get('../../etc/passwd') is None
+
+
+def test_update_chart_poll_reaches_a_different_worker(provider, tmp_path):
+    from app import create_app
+
+    apps = [create_app() for _ in range(2)]
+    for app in apps:
+        app.chart_jobs = JobQueue(workers=1, state_dir=str(tmp_path / 'jobs'))
+    submitted = apps[0].test_client().post('/update_chart', json={
+        'interval': '1d', 'start_date': '2020-01-01', 'end_date': '2020-03-01', 'async': True})
+    assert submitted.status_code == 202
+
+    polled = apps[1].test_client().get(submitted.json['status_url'] + '?wait=5')
+
+    assert polled.status_code == 200
+    assert polled.json['status'] == 'success'
+    assert polled.json['data']['points'] == 60
+
+
+def test_update_chart_reports_data_errors_as_themselves(provider, monkeypatch):
+    import btc_chart
+    from app import create_app
+
+    client = create_app().test_client()
+    bad_date = client.post('/update_chart', json={'start_date': '2024-13-01'})
+    assert bad_date.status_code == 400
+    assert bad_date.get_json()['message'].startswith('Invalid date format')
+
+    def no_data(start, end, interval):
+        raise ValueError(f"No data available from {start} to {end}")
+
+    monkeypatch.setattr(btc_chart, 'get_btc_data', no_data)
+    response = client.post('/update_chart', json={'start_date': '2024-01-01', 'end_date': '2024-02-01'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'No data available from 2024-01-01 to 2024-02-01'
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from bar_store import BAR_DTYPE, bars_to_frame
+from compact_bars import BarSeries
+
+DAY_NS = 86400 * 10**9
+
+
+def make_bars(close, volume):
+    bars = np.zeros(len(close), dtype=BAR_DTYPE)
+    bars['ts'] = np.arange(len(close)) * DAY_NS
+    for field in ('open', 'high', 'low', 'close'):
+        bars[field] = close
+    bars['volume'] = volume
+    return bars
+
+
+def test_large_volumes_keep_every_digit():
+    volume = [32_123_456_789.0, 28_000_000_123.0, 41_987_654_321.0]
+    series = BarSeries.from_bars(make_bars([42000.5, 42100.25, 41900.0], volume), 'BTC-USD', '1d')
+
+    assert series['volume'].dtype == np.float64
+    assert series.to_frame(indicators=False)['Volume'].tolist() == volume
+
+
+def test_small_volumes_stay_float32():
+    series = BarSeries.from_bars(make_bars([1.5, 1.25, 1.0], [12.0, 3000.0, 45678.0]), 'ETH-BTC', '1d')
+    assert series['volume'].dtype == np.float32
+
+
+def random_bars(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.round(30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n))), 2)
+    bars = make_bars(close, np.round(rng.uniform(0, 1e6, n)))
+    bars['open'] = np.roll(close, 1)
+    bars['high'] = np.maximum(bars['open'], close) + 0.5
+    bars['low'] = np.minimum(bars['open'], close) - 0.5
+    return bars
+
+
+def test_round_trip_matches_bars_to_frame():
+    bars = random_bars()
+    series = BarSeries.from_bars(bars, 'BTC-USD', '1d')
+    frame = series.to_frame(indicators=False)
+    expected = bars_to_frame(bars, '1d')
+
+    assert series['close'].dtype == np.float32
+    pd.testing.assert_index_equal(frame.index, expected.index)
+    assert list(frame.columns) == list(expected.columns)
+    # float32 prices stay within half a cent
+    for column in expected.columns:
+        assert np.abs(frame[column].to_numpy('float64') - expected[column].to_numpy()).max() <= 0.005
+
+
+def test_prices_that_need_more_digits_stay_float64():
+    bars = random_bars()
+    bars['close'][10] = 123456.789
+    series = BarSeries.from_bars(bars, 'BTC-USD', '1d', tick=0.001)
+
+    assert all(series[field].dtype == np.float64 for field in ('open', 'high', 'low', 'close'))
+    # Whole-number volumes are exact as float32
+    pd.testing.assert_frame_equal(series.to_frame(indicators=False), bars_to_frame(bars, '1d'),
+                                  check_dtype=False, check_exact=True)
+
+
+def test_slices_are_views_and_concatenate_back():
+    series = BarSeries.from_bars(random_bars(), 'BTC-USD', '1d').add_indicators(['MA20'])
+    cuts = [None, 1000 * DAY_NS, 3000 * DAY_NS, None]
+    parts = [series.slice(start, end) for start, end in zip(cuts[:-1], cuts[1:])]
+
+    assert [len(part) for part in parts] == [1000, 2000, 2000]
+    assert all(np.shares_memory(part['close'], series['close']) for part in parts)
+    assert all(np.shares_memory(part['MA20'], series['MA20']) for part in parts)
+    pd.testing.assert_frame_equal(BarSeries.concat(parts).to_frame(), series.to_frame())
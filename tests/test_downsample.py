@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import downsample
+
+
+def sequential_lttb(x, y, max_points):
+    """Textbook LTTB: one bucket at a time, anchored on the previous pick"""
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n <= max_points:
+        return valid
+    xs, ys = x[valid].astype('float64'), y[valid]
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = [0]
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xs[hi:next_hi].mean(), ys[hi:next_hi].mean()
+        a = selected[-1]
+        areas = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        selected.append(lo + int(np.argmax(areas)))
+    selected.append(n - 1)
+    return valid[selected]
+
+
+def random_walk(n, seed=0):
+    x = np.arange(n, dtype='int64') * 60 * 10**9 + 1_700_000_000 * 10**9
+    y = 30000 + np.cumsum(np.random.default_rng(seed).normal(size=n))
+    y[:20] = np.nan
+    return x, y
+
+
+@pytest.mark.parametrize('n, max_points', [(20_000, 2000), (5_000, 1000), (200_000, 500), (2001, 2000)])
+def test_lttb_matches_the_sequential_algorithm(n, max_points):
+    # 200k into 500 buckets takes the wide-bucket path
+    x, y = random_walk(n)
+    np.testing.assert_array_equal(downsample.lttb(x, y, max_points), sequential_lttb(x, y, max_points))
+
+
+def spiky(n=10_000):
+    """A slow wave with NaN warm-up, one spike up and one dip"""
+    x = np.arange(n, dtype='int64') * 60 * 10**9
+    y = 100 + 10 * np.sin(np.linspace(0, 20, n))
+    y[:50] = np.nan
+    y[3333] = 200.0
+    y[6666] = 10.0
+    return x, y
+
+
+@pytest.mark.parametrize('method', sorted(downsample.LINE_METHODS))
+def test_line_methods_keep_endpoints_and_extrema(method):
+    x, y = spiky()
+    keep = downsample.LINE_METHODS[method](x, y, 500)
+
+    assert len(keep) <= 500
+    assert np.all(np.diff(keep) > 0)
+    assert not np.isnan(y[keep]).any()
+    assert keep[0] == 50 and keep[-1] == len(y) - 1
+    assert {3333, 6666} <= set(keep.tolist())
+
+    # Endpoints that are not their bucket's extremes are kept as well
+    x, y = random_walk(10_000, seed=1)
+    keep = downsample.LINE_METHODS[method](x, y, 500)
+    assert keep[0] == 20 and keep[-1] == len(y) - 1
+
+
+def test_ohlcv_buckets_keep_candle_semantics():
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(size=10_001))
+    open_ = np.roll(close, 1)
+    high = np.maximum(open_, close) + 1
+    low = np.minimum(open_, close) - 1
+    volume = rng.uniform(1, 10, len(close))
+
+    starts, o, h, l, c, v = downsample.ohlcv_buckets(open_, high, low, close, volume, 2000)
+    ends = np.append(starts[1:], len(close))
+
+    assert len(starts) == 2000 and starts[0] == 0
+    for i in (0, 1, 999, 1999):
+        window = slice(starts[i], ends[i])
+        assert o[i] == open_[starts[i]] and c[i] == close[ends[i] - 1]
+        assert h[i] == high[window].max() and l[i] == low[window].min()
+        assert v[i] == pytest.approx(volume[window].sum())
+    assert v.sum() == pytest.approx(volume.sum())
@@ -0,0 +1,127 @@
+import pandas as pd
+import pytest
+
+import bar_store
+import btc_chart
+from benchmarks.stub_provider import StubTicker
+
+
+class FlakyTicker(StubTicker):
+    """Fails the first `failures` history() calls the way yfinance does with raise_errors=True"""
+
+    def __init__(self, provider, symbol, failures):
+        super().__init__(provider, symbol)
+        self.failures = failures
+
+    def history(self, start=None, end=None, interval='1d', raise_errors=False, **kwargs):
+        if not raise_errors:
+            # What yfinance does by default: log and hand back an empty frame
+            return pd.DataFrame()
+        if self.failures:
+            self.failures -= 1
+            raise Exception(f"{self.symbol}: HTTP Error 503")
+        return super().history(start=start, end=end, interval=interval, **kwargs)
+
+
+def test_provider_failure_is_retried(provider, monkeypatch):
+    ticker = FlakyTicker(provider, 'BTC-USD', failures=btc_chart.FETCH_RETRIES - 1)
+    monkeypatch.setattr(btc_chart, '_get_ticker', lambda symbol: ticker)
+
+    series = btc_chart.get_bars('BTC-USD', start='2020-01-01', end='2020-03-01')
+
+    assert ticker.failures == 0
+    assert len(series) == 60
+
+
+def test_download_drops_symbols_yfinance_reports(monkeypatch):
+    yf = pytest.importorskip('yfinance')
+    monkeypatch.setattr(yf.shared, '_ERRORS', {})
+    index = pd.date_range('2020-01-01', periods=3, tz='UTC')
+    frame = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0, 'Volume': 1.0}, index=index)
+
+    def download(symbols, **kwargs):
+        yf.shared._ERRORS = {'ETH-USD': "JSONDecodeError('Expecting value')"}
+        return pd.concat({'BTC-USD': frame, 'ETH-USD': frame * float('nan')}, axis=1)
+
+    monkeypatch.setattr(yf, 'download', download)
+    hist = btc_chart._download(['BTC-USD', 'ETH-USD'], '2020-01-01', '2020-02-01', '1d')
+    assert set(hist.columns.get_level_values(0)) == {'BTC-USD'}
+
+
+class OutageTicker(StubTicker):
+    """Raises for windows starting before `down_until`, as during a provider outage"""
+
+    def __init__(self, provider, symbol, down_until):
+        super().__init__(provider, symbol)
+        self.down_until = down_until
+
+    def history(self, start=None, end=None, interval='1d', **kwargs):
+        if self.down_until is not None and pd.Timestamp(start) < self.down_until:
+            raise Exception(f"{self.symbol}: HTTP Error 503")
+        return super().history(start=start, end=end, interval=interval, **kwargs)
+
+
+def test_failed_window_is_not_marked_fetched(provider, monkeypatch):
+    start = (pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=90)).normalize()
+    ticker = OutageTicker(provider, 'BTC-USD', down_until=start + pd.Timedelta(days=45))
+    monkeypatch.setattr(btc_chart, '_get_ticker', lambda symbol: ticker)
+
+    first = btc_chart.get_bars('BTC-USD', start=start.strftime('%Y-%m-%d'), interval='1h')
+    store = bar_store.get_store()
+    assert bar_store.missing_ranges(start.value, ticker.down_until.value, store.manifest('BTC-USD', '1h')['ranges'])
+
+    # Once the provider is back, the hole left by the outage is fetched
+    ticker.down_until = None
+    second = btc_chart.get_bars('BTC-USD', start=start.strftime('%Y-%m-%d'), interval='1h')
+    assert len(second) > len(first)
+    assert second.ts[0] == start.value
+    assert (pd.Series(second.ts).diff().dropna() == 3600 * 10**9).all()
+
+
+def test_empty_window_is_not_marked_fetched(provider, monkeypatch):
+    ticker = OutageTicker(provider, 'BTC-USD', down_until=None)
+    monkeypatch.setattr(ticker, 'history', lambda **kwargs: pd.DataFrame())
+    monkeypatch.setattr(btc_chart, '_get_ticker', lambda symbol: ticker)
+
+    with pytest.raises(ValueError):
+        btc_chart.get_bars('BTC-USD', start='2020-01-01', end='2020-03-01')
+    assert bar_store.get_store().manifest('BTC-USD', '1d')['ranges'] == []
+
+    monkeypatch.setattr(btc_chart, '_get_ticker', provider.ticker)
+    assert len(btc_chart.get_bars('BTC-USD', start='2020-01-01', end='2020-03-01')) == 60
+
+
+def nan_download(provider, failing):
+    """A batched download whose columns for the `failing` symbols come back all NaN"""
+    def download(symbols, start, end, interval):
+        hist = provider.download(symbols, start, end, interval)
+        for symbol in failing & set(symbols):
+            hist[symbol] = float('nan')
+        return hist
+    return download
+
+
+def test_batch_symbol_with_nan_columns_is_retried(provider, monkeypatch):
+    monkeypatch.setattr(btc_chart, '_download', nan_download(provider, {'ETH-USD'}))
+
+    data = btc_chart.get_market_data(['BTC-USD', 'ETH-USD', 'SOL-USD'], start='2020-01-01', end='2020-03-01')
+
+    assert data['Close'].notna().all().all()
+    store = bar_store.get_store()
+    for symbol in ('BTC-USD', 'ETH-USD', 'SOL-USD'):
+        assert not bar_store.missing_ranges(bar_store.to_ns('2020-01-01'), bar_store.to_ns('2020-03-01'),
+                                            store.manifest(symbol, '1d')['ranges'])
+
+
+def test_batch_symbol_that_keeps_failing_is_not_marked_fetched(provider, monkeypatch):
+    monkeypatch.setattr(btc_chart, '_download', nan_download(provider, {'ETH-USD'}))
+    down = OutageTicker(provider, 'ETH-USD', down_until=pd.Timestamp('2100-01-01', tz='UTC'))
+    monkeypatch.setattr(btc_chart, '_get_ticker',
+                        lambda symbol: down if symbol == 'ETH-USD' else provider.ticker(symbol))
+
+    data = btc_chart.get_market_data(['BTC-USD', 'ETH-USD'], start='2020-01-01', end='2020-03-01')
+
+    assert list(data['Close'].columns) == ['BTC-USD']
+    store = bar_store.get_store()
+    assert store.manifest('ETH-USD', '1d')['ranges'] == []
+    assert store.manifest('BTC-USD', '1d')['ranges'] != []
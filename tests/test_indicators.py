@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import INDICATOR_COLUMNS, IndicatorContext, IndicatorEngine, compute_indicators
+
+
+def pandas_indicators(close):
+    """The indicator formulas as first written with pandas rolling/ewm"""
+    close = pd.Series(close)
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    middle = close.rolling(window=20).mean()
+    std = close.rolling(window=20).std()
+    return pd.DataFrame({
+        'MA20': middle,
+        'MA50': close.rolling(window=50).mean(),
+        'MA200': close.rolling(window=200).mean(),
+        'RSI': 100 - (100 / (1 + gain / loss)),
+        'MACD': macd,
+        'Signal_Line': macd.ewm(span=9, adjust=False).mean(),
+        'BB_middle': middle,
+        'BB_upper': middle + 2 * std,
+        'BB_lower': middle - 2 * std,
+    })[INDICATOR_COLUMNS]
+
+
+def prices(n=3000, seed=0):
+    """A random walk around 30k with a stretch of unchanged closes"""
+    close = 30000 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, n)))
+    close[1000:1030] = close[1000]
+    return close
+
+
+def assert_matches(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype='float64'), expected.to_numpy(), rtol=1e-9, atol=1e-6)
+
+
+def test_engine_matches_pandas():
+    close = prices()
+    engine = IndicatorEngine()
+    assert_matches(engine.extend(close), pandas_indicators(close))
+
+
+def test_engine_fed_in_pieces_matches_pandas():
+    close = prices()
+    index = pd.date_range('2020-01-01', periods=len(close), freq='h', tz='UTC')
+    frame = pd.DataFrame({'Close': close}, index=index)
+
+    engine = IndicatorEngine(keep_history=True)
+    engine.extend(frame.iloc[:700])
+    for i in range(700, 720):
+        engine.update(frame.iloc[i], index[i])
+    engine.extend(frame.iloc[720:])
+
+    assert engine.last_index == index[-1]
+    assert_matches(engine.to_frame(), pandas_indicators(close))
+    assert engine.last == pytest.approx(dict(pandas_indicators(close).iloc[-1]), rel=1e-9)
+
+
+def test_calculate_indicators_continues_from_an_engine():
+    import btc_chart
+
+    close = prices()
+    index = pd.date_range('2020-01-01', periods=len(close), freq='D', tz='UTC')
+    frame = pd.DataFrame({'Close': close}, index=index)
+    engine = IndicatorEngine(keep_history=True)
+
+    btc_chart.calculate_indicators(frame.iloc[:2000].copy(), engine=engine)
+    data = btc_chart.calculate_indicators(frame.copy(), engine=engine)
+
+    assert engine.count == len(close)
+    assert_matches(data[INDICATOR_COLUMNS], pandas_indicators(close))
+
+
+def test_compute_indicators_matches_pandas():
+    # Longer than a block of materialised windows
+    close = prices(20_000)
+    assert_matches(pd.DataFrame(compute_indicators(close))[INDICATOR_COLUMNS], pandas_indicators(close))
+
+
+def test_compute_indicators_per_symbol_column():
+    close = np.column_stack([prices(3000, seed) for seed in range(3)])
+    close[:500, 1] = np.nan  # a symbol listed later
+
+    values = compute_indicators(close)
+    for column, first in enumerate([0, 500, 0]):
+        # Each symbol's indicators start from its own first bar
+        expected = pandas_indicators(close[first:, column])
+        assert_matches(pd.DataFrame({name: values[name][first:, column] for name in INDICATOR_COLUMNS}), expected)
+        assert all(np.isnan(values[name][:first, column]).all() for name in INDICATOR_COLUMNS)
+
+
+def test_compute_indicators_reuses_a_context():
+    close = prices()
+    context = IndicatorContext(close)
+    first = compute_indicators(close, ['MA20', 'BB_upper'], context)
+    second = compute_indicators(close, ['BB_middle', 'BB_lower'], context)
+
+    expected = pandas_indicators(close)
+    for name, values in {**first, **second}.items():
+        np.testing.assert_allclose(values, expected[name], rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+def test_calculate_indicators_stores_compute_indicators_at_price_precision(dtype):
+    import btc_chart
+
+    close = prices().astype(dtype)
+    index = pd.date_range('2020-01-01', periods=len(close), freq='D', tz='UTC')
+    data = btc_chart.calculate_indicators(pd.DataFrame({'Close': close}, index=index))
+
+    values = compute_indicators(close)
+    for name in INDICATOR_COLUMNS:
+        assert data[name].dtype == dtype
+        np.testing.assert_array_equal(data[name].to_numpy(), values[name].astype(dtype))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarStore, bars_to_frame
+from ingest import BarBuilder, ingest
+
+START_NS = pd.Timestamp('2024-03-01', tz='UTC').value
+RULES = {'1m': '1min', '15m': '15min', '1h': '1h', '1d': '1D'}
+
+
+def random_trades(n=50_000, seed=0):
+    """Trades a second or so apart, with a quiet hour and bursts sharing one nanosecond"""
+    rng = np.random.default_rng(seed)
+    gaps = rng.exponential(1.5e9, n).astype('int64')
+    gaps[n // 2] = 3600 * 10**9
+    gaps[rng.uniform(size=n) < 0.05] = 0
+    ts = START_NS + np.cumsum(gaps)
+    price = 60000 + np.cumsum(rng.normal(0, 5, n))
+    size = rng.exponential(0.1, n)
+    return ts, price, size
+
+
+def resampled(ts, price, size, interval):
+    trades = pd.DataFrame({'price': price, 'size': size}, index=pd.to_datetime(ts, unit='ns', utc=True))
+    bars = trades.resample(RULES[interval], label='left', closed='left').agg(
+        {'price': ['first', 'max', 'min', 'last'], 'size': 'sum'})
+    bars.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+    return bars.dropna(subset=['Open'])
+
+
+def assert_bars_match(bars, expected):
+    actual = bars_to_frame(bars)
+    pd.testing.assert_index_equal(actual.index, expected.index, check_names=False)
+    pd.testing.assert_frame_equal(actual, expected, check_names=False, check_freq=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize('interval', sorted(RULES))
+@pytest.mark.parametrize('chunk', [1, 7, 1000, 60_000])
+def test_bar_builder_matches_resample_across_chunks(interval, chunk):
+    ts, price, size = random_trades(5000 if chunk == 1 else 50_000)
+    builder = BarBuilder(interval)
+    parts = [builder.add(ts[i:i + chunk], price[i:i + chunk], size[i:i + chunk]) for i in range(0, len(ts), chunk)]
+    bars = np.concatenate(parts + [builder.finish()])
+
+    assert builder.late == 0
+    assert_bars_match(bars, resampled(ts, price, size, interval))
+
+
+def test_bar_builder_skips_trades_before_the_open_bar():
+    ts, price, size = random_trades(1000)
+    builder = BarBuilder('1m')
+    done = builder.add(ts[:600], price[:600], size[:600])
+    # A trade from an already completed minute arrives in the next chunk
+    late = np.concatenate([ts[:1], ts[600:]])
+    rest = builder.add(late, np.concatenate([price[:1], price[600:]]), np.concatenate([size[:1], size[600:]]))
+
+    assert builder.late == 1
+    assert_bars_match(np.concatenate([done, rest, builder.finish()]), resampled(ts, price, size, '1m'))
+
+
+def test_ingest_writes_the_same_bars_as_resample(tmp_path):
+    ts, price, size = random_trades()
+    paths = []
+    for i, part in enumerate(np.array_split(np.arange(len(ts)), 3)):
+        path = tmp_path / f'trades-{i}.csv.gz'
+        pd.DataFrame({'time': ts[part] // 10**6, 'price': price[part], 'qty': size[part]}).to_csv(path, index=False)
+        paths.append(str(path))
+    store = BarStore(str(tmp_path / 'bars'))
+
+    report = ingest(paths, 'BTC-USD', ['1m', '1h'], store=store, time_column='time', price_column='price',
+                    size_column='qty', chunk_rows=4096)
+
+    assert report['trades'] == len(ts) and report['late_trades'] == {'1m': 0, '1h': 0}
+    # Trade times were written in whole milliseconds
+    ts = ts // 10**6 * 10**6
+    for interval in ('1m', '1h'):
+        expected = resampled(ts, price, size, interval)
+        assert report['bars'][interval] == len(expected)
+        assert_bars_match(store.read('BTC-USD', interval, START_NS, ts[-1] + 1), expected)
@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+import btc_chart
+from live_feed import LiveFeed
+
+
+@pytest.mark.parametrize('interval', ['1h', '1d', '1wk', '1mo'])
+def test_change_24h_spans_a_day_whatever_the_interval(provider, interval):
+    feed = LiveFeed(interval)
+    feed.poll()
+
+    hourly = btc_chart.get_btc_data(start=(pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=3)).strftime('%Y-%m-%d'),
+                                    interval='1h')
+    day_ago = hourly['Close'].asof(hourly.index[-1] - pd.Timedelta(days=1))
+    expected = (hourly['Close'].iloc[-1] / day_ago - 1.0) * 100
+    assert feed.price['change_24h'] == pytest.approx(expected, rel=1e-4)
+
+
+def test_only_decimated_figures_are_marked(provider):
+    data = btc_chart.get_btc_data(interval='1d')
+    full = btc_chart.build_chart_figures(data, max_points=0)
+    decimated = btc_chart.build_chart_figures(data, max_points=500)
+
+    assert all('meta' not in fig['layout'] for fig, _, _ in full)
+    assert all(fig['layout']['meta'] == {'decimated': True} for fig, _, _ in decimated)
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    """Metrics shared through a directory, as under gunicorn.conf.py"""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path / 'metrics'), raising=False)
+    monkeypatch.setattr(metrics, '_samples_path', None, raising=False)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _worker(scrapes):
+    metrics.inc('cache_requests_total', 2, cache='render', result='hit')
+    metrics.observe('stage_duration_seconds', 0.02, stage='fetch')
+    scrapes.put(metrics.render())
+
+
+def _sample(text, name):
+    return next(line.rsplit(' ', 1)[1] for line in text.splitlines() if line.startswith(name))
+
+
+def test_every_worker_reports_the_totals_of_all_workers(metrics_dir):
+    # Counted in the master before the fork: the worker must not count it again
+    metrics.inc('cache_requests_total', 1, cache='render', result='hit')
+    metrics.observe('stage_duration_seconds', 0.2, stage='fetch')
+
+    context = multiprocessing.get_context('fork')
+    scrapes = context.Queue()
+    worker = context.Process(target=_worker, args=(scrapes,))
+    worker.start()
+    from_worker = scrapes.get(timeout=10)
+    worker.join(timeout=10)
+    from_master = metrics.render()
+
+    hits = 'cache_requests_total{cache="render",result="hit"}'
+    assert _sample(from_worker, hits) == _sample(from_master, hits) == '3'
+    assert _sample(from_master, 'stage_duration_seconds_count{stage="fetch"}') == '2'
+    assert _sample(from_master, 'stage_duration_seconds_bucket{stage="fetch",le="0.025"}') == '1'
+
+
+def test_without_metrics_dir_a_process_reports_its_own(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', None, raising=False)
+    metrics.reset()
+    metrics.inc('chart_jobs_total', outcome='submitted')
+    assert 'chart_jobs_total{outcome="submitted"} 1' in metrics.render()
+    metrics.reset()
+
+
+def _exiting_worker():
+    metrics.inc('cache_requests_total', 2, cache='render', result='hit')
+    metrics.flush()
+
+
+def run_worker(target):
+    worker = multiprocessing.get_context('fork').Process(target=target)
+    worker.start()
+    worker.join(timeout=10)
+    return worker.pid
+
+
+def test_exited_workers_are_folded_into_one_file(metrics_dir):
+    metrics.inc('cache_requests_total', 1, cache='render', result='hit')
+    pids = [run_worker(_exiting_worker) for _ in range(3)]
+    hits = 'cache_requests_total{cache="render",result="hit"}'
+    assert _sample(metrics.render(), hits) == '7'
+
+    for pid in pids:
+        metrics.fold_exited(pid)
+
+    own = os.path.basename(metrics._samples_path)
+    assert sorted(os.listdir(metrics.METRICS_DIR)) == sorted([metrics.EXITED_SAMPLES, own])
+    assert _sample(metrics.render(), hits) == '7'
+
+
+def test_a_folded_file_not_yet_deleted_counts_once(metrics_dir, monkeypatch):
+    pid = run_worker(_exiting_worker)
+    with monkeypatch.context() as patch:
+        patch.setattr(metrics.os, 'remove', lambda path: None)
+        metrics.fold_exited(pid)
+
+    assert len(os.listdir(metrics.METRICS_DIR)) == 3
+    assert _sample(metrics.render(), 'cache_requests_total{cache="render",result="hit"}') == '2'
@@ -0,0 +1,71 @@
+import time
+
+import pandas as pd
+import pytest
+
+import bar_store
+import btc_chart
+from benchmarks.stub_provider import stub_bars, symbol_seed
+
+
+def store_bars(provider, symbol, start, end, interval):
+    """Put provider bars of [start, end) into the store the way ingest.py does"""
+    store = bar_store.get_store()
+    store.write(symbol, interval, bar_store.bars_from_frame(
+        stub_bars(start, end, interval, symbol_seed(provider.seed, symbol))))
+    store.mark_fetched(symbol, interval, bar_store.to_ns(start), bar_store.to_ns(end))
+
+
+def days_ago(days):
+    return (pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)).normalize()
+
+
+def test_basket_longer_than_the_provider_limit(provider):
+    data = btc_chart.get_market_data(['BTC-USD', 'ETH-USD'])
+
+    assert list(data['Close'].columns) == ['BTC-USD', 'ETH-USD']
+    assert len(data) >= btc_chart.INTERVAL_LIMITS['1d']['days']
+
+
+def test_basket_is_served_past_the_provider_limit_only_when_every_symbol_is_stored(provider):
+    start = days_ago(10)
+    now = pd.Timestamp.now(tz='UTC')
+    store_bars(provider, 'BTC-USD', start, now, '1m')
+
+    clamped = btc_chart.get_market_data(['BTC-USD', 'ETH-USD'], start=start.strftime('%Y-%m-%d'), interval='1m')
+    assert clamped.index[0] > start + pd.Timedelta(days=2)
+
+    store_bars(provider, 'ETH-USD', start, now, '1m')
+    data = btc_chart.get_market_data(['BTC-USD', 'ETH-USD'], start=start.strftime('%Y-%m-%d'), interval='1m')
+    assert data.index[0] == start
+    assert data['Close'].notna().all().all()
+
+
+def test_stored_history_is_served_whether_or_not_the_head_is_stale(provider, monkeypatch):
+    start = days_ago(15)
+    store_bars(provider, 'BTC-USD', start, pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=1), '1m')
+    # Every head counts as stale
+    monkeypatch.setattr(btc_chart, 'STORE_REFRESH_SECONDS', 0)
+
+    for _ in range(2):
+        series = btc_chart.get_bars('BTC-USD', start=start.strftime('%Y-%m-%d'), interval='1m')
+        assert series.ts[0] == start.value
+        assert (series.ts[-1] - series.ts[0]) // 10**9 >= 15 * 86400 - 2 * 3600
+        assert (pd.Series(series.ts).diff().dropna() == 60 * 10**9).all()
+
+
+@pytest.fixture
+def host_behind_utc(monkeypatch):
+    """Local time five hours behind UTC"""
+    monkeypatch.setenv('TZ', 'Etc/GMT+5')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_default_end_is_utc_now_on_a_host_behind_utc(host_behind_utc):
+    _, _, end_date = btc_chart._resolve_range('2024-01-01', None, '1h')
+    lag = pd.Timestamp.now(tz='UTC') - pd.Timestamp(end_date, tz='UTC')
+    assert pd.Timedelta(0) <= lag < pd.Timedelta(minutes=1)
+
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import rollup
+from bar_store import BAR_DTYPE, BarStore, bars_to_frame
+
+MINUTE_NS = 60 * 10**9
+AGG = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+# Bar interval -> the pandas resample rule that buckets it the same way
+RULES = {'5m': '5min', '15m': '15min', '1h': '1h', '1d': '1D', '1wk': 'W-MON', '1mo': 'MS'}
+
+
+def random_bars(n, step_ns, seed=0):
+    """Random bars from 2024-01-03 (a Wednesday) with a tenth of them missing"""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    bars = np.zeros(n, dtype=BAR_DTYPE)
+    bars['ts'] = pd.Timestamp('2024-01-03 05:17', tz='UTC').value + np.arange(n) * step_ns
+    bars['open'], bars['close'] = open_, close
+    bars['high'] = np.maximum(open_, close) * (1 + rng.uniform(0, 0.001, n))
+    bars['low'] = np.minimum(open_, close) * (1 - rng.uniform(0, 0.001, n))
+    bars['volume'] = rng.uniform(0, 10, n)
+    return bars[rng.uniform(size=n) > 0.1]
+
+
+def resampled(bars, interval):
+    frame = bars_to_frame(bars)
+    expected = frame.resample(RULES[interval], label='left', closed='left').agg(AGG)
+    return expected.dropna(subset=['Open'])
+
+
+@pytest.mark.parametrize('source, interval', [('1m', '5m'), ('1m', '15m'), ('1m', '1h'), ('1m', '1d'),
+                                              ('1h', '1d'), ('1d', '1wk'), ('1d', '1mo')])
+def test_aggregate_matches_resample(source, interval):
+    step = {'1m': MINUTE_NS, '1h': 60 * MINUTE_NS, '1d': 1440 * MINUTE_NS}[source]
+    bars = random_bars(5000 if source == '1d' else 50_000, step)
+
+    actual = bars_to_frame(rollup.aggregate(bars, interval))
+    expected = resampled(bars, interval)
+    if interval == '1wk':
+        assert (actual.index.dayofweek == 0).all()
+    pd.testing.assert_index_equal(actual.index, expected.index, check_names=False)
+    pd.testing.assert_frame_equal(actual, expected, check_names=False, check_freq=False, rtol=1e-12)
+
+
+def test_fill_builds_covered_buckets_only(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = random_bars(24 * 20, 60 * MINUTE_NS)
+    start, end = int(bars['ts'][0]), int(bars['ts'][-1]) + 60 * MINUTE_NS
+    store.write('BTC-USD', '1h', bars)
+    store.mark_fetched('BTC-USD', '1h', start, end)
+
+    day_start = int(rollup.bucket_start([start], '1d')[0])
+    remaining = rollup.fill(store, 'BTC-USD', '1d', day_start, end, refresh_seconds=0)
+
+    # Only whole days are built; the hours either side of them are left to fetch
+    first_full = int(rollup.bucket_end([start], '1d')[0])
+    last_full = int(rollup.bucket_start([end], '1d')[0])
+    assert remaining == [(day_start, start), (last_full, end)]
+    expected = resampled(bars, '1d').loc[pd.Timestamp(first_full, tz='UTC'):pd.Timestamp(last_full - 1, tz='UTC')]
+    actual = bars_to_frame(store.read('BTC-USD', '1d', first_full, last_full))
+    pd.testing.assert_frame_equal(actual, expected, check_names=False, check_freq=False, rtol=1e-12)
@@ -0,0 +1,23 @@
+import app as app_module
+
+
+def test_streams_past_the_cap_are_refused_until_one_closes(provider, monkeypatch):
+    monkeypatch.setattr(app_module, 'STREAM_MAX_CLIENTS', 2)
+    client = app_module.create_app().test_client()
+
+    open_streams = [client.get('/stream', buffered=False) for _ in range(2)]
+    assert [r.status_code for r in open_streams] == [200, 200]
+
+    refused = client.get('/stream')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(app_module.STREAM_RETRY_AFTER)
+
+    # Other routes still get a thread while the streams are open
+    assert client.get('/metrics').status_code == 200
+
+    open_streams[0].close()
+    reopened = client.get('/stream', buffered=False)
+    assert reopened.status_code == 200
+
+    for response in (open_streams[1], reopened):
+        response.close()
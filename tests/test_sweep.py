@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+
+import sweep
+
+
+def read_rows(path):
+    def reject(constant):
+        raise ValueError(f"{constant} is not valid JSON")
+
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line, parse_constant=reject) for line in f]
+
+
+def test_numpy_grid_and_flat_equity_write_valid_json_lines(tmp_path):
+    path = tmp_path / 'sweep.jsonl'
+    grid = sweep.param_grid('ma_cross', fast=np.arange(2, 6, 2), slow=np.linspace(10, 20, 2).astype(int))
+    # Constant prices never trade, so the Sharpe ratio is undefined
+    close = np.full(300, 100.0)
+
+    summary = sweep.run_sweep(close, 'ma_cross', grid, str(path), workers=1)
+
+    rows = read_rows(path)
+    assert len(rows) == summary['rows'] == 4
+    assert {(row['params']['fast'], row['params']['slow']) for row in rows} == {(2, 10), (2, 20), (4, 10), (4, 20)}
+    assert all(row['in_sample']['sharpe'] is None for row in rows)
+
+
+def test_batches_fill_up_across_indicator_parameters():
+    grid = sweep.param_grid('ma_cross', fast=range(5, 50, 5), slow=range(50, 250, 10))
+
+    sizes = [len(batch) for batch in sweep._batches(grid, 64)]
+
+    assert sizes == [64, 64, 52]
+
+
+def test_sweep_results_do_not_depend_on_batching(tmp_path):
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, 1000)))
+    results = []
+    for batch_size in (1, 64):
+        path = tmp_path / f'sweep-{batch_size}.jsonl'
+        grid = sweep.param_grid('macd_cross', fast=[8, 12], slow=[21, 26], signal=[5, 9])
+        sweep.run_sweep(close, 'macd_cross', grid, str(path), workers=2, batch_size=batch_size)
+        results.append(sorted(read_rows(path), key=lambda row: sorted(row['params'].items())))
+    assert results[0] == results[1]